@@ -0,0 +1,244 @@
+# /app/batcher.py
+# ============================================================
+# ジョブをまたいだ動的バッチング推論サーバ
+# 各ジョブの (img0, img1, timestep) を1件ずつ受け付け、パディング後の解像度ごとにまとめて
+# 最大 batch_max_size 件 / 最大 batch_max_wait_ms 待ちで IFNet にまとめて流す
+# ============================================================
+
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from settings import settings
+
+# キュー待ち時間の統計に使う直近サンプル数
+_LATENCY_SAMPLES = 1000
+
+
+class _Pair:
+    """1ジョブ分の2枚のフレーム（同じペアの timestep はエンコードを共有する）"""
+
+    def __init__(self, img0: np.ndarray, img1: np.ndarray, scale: float):
+        self.img0 = img0
+        self.img1 = img1
+        self.scale = scale
+        self.h, self.w = img0.shape[:2]
+
+
+class _Item:
+    """1枚分の推論要求"""
+
+    def __init__(self, pair: _Pair, timestep: float):
+        self.pair = pair
+        self.timestep = timestep
+        self.enqueued = time.perf_counter()
+        self.waited = 0.0
+        self.future: Future = Future()
+
+
+class BatchServer:
+    """解像度とフロースケールが同じ要求を1回の forward にまとめる推論サーバ"""
+
+    def __init__(self,
+                 engine,
+                 max_batch: int = settings.batch_max_size,
+                 max_wait_ms: float = settings.batch_max_wait_ms):
+        self.engine = engine
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.
+        self._groups: "OrderedDict[Tuple[int, int, float], List[_Item]]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self._batches = 0
+        self._items = 0
+        self._encoder_passes = 0
+        self._histogram: Counter = Counter()
+        self._latencies: deque = deque(maxlen=_LATENCY_SAMPLES)
+
+    # ============================================================
+    # ▶️ 起動 / 停止
+    # ============================================================
+    def start(self) -> "BatchServer":
+        if self._thread is None:
+            self._stopped = False
+            self._thread = threading.Thread(target=self._loop, name="rife-batcher", daemon=True)
+            self._thread.start()
+            print(f"📦 Batch server started (max_batch={self.max_batch}, "
+                  f"max_wait={self.max_wait * 1000:g}ms)")
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            pending = [item for items in self._groups.values() for item in items]
+            self._groups.clear()
+            self._cond.notify_all()
+        for item in pending:
+            item.future.set_exception(RuntimeError("batch server stopped"))
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    # ============================================================
+    # 📥 投入（ジョブスレッドから呼ばれ、結果が揃うまで待つ）
+    # ============================================================
+    def interpolate(self,
+                    img0: np.ndarray,
+                    img1: np.ndarray,
+                    timesteps: List[float],
+                    scale: float = 1.0) -> Tuple[List[np.ndarray], float]:
+        """
+        timesteps ごとの中間フレームと、最も長く待った要求のキュー待ち時間(ms)を返す
+        1枚でもメモリ予算を超える解像度はバッチにせず、エンジンのタイル推論で直接処理する
+        """
+        h, w = img0.shape[:2]
+        if self.engine.plan_tiles(h, w, 1, scale) is not None:
+            return self.engine.interpolate_n(img0, img1, len(timesteps), scale=scale,
+                                             timesteps=timesteps), 0.0
+
+        unit = self.engine.pad_unit(scale)
+        key = (((h - 1) // unit + 1) * unit, ((w - 1) // unit + 1) * unit, scale)
+        pair = _Pair(img0, img1, scale)
+        items = [_Item(pair, float(t)) for t in timesteps]
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("batch server stopped")
+            self._groups.setdefault(key, []).extend(items)
+            self._cond.notify_all()
+        results = [item.future.result() for item in items]
+        return results, round(1000 * max((item.waited for item in items), default=0.0), 2)
+
+    # ============================================================
+    # 📊 状態
+    # ============================================================
+    def stats(self) -> dict:
+        with self._cond:
+            latencies = sorted(self._latencies)
+            pending = sum(len(items) for items in self._groups.values())
+            histogram = {str(size): count for size, count in sorted(self._histogram.items())}
+            batches, items, passes = self._batches, self._items, self._encoder_passes
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(1000 * latencies[min(len(latencies) - 1, int(p * len(latencies)))], 2)
+
+        return {
+            "enabled": True,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "pending": pending,
+            "batches": batches,
+            "items": items,
+            "mean_batch_size": round(items / batches, 2) if batches else None,
+            "encoder_passes": passes,
+            "batch_size_histogram": histogram,
+            "queue_ms": {
+                "samples": len(latencies),
+                "mean": round(1000 * sum(latencies) / len(latencies), 2) if latencies else None,
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": percentile(1.0),
+            },
+        }
+
+    # ============================================================
+    # 🔁 バッチ組み立てループ
+    # ============================================================
+    def _loop(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopped:
+                        return
+                    now = time.perf_counter()
+                    key = self._ready_group(now)
+                    if key is not None:
+                        break
+                    self._cond.wait(self._next_deadline(now))
+                items = self._take(key)
+            self._run(items)
+
+    def _ready_group(self, now: float) -> Optional[Tuple[int, int, float]]:
+        """満杯か待ち時間切れのグループのうち、最も古い要求を含むもの"""
+        ready = [
+            (items[0].enqueued, key) for key, items in self._groups.items()
+            if len(items) >= self._limit(key) or now - items[0].enqueued >= self.max_wait
+        ]
+        return min(ready)[1] if ready else None
+
+    def _next_deadline(self, now: float) -> Optional[float]:
+        if not self._groups:
+            return None
+        oldest = min(items[0].enqueued for items in self._groups.values())
+        return max(0.0, oldest + self.max_wait - now)
+
+    def _take(self, key: Tuple[int, int, float]) -> List[_Item]:
+        items = self._groups[key]
+        limit = self._limit(key)
+        taken, rest = items[:limit], items[limit:]
+        if rest:
+            self._groups[key] = rest
+        else:
+            del self._groups[key]
+        return taken
+
+    def _limit(self, key: Tuple[int, int, float]) -> int:
+        """メモリ予算内に収まる最大バッチサイズ"""
+        ph, pw, scale = key
+        limit = self.max_batch
+        while limit > 1 and self.engine.plan_tiles(ph, pw, limit, scale) is not None:
+            limit //= 2
+        return limit
+
+    def _run(self, items: List[_Item]):
+        start = time.perf_counter()
+        for item in items:
+            item.waited = start - item.enqueued
+        try:
+            results = self._forward(items)
+        except Exception as e:
+            print(f"❌ Batch of {len(items)} failed: {e}")
+            for item in items:
+                item.future.set_exception(e)
+            return
+
+        with self._cond:
+            self._batches += 1
+            self._items += len(items)
+            self._histogram[len(items)] += 1
+            self._latencies.extend(item.waited for item in items)
+        for item, frame in zip(items, results):
+            item.future.set_result(frame)
+
+    def _forward(self, items: List[_Item]) -> List[np.ndarray]:
+        """ペアごとに1回だけエンコードし、全要求を1回の forward で推論"""
+        engine = self.engine
+        torch = engine.torch
+        scale = items[0].pair.scale
+        pairs: Dict[int, int] = {}
+        unique: List[_Pair] = []
+        for item in items:
+            if id(item.pair) not in pairs:
+                pairs[id(item.pair)] = len(unique)
+                unique.append(item.pair)
+
+        with torch.inference_mode():
+            t0 = torch.cat([engine.to_tensor(pair.img0, scale) for pair in unique])
+            t1 = torch.cat([engine.to_tensor(pair.img1, scale) for pair in unique])
+            f0 = engine.model.encode(t0)
+            f1 = engine.model.encode(t1)
+            rows = torch.tensor([pairs[id(item.pair)] for item in items], device=engine.device)
+            t = torch.tensor([item.timestep for item in items],
+                             dtype=t0.dtype, device=engine.device).view(-1, 1, 1, 1)
+            out = engine.model.inference(t0[rows], t1[rows], t, scale, f0=f0[rows], f1=f1[rows])
+            results = [engine.to_numpy(out[k:k + 1], item.pair.h, item.pair.w)
+                       for k, item in enumerate(items)]
+        with self._cond:
+            self._encoder_passes += 2 * len(unique)
+        return results
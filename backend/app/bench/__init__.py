@@ -0,0 +1,7 @@
+# /app/bench/__init__.py
+# ============================================================
+# ベンチマーク（推論コアと RIFEWorker の端から端までの処理時間）
+# 入力はすべてローカルで合成するのでダウンロード不要
+#   python -m bench run --out results.json          … 計測して JSON に保存
+#   python -m bench compare baseline.json results.json … 基準より遅くなったケースを報告
+# ============================================================
@@ -0,0 +1,122 @@
+# /app/bench/__main__.py
+# ============================================================
+# ベンチマークの CLI
+#   python -m bench run [--suite core e2e] [--quick] [--out results.json]
+#   python -m bench compare baseline.json results.json [--threshold 0.1]
+#     → 基準より遅くなったケースがあれば終了コード 1（CI で検出できる）
+# ============================================================
+
+import argparse
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from typing import List, Tuple
+
+from bench import report
+
+# 既定の計測範囲（--quick は CPU でも数分で終わる小さい組み合わせ）
+DEFAULTS = {
+    "resolutions": "640x360,1280x720,1920x1080",
+    "batches": "1,4,8",
+    "scales": "0.5,1.0",
+    "e2e_resolutions": "640x360,1280x720",
+}
+QUICK = {
+    "resolutions": "256x144,640x360",
+    "batches": "1,4",
+    "scales": "0.5,1.0",
+    "e2e_resolutions": "256x144",
+}
+
+
+def _sizes(value: str) -> List[Tuple[int, int]]:
+    return [tuple(int(v) for v in size.lower().split("x")) for size in value.split(",") if size]
+
+
+def _ints(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def _floats(value: str) -> List[float]:
+    return [float(v) for v in value.split(",") if v]
+
+
+def cmd_run(args) -> int:
+    from rife_worker import RIFEWorker
+
+    preset = QUICK if args.quick else DEFAULTS
+    work_dir = Path(tempfile.mkdtemp(prefix="rife-bench-"))
+    worker = RIFEWorker(storage=str(work_dir), mode="inprocess")
+    results = []
+    try:
+        worker.load()
+        if worker.engine is None:
+            print("❌ The benchmark needs the in-process model (check RIFE_MODEL_DIR / RIFE_REPO)")
+            return 2
+        engine = worker.engine
+        threads = _ints(args.threads) if args.threads else [engine.torch.get_num_threads()]
+
+        if "core" in args.suite:
+            from bench import core
+            results += core.run(engine,
+                                _sizes(args.resolutions or preset["resolutions"]),
+                                _ints(args.batches or preset["batches"]),
+                                _floats(args.scales or preset["scales"]),
+                                threads,
+                                repeat=args.repeat,
+                                warmup=args.warmup)
+        if "e2e" in args.suite:
+            from bench import e2e
+            engine.torch.set_num_threads(threads[-1])
+            results += e2e.run(worker, work_dir,
+                               _sizes(args.e2e_resolutions or preset["e2e_resolutions"]),
+                               seconds=args.seconds,
+                               repeat=args.e2e_repeat)
+    finally:
+        worker.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report.save(Path(args.out), report.environment(engine.torch, engine.device), results)
+    return 0
+
+
+def cmd_compare(args) -> int:
+    baseline, current = report.load(args.baseline), report.load(args.current)
+    result = report.compare(baseline, current, args.threshold)
+    report.print_comparison(baseline, current, result, args.threshold)
+    return 1 if result["regression"] else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench", description="RIFE benchmark suite")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="run benchmarks and write JSON")
+    run.add_argument("--suite", nargs="+", choices=("core", "e2e"), default=["core", "e2e"])
+    run.add_argument("--quick", action="store_true", help="small grid for a fast smoke run")
+    run.add_argument("--resolutions", help="e.g. 640x360,1920x1080")
+    run.add_argument("--batches", help="timesteps per forward, e.g. 1,4,8")
+    run.add_argument("--scales", help="flow scales, e.g. 0.5,1.0")
+    run.add_argument("--threads", help="torch thread counts, e.g. 1,4 (default: current)")
+    run.add_argument("--repeat", type=int, default=5)
+    run.add_argument("--warmup", type=int, default=1)
+    run.add_argument("--e2e-resolutions")
+    run.add_argument("--e2e-repeat", type=int, default=1)
+    run.add_argument("--seconds", type=float, default=2.0, help="length of the synthetic clip")
+    run.add_argument("--out", default="bench_results.json")
+    run.set_defaults(func=cmd_run)
+
+    compare = sub.add_parser("compare", help="flag regressions against a baseline")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    compare.add_argument("--threshold", type=float, default=0.10,
+                         help="relative slowdown of the median that counts as a regression")
+    compare.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
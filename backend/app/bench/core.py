@@ -0,0 +1,72 @@
+# /app/bench/core.py
+# ============================================================
+# 推論コアの計測
+#   head.encode     : Model.encode（Head による特徴量抽出、1フレーム）
+#   model.inference : Model.inference（Head を含む1回の forward、batch 個の timestep）
+#   ifnet.forward   : 特徴量を渡した IFNet の forward（フレーム間でキャッシュが効く場合のコスト）
+# 解像度 × バッチ × フロースケール × torch スレッド数の全組み合わせを計測する
+# ============================================================
+
+from typing import Iterable, List, Tuple
+
+from inference_engine import RIFEEngine
+from bench import synthetic
+from bench.report import case, measure
+
+
+def run(engine: RIFEEngine,
+        resolutions: Iterable[Tuple[int, int]],
+        batches: Iterable[int],
+        scales: Iterable[float],
+        threads: Iterable[int],
+        repeat: int = 5,
+        warmup: int = 1) -> List[dict]:
+    torch = engine.torch
+    model = engine.model
+    sync = torch.cuda.synchronize if engine.device.type == "cuda" else None
+    default_threads = torch.get_num_threads()
+    results: List[dict] = []
+    try:
+        for n_threads in threads:
+            torch.set_num_threads(n_threads)
+            for width, height in resolutions:
+                img0, img1 = synthetic.frame_pair(width, height)
+                for scale in scales:
+                    results += _run_resolution(engine, model, img0, img1, batches, scale, n_threads,
+                                               repeat, warmup, sync)
+    finally:
+        torch.set_num_threads(default_threads)
+    return results
+
+
+def _run_resolution(engine, model, img0, img1, batches, scale, n_threads, repeat, warmup, sync):
+    torch = engine.torch
+    height, width = img0.shape[:2]
+    res = f"{width}x{height}"
+    results = []
+    with torch.inference_mode():
+        t0 = engine.to_tensor(img0, scale)
+        t1 = engine.to_tensor(img1, scale)
+        f0, f1 = model.encode(t0), model.encode(t1)
+        ph, pw = t0.shape[2:]
+
+        params = {"res": res, "scale": scale, "threads": n_threads}
+        results.append(case("core", "head.encode", params,
+                            measure(lambda: model.encode(t0), repeat, warmup, sync), frames=1))
+
+        for batch in batches:
+            params = {"res": res, "batch": batch, "scale": scale, "threads": n_threads}
+            if engine.plan_tiles(ph, pw, batch, scale) is not None:
+                # 本番ではタイル分割される大きさ（メモリ予算超え）は計測しない
+                print(f"⏭️ core[{res}, batch={batch}] exceeds inference_memory_mb, skipped")
+                results.append({"id": f"core.skipped[{res},batch={batch},scale={scale}]",
+                                "suite": "core", "params": params, "skipped": "memory budget"})
+                continue
+            timesteps = [(i + 1) / (batch + 1) for i in range(batch)]
+            results.append(case("core", "model.inference", params, measure(
+                lambda: model.inference_batch(t0, t1, timesteps, scale), repeat, warmup, sync),
+                frames=batch))
+            results.append(case("core", "ifnet.forward", params, measure(
+                lambda: model.inference_batch(t0, t1, timesteps, scale, f0=f0, f1=f1),
+                repeat, warmup, sync), frames=batch))
+    return results
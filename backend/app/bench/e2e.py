@@ -0,0 +1,92 @@
+# /app/bench/e2e.py
+# ============================================================
+# RIFEWorker の端から端までの計測（ローカルの ffmpeg で合成した動画・画像を使う）
+#   video.stream : ffmpeg(rawvideo) → RIFE → ffmpeg のストリーミング経路
+#   video.frames : PNG 連番の抽出 → 補間 → エンコード
+#   preview      : /api/preview と同じ低解像度プレビュー
+#   frames.pair  : 2枚の画像から num_mid 枚を生成して動画化
+# 段階ごとの時間は Progress.set_stage の呼び出し時刻から求める
+# ============================================================
+
+import statistics
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from progress import Progress
+from rife_worker import RIFEWorker
+from bench import synthetic
+from bench.report import case
+
+
+class StageTimer(Progress):
+    """set_stage のたびに直前の段階の所要時間（ms）を積算する Progress"""
+
+    def __init__(self):
+        super().__init__("bench")
+        self.stages: Dict[str, float] = {}
+        self._current: Optional[str] = None
+        self._entered = time.perf_counter()
+
+    def set_stage(self, stage: str, total: Optional[int] = None):
+        self._close()
+        self._current, self._entered = stage, time.perf_counter()
+        super().set_stage(stage, total)
+
+    def finish(self) -> Dict[str, float]:
+        self._close()
+        self._current = None
+        return self.stages
+
+    def _close(self):
+        if self._current is not None:
+            elapsed = (time.perf_counter() - self._entered) * 1000
+            self.stages[self._current] = self.stages.get(self._current, 0.0) + elapsed
+
+
+def run(worker: RIFEWorker,
+        work_dir: Path,
+        resolutions: Iterable[Tuple[int, int]],
+        seconds: float = 2.0,
+        exp: int = 1,
+        repeat: int = 1) -> List[dict]:
+    results: List[dict] = []
+    out_dir = work_dir / "out"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for width, height in resolutions:
+        res = f"{width}x{height}"
+        clip = synthetic.make_clip(work_dir, width, height, seconds)
+        for pipeline in ("stream", "frames"):
+            worker.pipeline = pipeline
+            results.append(_timed(
+                f"video.{pipeline}", {"res": res, "seconds": seconds, "exp": exp}, repeat,
+                lambda progress: worker.interpolate_video(clip, out_dir / "video.mp4", exp=exp,
+                                                          progress=progress)))
+        results.append(_timed(
+            "preview", {"res": res, "exp": exp}, repeat,
+            lambda progress: worker.preview_video(clip, out_dir / "preview.mp4", exp=exp,
+                                                  progress=progress)))
+        frame_a, frame_b = synthetic.write_pair(work_dir, width, height)
+        results.append(_timed(
+            "frames.pair", {"res": res, "num_mid": 7}, repeat,
+            lambda progress: worker.interpolate_two_frames(frame_a, frame_b, out_dir / "pair.mp4",
+                                                           num_mid=7, progress=progress)))
+    return results
+
+
+def _timed(name: str, params: dict, repeat: int, fn) -> dict:
+    """fn(progress) を repeat 回実行し、合計時間と段階ごとの時間（中央値）を記録"""
+    samples, stages, result = [], [], {}
+    for _ in range(repeat):
+        timer = StageTimer()
+        t = time.perf_counter()
+        result = fn(timer)
+        samples.append((time.perf_counter() - t) * 1000)
+        stages.append(timer.finish())
+    frames = result.get("frames_out") or result.get("num_mid")
+    stage_ms = {key: round(statistics.median(s.get(key, 0.0) for s in stages), 3)
+                for key in stages[0]}
+    extra = {"stages_ms": stage_ms}
+    if "bottleneck" in result:
+        extra["bottleneck"] = result["bottleneck"]
+    return case("e2e", name, params, samples, frames=frames, **extra)
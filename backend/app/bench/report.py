@@ -0,0 +1,152 @@
+# /app/bench/report.py
+# ============================================================
+# 計測値の集計・JSON 保存・基準との比較
+# ケースは id（スイート.名前[パラメータ]）で対応づけ、中央値の比で判定する
+# ============================================================
+
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from settings import settings
+
+
+def measure(fn: Callable[[], object], repeat: int, warmup: int = 1,
+            sync: Optional[Callable[[], None]] = None) -> List[float]:
+    """fn を warmup 回捨ててから repeat 回計測し、ミリ秒のリストを返す（sync は GPU の完了待ち）"""
+    for _ in range(warmup):
+        fn()
+        if sync:
+            sync()
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        if sync:
+            sync()
+        samples.append((time.perf_counter() - t) * 1000)
+    return samples
+
+
+def summarize(samples: List[float]) -> dict:
+    ordered = sorted(samples)
+    return {
+        "median": round(statistics.median(ordered), 3),
+        "p90": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))], 3),
+        "mean": round(statistics.fmean(ordered), 3),
+        "min": round(ordered[0], 3),
+        "n": len(ordered),
+    }
+
+
+def case(suite: str, name: str, params: dict, samples: List[float],
+         frames: Optional[int] = None, **extra) -> dict:
+    """1ケース分の結果。frames を渡すと1フレームあたりの時間とスループットも付ける"""
+    ms = summarize(samples)
+    result = {
+        "id": f"{suite}.{name}[{','.join(f'{k}={v}' for k, v in params.items())}]",
+        "suite": suite,
+        "name": name,
+        "params": params,
+        "ms": ms,
+        **extra,
+    }
+    if frames:
+        result["ms_per_frame"] = round(ms["median"] / frames, 3)
+        result["fps"] = round(frames * 1000 / ms["median"], 2) if ms["median"] > 0 else None
+    print(f"⏱️ {result['id']}: median {ms['median']:.1f}ms"
+          + (f" ({result['fps']} fps)" if frames else ""))
+    return result
+
+
+def environment(torch=None, device=None) -> dict:
+    """結果を比べてよいか判断するための実行環境（マシンが違えば数値は比べられない）"""
+    from inference_engine import model_version
+    try:
+        version = model_version()
+    except OSError:
+        version = None
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, cwd=Path(__file__).parent).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "host": platform.node(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "torch": getattr(torch, "__version__", None),
+        "device": str(device) if device is not None else None,
+        "model_version": version,
+        "commit": commit,
+        "settings": {
+            "inference_memory_mb": settings.inference_memory_mb,
+            "timestep_batch": settings.timestep_batch,
+            "pipeline_depth": settings.pipeline_depth,
+            "scene_detect": settings.scene_detect,
+        },
+    }
+
+
+def save(path: Path, meta: dict, results: List[dict]):
+    Path(path).write_text(json.dumps({"meta": meta, "results": results}, indent=2, ensure_ascii=False))
+    print(f"💾 Saved {len(results)} result(s) → {path}")
+
+
+def load(path: Path) -> dict:
+    return json.loads(Path(path).read_text())
+
+
+# ============================================================
+# 📉 基準との比較
+# ============================================================
+_MACHINE_KEYS = ("machine", "processor", "cpu_count", "device", "torch")
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.10) -> Dict[str, list]:
+    """
+    中央値が基準より threshold（割合）以上遅ければ regression、速ければ improvement
+    片方にしかないケースは missing / new として返す
+    """
+    base = {r["id"]: r for r in baseline["results"] if "ms" in r}
+    cur = {r["id"]: r for r in current["results"] if "ms" in r}
+    report: Dict[str, list] = {"regression": [], "improvement": [], "unchanged": [],
+                               "missing": sorted(set(base) - set(cur)),
+                               "new": sorted(set(cur) - set(base))}
+    for key in sorted(set(base) & set(cur)):
+        before, after = base[key]["ms"]["median"], cur[key]["ms"]["median"]
+        ratio = after / before if before > 0 else float("inf")
+        entry = {"id": key, "baseline_ms": before, "current_ms": after, "ratio": round(ratio, 3)}
+        if ratio > 1 + threshold:
+            report["regression"].append(entry)
+        elif ratio < 1 - threshold:
+            report["improvement"].append(entry)
+        else:
+            report["unchanged"].append(entry)
+    return report
+
+
+def print_comparison(baseline: dict, current: dict, report: Dict[str, list], threshold: float):
+    mismatched = [k for k in _MACHINE_KEYS
+                  if baseline["meta"].get(k) != current["meta"].get(k)]
+    if mismatched:
+        print(f"⚠️ Environment differs from baseline ({', '.join(mismatched)}); "
+              "timings may not be comparable")
+    for label, icon in (("regression", "🔴"), ("improvement", "🟢"), ("unchanged", "⚪")):
+        for entry in report[label]:
+            print(f"{icon} {entry['id']}: {entry['baseline_ms']:.1f}ms → {entry['current_ms']:.1f}ms "
+                  f"(x{entry['ratio']:.2f})")
+    for key in report["missing"]:
+        print(f"❔ missing in current: {key}")
+    for key in report["new"]:
+        print(f"🆕 not in baseline: {key}")
+    print(f"📊 {len(report['regression'])} regression(s), {len(report['improvement'])} improvement(s) "
+          f"at ±{threshold:.0%}")
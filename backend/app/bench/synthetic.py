@@ -0,0 +1,53 @@
+# /app/bench/synthetic.py
+# ============================================================
+# 合成入力（シード固定なので毎回同じ内容になる）
+# ============================================================
+
+import subprocess
+from pathlib import Path
+from typing import Tuple
+
+import cv2
+import numpy as np
+
+
+def frame_pair(width: int, height: int, shift: int = 8, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    なめらかなノイズ模様を shift px だけ横にずらした2枚（BGR uint8）
+    一様ノイズだとフロー推定が現実の映像と違う負荷になるため、低解像度ノイズを拡大して模様にする
+    """
+    rng = np.random.default_rng(seed)
+    coarse = rng.integers(0, 256, (height // 16 + 2, (width + shift) // 16 + 2, 3), dtype=np.uint8)
+    canvas = cv2.resize(coarse, (width + shift, height), interpolation=cv2.INTER_CUBIC)
+    return (np.ascontiguousarray(canvas[:, :width]),
+            np.ascontiguousarray(canvas[:, shift:shift + width]))
+
+
+def write_pair(out_dir: Path, width: int, height: int) -> Tuple[Path, Path]:
+    """frame_pair を PNG に書き出す（2枚補間の計測用）"""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = (out_dir / f"a_{width}x{height}.png", out_dir / f"b_{width}x{height}.png")
+    for path, frame in zip(paths, frame_pair(width, height)):
+        if not path.exists():
+            cv2.imwrite(str(path), frame)
+    return paths
+
+
+def make_clip(out_dir: Path, width: int, height: int, seconds: float, fps: int = 24) -> Path:
+    """ffmpeg の testsrc2（動く図形とカウンタ）で H.264 のテスト動画を作る。作成済みなら使い回す"""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    path = out_dir / f"clip_{width}x{height}_{seconds:g}s_{fps}fps.mp4"
+    if not path.exists():
+        cmd = [
+            "ffmpeg",
+            "-nostdin",
+            "-y",
+            "-v", "error",
+            "-f", "lavfi",
+            "-i", f"testsrc2=size={width}x{height}:rate={fps}:duration={seconds}",
+            "-pix_fmt", "yuv420p",
+            "-crf", "18",
+            str(path),
+        ]
+        subprocess.run(cmd, check=True)
+    return path
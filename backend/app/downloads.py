@@ -0,0 +1,149 @@
+# /app/downloads.py
+# ============================================================
+# ダウンロード用のレスポンス
+#   - Range / If-Range 対応のファイル配信（途中から再開できる。Starlette 0.38 の FileResponse は Range 非対応）
+#   - 中間フレーム ZIP はジョブ完了時に1回だけ作って使い回す（PNG は圧縮済みなので無圧縮で格納）
+# ============================================================
+
+import os
+import re
+import threading
+import zipfile
+from email.utils import formatdate
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+_CHUNK = 1 << 20
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+
+# 既に圧縮されている形式は deflate しても縮まないので stored で格納
+_STORED_SUFFIXES = {".png", ".jpg", ".jpeg", ".webp", ".mp4"}
+
+
+class RangeNotSatisfiable(Exception):
+    """Range がファイルサイズの範囲外（416）"""
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    `Range: bytes=start-end` を (start, end)（end を含む）にする
+    単一範囲だけ扱い、複数範囲や解釈できない指定は None（全体を返す）
+    """
+    m = _RANGE.fullmatch(header.strip().lower())
+    if m is None or not any(m.groups()):
+        return None
+    first, last = m.groups()
+    if not first:
+        # bytes=-N : 末尾 N バイト
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise RangeNotSatisfiable(header)
+    return start, end
+
+
+def _read(f, start: int, end: int) -> Iterator[bytes]:
+    try:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(_CHUNK, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+def file_response(path: Path, request: Request, media_type: str,
+                  filename: Optional[str] = None) -> Response:
+    """
+    Range 付きなら 206 で指定範囲だけ、なければ 200 で全体を Content-Length 付きで返す
+    If-Range の ETag が変わっていたら（ファイルが作り直された）Range を無視して全体を返す
+    """
+    path = Path(path)
+    f = path.open("rb")
+    st = os.fstat(f.fileno())
+    size = st.st_size
+    tag = f'"{st.st_mtime_ns:x}-{size:x}"'
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": tag,
+        "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+    }
+    if filename:
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+
+    start, end, status = 0, size - 1, 200
+    header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if header and (if_range is None or if_range == tag):
+        try:
+            span = parse_range(header, size)
+        except RangeNotSatisfiable:
+            f.close()
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        if span is not None:
+            start, end = span
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(_read(f, start, end), status_code=status,
+                             media_type=media_type, headers=headers)
+
+
+# ============================================================
+# 🗜️ 中間フレーム ZIP（ジョブごとに1回だけ作成）
+# ============================================================
+# 作成中の ZIP だけロックを持つ（作り終えたら外すので、ジョブ数に比例して増えない）
+_zip_locks: Dict[Path, threading.Lock] = {}
+_zip_locks_guard = threading.Lock()
+
+
+def build_zip(folder: Path, zip_path: Path) -> Path:
+    """folder の中身を ZIP にする。一時ファイルに書いてから置き換えるので、作成途中のものは配信されない"""
+    tmp = zip_path.with_name(f".{zip_path.name}.{os.getpid()}.{threading.get_ident()}")
+    try:
+        with zipfile.ZipFile(tmp, "w", allowZip64=True) as zf:
+            for path in sorted(folder.rglob("*")):
+                if path.is_file():
+                    compress = zipfile.ZIP_STORED if path.suffix.lower() in _STORED_SUFFIXES \
+                        else zipfile.ZIP_DEFLATED
+                    zf.write(path, path.relative_to(folder), compress_type=compress)
+        os.replace(tmp, zip_path)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return zip_path
+
+
+def ensure_zip(folder: Path, zip_path: Path) -> Path:
+    """作成済みならそのまま返し、なければ作る（同じ ZIP の同時作成は1回にまとめる）"""
+    with _zip_locks_guard:
+        lock = _zip_locks.setdefault(zip_path, threading.Lock())
+    try:
+        with lock:
+            if not zip_path.exists():
+                build_zip(folder, zip_path)
+                print(f"🗜️ Built {zip_path.name} ({zip_path.stat().st_size / 2 ** 20:.1f}MB)")
+    finally:
+        # 待っていた呼び出しは同じロックを持っているので、外した後に来た呼び出しは作成済みの ZIP を返すだけ
+        with _zip_locks_guard:
+            if _zip_locks.get(zip_path) is lock:
+                del _zip_locks[zip_path]
+    return zip_path
+
+
+def forget_zips(path: Path):
+    """path（ディレクトリならその下）の ZIP のロックを外す（ジョブの成果物を削除したとき）"""
+    path = Path(path)
+    with _zip_locks_guard:
+        for zip_path in [p for p in _zip_locks if p == path or path in p.parents]:
+            del _zip_locks[zip_path]
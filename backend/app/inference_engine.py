@@ -0,0 +1,282 @@
+# /app/inference_engine.py
+# ============================================================
+# RIFE モデルをプロセス内に常駐させる推論エンジン
+# train_log/RIFE_HDv3.Model を一度だけロードし、以後は Python API で推論する
+# ============================================================
+
+import hashlib
+import sys
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from settings import settings
+
+# Practical-RIFE の --scale で有効なフロースケール
+FLOW_SCALES = (0.25, 0.5, 1.0, 2.0, 4.0)
+
+# IFNet forward のピーク使用メモリ（float32, バッチ1枚・1画素あたりの実測値）
+_BYTES_PER_PIXEL = 1200
+
+
+def auto_flow_scale(width: int, height: int) -> float:
+    """
+    解像度からフロースケールを自動選択
+    1080p 以下は 1.0、4K 級は 0.5、8K 級は 0.25（scale_list を粗くして高速化）
+    """
+    pixels = width * height
+    if pixels > 4096 * 2160 * 2:
+        return 0.25
+    if pixels > 2560 * 1440:
+        return 0.5
+    return 1.0
+
+
+@lru_cache(maxsize=4)
+def model_version(model_dir: str = settings.rife_model_dir) -> str:
+    """重みファイル flownet.pkl の内容ハッシュ（結果キャッシュのキーに使う）"""
+    weights = Path(model_dir) / "flownet.pkl"
+    if not weights.exists():
+        return "unknown"
+    h = hashlib.sha256()
+    with open(weights, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()[:16]
+
+
+class RIFEEngine:
+    """RIFE_HDv3.Model を常駐させて補間を行う推論エンジン"""
+
+    def __init__(self,
+                 model_dir: str = settings.rife_model_dir,
+                 rife_repo: str = settings.rife_repo):
+        self.model_dir = Path(model_dir)
+        self.rife_repo = Path(rife_repo)
+        self.model = None
+        self.torch = None
+        self.device = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self.model is not None
+
+    # ============================================================
+    # 🧠 モデルロード（アプリ起動時に一度だけ）
+    # ============================================================
+    def load(self) -> "RIFEEngine":
+        with self._lock:
+            if self.model is not None:
+                return self
+
+            # model.warplayer は RIFE 本体、train_log はモデルフォルダの親から import
+            for path in (str(self.rife_repo), str(self.model_dir.parent)):
+                if path not in sys.path:
+                    sys.path.insert(0, path)
+
+            import torch
+            from train_log.RIFE_HDv3 import Model, FeatureCache
+
+            torch.set_grad_enabled(False)
+            if torch.cuda.is_available():
+                torch.backends.cudnn.enabled = True
+                torch.backends.cudnn.benchmark = True
+
+            model = Model()
+            model.load_model(str(self.model_dir), -1)
+            model.eval()
+            model.device()
+
+            self.torch = torch
+            self._feature_cache_cls = FeatureCache
+            self.device = next(model.flownet.parameters()).device
+            self.model = model
+            print(f"🧠 RIFE model loaded (v{model.version}) on {self.device}")
+        return self
+
+    # ============================================================
+    # 🔁 numpy ⇔ tensor 変換
+    # ============================================================
+    @staticmethod
+    def pad_unit(scale: float = 1.0) -> int:
+        """フローピラミッドが要求するパディング単位（inference_video.py と同じ）"""
+        return max(128, int(128 / scale))
+
+    def to_tensor(self, frame: np.ndarray, scale: float = 1.0):
+        """
+        HxWx3 uint8 (BGR) → 1x3xHpxWp float tensor（パディング付き）
+        uint8 配列は from_numpy でコピーせずに参照し、float 化のみで1回コピーする
+        """
+        torch = self.torch
+        h, w = frame.shape[:2]
+        unit = self.pad_unit(scale)
+        ph = ((h - 1) // unit + 1) * unit
+        pw = ((w - 1) // unit + 1) * unit
+        img = torch.from_numpy(frame).to(self.device, non_blocking=True)
+        img = img.permute(2, 0, 1).unsqueeze(0).float().div_(255.)
+        return torch.nn.functional.pad(img, (0, pw - w, 0, ph - h))
+
+    @staticmethod
+    def to_numpy(img, h: int, w: int) -> np.ndarray:
+        """1x3xHpxWp tensor → HxWx3 uint8（パディング除去）"""
+        return RIFEEngine.to_numpy_batch(img, h, w)[0]
+
+    @staticmethod
+    def to_numpy_batch(imgs, h: int, w: int) -> List[np.ndarray]:
+        """Nx3xHpxWp tensor → HxWx3 uint8 のリスト（まとめて1回だけ転送）"""
+        out = imgs[:, :, :h, :w].permute(0, 2, 3, 1).mul(255.).clamp_(0, 255).byte()
+        return list(out.contiguous().cpu().numpy())
+
+    # ============================================================
+    # 🧩 タイル分割（4K 以上をメモリ予算内で推論）
+    # ============================================================
+    def plan_tiles(self, h: int, w: int, batch: int = 1, scale: float = 1.0) -> Optional[int]:
+        """
+        メモリ予算 (inference_memory_mb) に収まる正方タイルの一辺を返す
+        フレーム全体が予算内なら None（タイル分割なし）
+        一辺は pad_unit の倍数なので、フローピラミッドのパディング要件をそのまま満たす
+        """
+        budget = settings.inference_memory_mb * 2 ** 20
+        unit = self.pad_unit(scale)
+        ph = ((h - 1) // unit + 1) * unit
+        pw = ((w - 1) // unit + 1) * unit
+        if budget <= 0 or ph * pw * batch * _BYTES_PER_PIXEL <= budget:
+            return None
+        side = int((budget / (batch * _BYTES_PER_PIXEL)) ** 0.5) // unit * unit
+        return max(side, 2 * unit)
+
+    def plan_batch(self, h: int, w: int, n: int, scale: float = 1.0,
+                   batch_size: Optional[int] = None) -> Tuple[int, Optional[int]]:
+        """n 枚の timestep を推論するときの (バッチサイズ, タイル一辺 or None)"""
+        batch_size = max(1, min(batch_size or settings.timestep_batch, n))
+        tile = self.plan_tiles(h, w, batch_size, scale)
+        if tile is not None and batch_size > 1 and tile <= 2 * self.pad_unit(scale):
+            # バッチのせいでタイルが小さくなりすぎる場合は1枚ずつ処理する
+            batch_size = 1
+            tile = self.plan_tiles(h, w, 1, scale)
+        return batch_size, tile
+
+    @staticmethod
+    def _tile_starts(length: int, tile: int, overlap: int) -> List[int]:
+        if length <= tile:
+            return [0]
+        starts = list(range(0, length - tile, tile - overlap))
+        return starts + [length - tile]
+
+    def _feather(self, th: int, tw: int, y: int, x: int, h: int, w: int, overlap: int):
+        """タイル内側の辺だけ overlap 幅で線形に重みを落とすブレンド用マスク"""
+        torch = self.torch
+        ramp = (torch.arange(overlap, device=self.device, dtype=torch.float32) + 1) / (overlap + 1)
+        wy = torch.ones(th, device=self.device)
+        wx = torch.ones(tw, device=self.device)
+        if y > 0:
+            wy[:overlap] = ramp
+        if y + th < h:
+            wy[-overlap:] = ramp.flip(0)
+        if x > 0:
+            wx[:overlap] = ramp
+        if x + tw < w:
+            wx[-overlap:] = ramp.flip(0)
+        return (wy[:, None] * wx[None, :])[None, None]
+
+    def _inference_tiled(self, img0: np.ndarray, img1: np.ndarray, timesteps, scale: float,
+                         tile: int, batch_size: int, cache, keys) -> List[np.ndarray]:
+        """
+        重なり付きタイルごとに推論し、継ぎ目をフェザーブレンドして1枚に戻す
+        入力はタイルごとに numpy から切り出してから tensor 化・エンコードするので、
+        デバイス上にはフレーム全体の入力も特徴量も置かない（Head 特徴量は (フレーム番号, y, x) でキャッシュ）
+        ブレンド途中の出力はホスト側に溜める
+        """
+        h, w = img0.shape[:2]
+        # タイルはパディング後のフレーム上に並べる（端のタイルはフレーム全体で推論したときと同じゼロ埋めを含む）
+        unit = self.pad_unit(scale)
+        ph = ((h - 1) // unit + 1) * unit
+        pw = ((w - 1) // unit + 1) * unit
+        overlap = min(settings.tile_overlap, tile // 4)
+        out = np.zeros((len(timesteps), ph, pw, 3), dtype=np.float32)
+        weight = np.zeros((ph, pw, 1), dtype=np.float32)
+        for y in self._tile_starts(ph, tile, overlap):
+            for x in self._tile_starts(pw, tile, overlap):
+                th, tw = min(tile, ph), min(tile, pw)
+                t0 = self._tile_tensor(img0, y, x, th, tw, scale)
+                t1 = self._tile_tensor(img1, y, x, th, tw, scale)
+                f0 = cache.get((keys[0], y, x), t0, self.model.encode)
+                f1 = cache.get((keys[1], y, x), t1, self.model.encode)
+                mask = self._feather(th, tw, y, x, ph, pw, overlap)
+                for i in range(0, len(timesteps), batch_size):
+                    chunk = timesteps[i:i + batch_size]
+                    res = self.model.inference_batch(t0, t1, chunk, scale, f0=f0, f1=f1)
+                    res = (res * mask).permute(0, 2, 3, 1)
+                    out[i:i + len(chunk), y:y + th, x:x + tw] += res.cpu().numpy()
+                weight[y:y + th, x:x + tw] += mask[0, 0, :, :, None].cpu().numpy()
+        out = out[:, :h, :w] * (255. / weight[:h, :w])
+        return list(np.clip(out, 0, 255).astype(np.uint8))
+
+    def _tile_tensor(self, frame: np.ndarray, y: int, x: int, th: int, tw: int, scale: float):
+        """フレームの (y, x) から th x tw を切り出して tensor 化（フレーム外はゼロ埋め）"""
+        img = self.to_tensor(frame[y:y + th, x:x + tw], scale)
+        return self.torch.nn.functional.pad(img, (0, tw - img.shape[3], 0, th - img.shape[2]))
+
+    # ============================================================
+    # 🗂️ エンコーダ特徴量キャッシュ（ジョブごとに1つ）
+    # ============================================================
+    def new_cache(self, capacity: int = settings.feature_cache_size):
+        """フレーム番号をキーにした Head 特徴量の LRU キャッシュを作成"""
+        self.load()
+        return self._feature_cache_cls(capacity)
+
+    # ============================================================
+    # 🎯 補間 API
+    # ============================================================
+    def interpolate(self,
+                    img0: np.ndarray,
+                    img1: np.ndarray,
+                    timestep: float = 0.5,
+                    scale: float = 1.0) -> np.ndarray:
+        """2枚のフレームから timestep 位置の中間フレームを1枚生成"""
+        return self.interpolate_n(img0, img1, 1, scale=scale, timesteps=[timestep])[0]
+
+    def interpolate_n(self,
+                      img0: np.ndarray,
+                      img1: np.ndarray,
+                      n: int,
+                      scale: float = 1.0,
+                      timesteps: List[float] = None,
+                      cache=None,
+                      keys: Optional[Tuple[Hashable, Hashable]] = None,
+                      batch_size: Optional[int] = None) -> List[np.ndarray]:
+        """
+        2枚のフレーム間に n 枚の中間フレームを生成
+        timestep は inference_video.py と同じく (i+1)/(n+1) の等間隔
+        cache と keys（2枚のフレーム番号）を渡すと Head 特徴量を再利用する
+        timestep は最大 batch_size 枚ずつ1回の forward にまとめて推論する
+        フレームがメモリ予算を超える場合はタイル分割して推論する
+        """
+        self.load()
+        h, w = img0.shape[:2]
+        if timesteps is None:
+            timesteps = [(i + 1) / (n + 1) for i in range(n)]
+        if not timesteps:
+            return []  # 推論する timestep がなければ両端のエンコードもしない
+        if cache is None:
+            cache = self.new_cache()
+            keys = (0, 1)
+        batch_size, tile = self.plan_batch(h, w, len(timesteps), scale, batch_size)
+
+        results: List[np.ndarray] = []
+        with self.torch.inference_mode():
+            if tile is not None:
+                return self._inference_tiled(img0, img1, timesteps, scale, tile, batch_size, cache, keys)
+            t0 = self.to_tensor(img0, scale)
+            t1 = self.to_tensor(img1, scale)
+            f0 = cache.get(keys[0], t0, self.model.encode)
+            f1 = cache.get(keys[1], t1, self.model.encode)
+            for i in range(0, len(timesteps), batch_size):
+                chunk = timesteps[i:i + batch_size]
+                out = self.model.inference_batch(t0, t1, chunk, scale, f0=f0, f1=f1)
+                results.extend(self.to_numpy_batch(out, h, w))
+        return results
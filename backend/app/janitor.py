@@ -0,0 +1,240 @@
+# /app/janitor.py
+# ============================================================
+# /data のストレージ管理
+# ジョブごとの成果物を記録し、TTL 切れの削除と容量上限での LRU 追い出しを定期実行する
+# （中間フレームはエンコード直後にワーカー側で削除）
+# ============================================================
+
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from settings import settings
+from downloads import forget_zips
+from job_store import JobStore, EXPIRED
+from uploads import UploadManager
+
+# ファイル名 → 使用量の分類（ジョブに紐づかないものも含めてディレクトリを走査して集計する）
+_CATEGORIES = (
+    ("database", lambda p: p.name.startswith("jobs.db")),
+    ("cache", lambda p: p.parts[0] == "cache"),
+    ("uploads", lambda p: p.parts[0] == "uploads"),
+    ("scratch", lambda p: p.parts[0] in ("scratch", "tmp_frames") or p.parts[0].endswith("_segments")),
+    ("zips", lambda p: p.suffix == ".zip"),
+    ("frames", lambda p: p.parts[0].endswith("_seq_frames")),
+    ("streams", lambda p: p.parts[0].endswith("_hls")),
+    ("profiles", lambda p: p.parts[0].endswith("_profile")),
+    ("inputs", lambda p: p.name.endswith(("_in.mp4", "_a.png", "_b.png"))),
+    ("outputs", lambda p: p.name.endswith(("_out.mp4", "_seq.mp4", "_preview.mp4"))),
+)
+
+
+def _category(rel: Path) -> str:
+    for name, match in _CATEGORIES:
+        if match(rel):
+            return name
+    return "other"
+
+
+def path_size(path: Path) -> int:
+    path = Path(path)
+    if path.is_dir():
+        return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+    return path.stat().st_size if path.exists() else 0
+
+
+def freed_size(paths: Iterable[Path]) -> int:
+    """
+    paths（ディレクトリは中身）を消したときに実際に空くバイト数
+    結果キャッシュ・アップロードとハードリンクを共有するファイルは、他のリンクが残るので数えない
+    """
+    links: Dict[Tuple[int, int], list] = {}
+    for path in map(Path, paths):
+        for file in (path.rglob("*") if path.is_dir() else [path]):
+            try:
+                st = file.lstat()
+            except FileNotFoundError:
+                continue
+            if file.is_file():
+                entry = links.setdefault((st.st_dev, st.st_ino), [st.st_nlink, st.st_size, 0])
+                entry[2] += 1
+    return sum(size for nlink, size, removed in links.values() if removed >= nlink)
+
+
+def remove_path(path: Path):
+    path = Path(path)
+    if path.is_dir():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        path.unlink(missing_ok=True)
+
+
+class Janitor:
+    """成果物の記録・使用量の集計・TTL / 容量による削除"""
+
+    def __init__(self,
+                 store: JobStore,
+                 root: Optional[Path] = None,
+                 ttl_hours: float = settings.storage_ttl_hours,
+                 quota_mb: int = settings.storage_quota_mb,
+                 interval: float = settings.janitor_interval_s,
+                 uploads: Optional[UploadManager] = None):
+        self.store = store
+        self.uploads = uploads
+        self.root = Path(root or settings.storage)
+        self.ttl = ttl_hours * 3600
+        self.quota = quota_mb * 2 ** 20
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.expired = 0
+        self.evicted = 0
+        self.bytes_freed = 0
+        self._usage: Optional[Tuple[float, dict]] = None  # (走査した時刻, 結果)
+
+    # ============================================================
+    # 📝 記録
+    # ============================================================
+    def register(self, job_id: str, artifacts: Iterable[Tuple[str, Path]]):
+        """ジョブ完了時に (category, path) を記録（存在するものだけ）"""
+        rows = [(category, Path(path), path_size(path)) for category, path in artifacts
+                if path and Path(path).exists()]
+        if rows:
+            self.store.add_artifacts(job_id, rows)
+
+    def touch(self, job_id: str):
+        self.store.touch_artifacts(job_id)
+
+    # ============================================================
+    # 📊 使用量（分類ごと）
+    # ============================================================
+    def usage(self, max_age: float = 0) -> dict:
+        """
+        ディレクトリを走査して分類ごとのファイル数・バイト数を返す（ハードリンクは1回だけ数える）
+        max_age 秒以内に走査済みならその結果を返す（/metrics のように頻繁に読まれる場合）
+        """
+        cached = self._usage
+        if max_age > 0 and cached is not None and time.monotonic() - cached[0] < max_age:
+            return cached[1]
+        categories: Dict[str, Dict[str, int]] = {}
+        seen = set()
+        total = 0
+        for path in self.root.rglob("*"):
+            try:
+                st = path.lstat()
+            except FileNotFoundError:
+                continue
+            if not path.is_file() or (st.st_dev, st.st_ino) in seen:
+                continue
+            seen.add((st.st_dev, st.st_ino))
+            entry = categories.setdefault(_category(path.relative_to(self.root)), {"files": 0, "bytes": 0})
+            entry["files"] += 1
+            entry["bytes"] += st.st_size
+            total += st.st_size
+        disk = shutil.disk_usage(self.root)
+        result = {
+            "categories": categories,
+            "total_bytes": total,
+            "quota_bytes": self.quota or None,
+            "ttl_hours": self.ttl / 3600 if self.ttl else None,
+            "disk_free_bytes": disk.free,
+            "expired_jobs": self.expired,
+            "evicted_jobs": self.evicted,
+            "bytes_freed": self.bytes_freed,
+        }
+        self._usage = (time.monotonic(), result)
+        return result
+
+    # ============================================================
+    # 🧹 掃除
+    # ============================================================
+    def sweep(self) -> dict:
+        """TTL 切れ → 容量超過の順にジョブ単位で成果物を削除"""
+        now = time.time()
+        expired = evicted = 0
+        jobs = self.store.artifact_jobs()
+        active = {row["id"] for row in self.store.by_status("queued", "running")}
+        jobs = [job for job in jobs if job["job_id"] not in active]
+
+        if self.ttl > 0:
+            for job in [j for j in jobs if now - j["last_access"] > self.ttl]:
+                self._expire(job["job_id"], "expired (ttl)")
+                expired += 1
+            jobs = [j for j in jobs if now - j["last_access"] <= self.ttl]
+
+        if self.quota > 0:
+            # 上限と比べるのは消せば空くジョブの成果物だけ
+            # （結果キャッシュ・アップロード・jobs.db は消さないし、キャッシュとリンクを共有する出力は消しても空かない）
+            paths = {job["job_id"]: [a["path"] for a in self.store.artifacts(job["job_id"])] for job in jobs}
+            used = freed_size(path for job_paths in paths.values() for path in job_paths)
+            for job in jobs:  # 最終アクセスが古い順
+                if used <= self.quota:
+                    break
+                if not freed_size(paths[job["job_id"]]):
+                    continue  # 消しても何も空かないジョブは残す
+                used -= self._expire(job["job_id"], "evicted (storage quota)")
+                evicted += 1
+
+        stale = self._sweep_uploads(now)
+        self.expired += expired
+        self.evicted += evicted
+        if expired or evicted or stale:
+            print(f"🧹 Janitor: expired={expired} evicted={evicted} stale_uploads={stale}")
+        return {"expired": expired, "evicted": evicted, "stale_uploads": stale}
+
+    def _expire(self, job_id: str, reason: str) -> int:
+        """ジョブの成果物を削除し、実際に空いたバイト数を返す"""
+        paths = [artifact["path"] for artifact in self.store.artifacts(job_id)]
+        freed = freed_size(paths)
+        for path in paths:
+            remove_path(path)
+            forget_zips(path)
+        self.store.delete_artifacts(job_id)
+        self.store.update(job_id, status=EXPIRED, error=reason, output_url=None, frames_url=None)
+        self.bytes_freed += freed
+        return freed
+
+    def _sweep_uploads(self, now: float) -> int:
+        """TTL を過ぎても完了しない分割アップロードを削除"""
+        if self.ttl <= 0:
+            return 0
+        count = 0
+        root = self.uploads.root if self.uploads is not None else self.root / "uploads"
+        for part in root.glob("*.part"):
+            if now - part.stat().st_mtime <= self.ttl:
+                continue
+            count += 1
+            if self.uploads is not None:
+                # UploadManager 経由で消すと、受信途中のハッシュ状態とロックも一緒に消える
+                try:
+                    self.uploads.delete(part.stem)
+                    continue
+                except KeyError:
+                    pass  # メタデータのない .part
+            remove_path(part)
+            remove_path(part.with_suffix(".json"))
+        return count
+
+    # ============================================================
+    # ▶️ 定期実行
+    # ============================================================
+    def start(self):
+        if self._thread is None and self.interval > 0:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="storage-janitor", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"⚠️ Janitor sweep failed: {e}")
@@ -0,0 +1,256 @@
+# /app/job_store.py
+# ============================================================
+# SQLite（WAL モード）によるジョブ情報の永続化
+# コンテナ再起動後もジョブ記録を保持し、複数の uvicorn ワーカーから同じ内容を参照できる
+# ============================================================
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+from uuid import uuid4
+
+from settings import settings
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          TEXT PRIMARY KEY,
+    kind        TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    owner       TEXT,
+    params      TEXT,
+    files       TEXT,
+    result      TEXT,
+    progress    TEXT,
+    output_url  TEXT,
+    frames_url  TEXT,
+    error       TEXT,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    created_at  REAL NOT NULL,
+    started_at  REAL,
+    finished_at REAL,
+    updated_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS artifacts (
+    job_id      TEXT NOT NULL,
+    category    TEXT NOT NULL,
+    path        TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    created_at  REAL NOT NULL,
+    last_access REAL NOT NULL,
+    PRIMARY KEY (job_id, path)
+);
+CREATE INDEX IF NOT EXISTS artifacts_access ON artifacts (last_access);
+CREATE TABLE IF NOT EXISTS owners (
+    owner       TEXT PRIMARY KEY,
+    heartbeat   REAL NOT NULL
+);
+"""
+
+# JSON で保存する列
+_JSON_COLUMNS = ("params", "files", "result", "progress")
+_COLUMNS = ("kind", "status", "owner", "params", "files", "result", "progress",
+            "output_url", "frames_url", "error", "attempts",
+            "created_at", "started_at", "finished_at")
+
+ACTIVE = ("queued", "running")
+FINISHED = ("done", "error")
+EXPIRED = "expired"
+
+
+class JobStore:
+    """jobs テーブルへの読み書き（スレッドごとに接続を持つ）"""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path or Path(settings.storage) / "jobs.db")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # このプロセスを識別するトークン（再起動後の回収で他プロセスのジョブと区別する）
+        self.owner = f"{os.getpid()}-{uuid4().hex[:8]}"
+        self._local = threading.local()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+        self.heartbeat()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ============================================================
+    # 💓 生存確認（owner_lease_s 以上 heartbeat のないプロセスのジョブだけを回収する）
+    # ============================================================
+    def heartbeat(self):
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO owners (owner, heartbeat) VALUES (?, ?)",
+                         (self.owner, time.time()))
+
+    def release(self):
+        """終了時に生存記録を消す（残ったジョブは他のワーカーが次の heartbeat で回収する）"""
+        with self._conn() as conn:
+            conn.execute("DELETE FROM owners WHERE owner = ?", (self.owner,))
+
+    def start(self, on_beat: Optional[Callable[[], None]] = None):
+        """owner_lease_s の 1/3 ごとに heartbeat し、そのたびに on_beat（中断ジョブの回収）を呼ぶ"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, args=(on_beat,),
+                                            name="job-heartbeat", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+        self.release()
+
+    def _loop(self, on_beat: Optional[Callable[[], None]]):
+        while not self._stop.wait(settings.owner_lease_s / 3):
+            try:
+                self.heartbeat()
+                if on_beat is not None:
+                    on_beat()
+            except Exception as e:
+                print(f"⚠️ Job heartbeat failed: {e}")
+
+    # ============================================================
+    # ✏️ 書き込み
+    # ============================================================
+    def create(self, job_id: str, kind: str,
+               params: Optional[Dict[str, Any]] = None,
+               files: Optional[Dict[str, Any]] = None,
+               status: str = "queued") -> dict:
+        now = time.time()
+        row = {
+            "id": job_id, "kind": kind, "status": status, "owner": self.owner,
+            "params": params or {}, "files": files or {},
+            "created_at": now, "updated_at": now,
+        }
+        with self._conn() as conn:
+            conn.execute(
+                f"INSERT INTO jobs ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})",
+                [_encode(k, v) for k, v in row.items()],
+            )
+        return self.get(job_id)
+
+    def update(self, job_id: str, **fields) -> None:
+        """
+        指定した列だけを更新する
+        status が running になった時刻を started_at、done / error になった時刻を finished_at に記録
+        """
+        unknown = set(fields) - set(_COLUMNS)
+        if unknown:
+            raise ValueError(f"unknown job fields: {sorted(unknown)}")
+        now = time.time()
+        status = fields.get("status")
+        if status == "running":
+            fields.setdefault("started_at", now)
+        elif status in FINISHED:
+            fields.setdefault("finished_at", now)
+        fields["updated_at"] = now
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        with self._conn() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?",
+                         [_encode(k, v) for k, v in fields.items()] + [job_id])
+
+    def claim(self, job_id: str, previous_owner: Optional[str]) -> bool:
+        """中断ジョブを自プロセスの担当として取得（複数ワーカーが同時に回収しても1つだけ成功）"""
+        with self._conn() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET owner = ?, status = 'queued', attempts = attempts + 1, "
+                "started_at = NULL, updated_at = ? "
+                "WHERE id = ? AND owner IS ? AND status IN ('queued', 'running')",
+                (self.owner, time.time(), job_id, previous_owner),
+            )
+            return cur.rowcount == 1
+
+    # ============================================================
+    # 🔍 読み出し
+    # ============================================================
+    def get(self, job_id: str) -> Optional[dict]:
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _decode(row) if row else None
+
+    def by_status(self, *statuses: str, limit: Optional[int] = None) -> List[dict]:
+        sql = f"SELECT * FROM jobs WHERE status IN ({', '.join('?' * len(statuses))}) ORDER BY created_at"
+        args: list = list(statuses)
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(limit)
+        return [_decode(row) for row in self._conn().execute(sql, args)]
+
+    def interrupted(self) -> List[dict]:
+        """
+        終了したプロセス（再起動前の自分を含む）が実行待ち / 実行中のまま残したジョブ
+        heartbeat が owner_lease_s 以内のプロセスは生きているので、そのジョブには触らない
+        """
+        rows = self._conn().execute(
+            "SELECT * FROM jobs WHERE status IN (?, ?) AND owner IS NOT ? "
+            "AND (owner IS NULL OR owner NOT IN (SELECT owner FROM owners WHERE heartbeat >= ?)) "
+            "ORDER BY created_at",
+            (*ACTIVE, self.owner, time.time() - settings.owner_lease_s),
+        )
+        return [_decode(row) for row in rows]
+
+    # ============================================================
+    # 🗃️ 成果物（ジョブごとのファイル・サイズ・最終アクセス）
+    # ============================================================
+    def add_artifacts(self, job_id: str, artifacts: List[tuple]):
+        """artifacts: (category, path, size) のリスト"""
+        now = time.time()
+        with self._conn() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO artifacts (job_id, category, path, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(job_id, category, str(path), size, now, now) for category, path, size in artifacts],
+            )
+
+    def touch_artifacts(self, job_id: str):
+        """ダウンロードされたら最終アクセス時刻を更新（LRU 追い出しの基準）"""
+        with self._conn() as conn:
+            conn.execute("UPDATE artifacts SET last_access = ? WHERE job_id = ?", (time.time(), job_id))
+
+    def artifact_jobs(self) -> List[dict]:
+        """成果物を持つジョブを最終アクセスの古い順に（合計サイズ付き）"""
+        rows = self._conn().execute(
+            "SELECT job_id, MAX(last_access) AS last_access, SUM(size) AS size, COUNT(*) AS files "
+            "FROM artifacts GROUP BY job_id ORDER BY last_access"
+        )
+        return [dict(row) for row in rows]
+
+    def artifacts(self, job_id: str) -> List[dict]:
+        rows = self._conn().execute("SELECT * FROM artifacts WHERE job_id = ?", (job_id,))
+        return [dict(row) for row in rows]
+
+    def delete_artifacts(self, job_id: str):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM artifacts WHERE job_id = ?", (job_id,))
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status")
+        return {status: count for status, count in rows}
+
+
+def _encode(key: str, value: Any) -> Any:
+    if key in _JSON_COLUMNS and value is not None:
+        return json.dumps(value)
+    return value
+
+
+def _decode(row: sqlite3.Row) -> dict:
+    data = dict(row)
+    for key in _JSON_COLUMNS:
+        if data.get(key) is not None:
+            data[key] = json.loads(data[key])
+    return data
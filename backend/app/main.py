@@ -1,156 +1,722 @@
-from fastapi import FastAPI, UploadFile, File, Form
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
-from pydantic import BaseModel
-from typing import Optional
-from uuid import uuid4
-from pathlib import Path
-import shutil
-
-from settings import settings
-from rife_worker import RIFEWorker
-
-# ============================================================
-# FastAPI 初期化
-# ============================================================
-app = FastAPI(title="RIFE Interpolation API")
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=settings.cors_origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-worker = RIFEWorker()
-
-JOBS = {}
-STORAGE = Path(settings.storage)
-STORAGE.mkdir(parents=True, exist_ok=True)
-
-
-# ============================================================
-# ジョブ情報モデル
-# ============================================================
-class JobStatus(BaseModel):
-    id: str
-    status: str
-    kind: str
-    output_url: Optional[str] = None
-    frames_url: Optional[str] = None  # 🆕 中間フレーム用URL
-    error: Optional[str] = None
-
-
-def save_upload(upload: UploadFile, dst: Path) -> Path:
-    with dst.open("wb") as f:
-        shutil.copyfileobj(upload.file, f)
-    return dst
-
-
-# ============================================================
-# 🎞️ 動画ファイル補間エンドポイント
-# ============================================================
-@app.post("/api/interpolate/video", response_model=JobStatus)
-async def interpolate_video(
-    file: UploadFile = File(...),
-    exp: int = Form(2),
-    fps: Optional[int] = Form(None),
-    scale: int = Form(1)
-):
-    job_id = uuid4().hex
-    in_path = STORAGE / f"{job_id}_in.mp4"
-    out_path = STORAGE / f"{job_id}_out.mp4"
-    save_upload(file, in_path)
-
-    # 🆕 ローカル変数 job を定義
-    job = JobStatus(id=job_id, status="running", kind="video")
-    JOBS[job_id] = job
-
-    try:
-        worker.interpolate_video(in_path, out_path, exp=exp, fps=fps, scale=scale)
-        job.status = "done"
-        job.output_url = f"/api/download/{job_id}"
-    except Exception as e:
-        job.status = "error"
-        job.error = str(e)
-    finally:
-        pass
-
-    return job
-
-
-# ============================================================
-# 🖼️ 2枚の画像 → 中間動画生成
-# ============================================================
-@app.post("/api/interpolate/frames", response_model=JobStatus)
-async def interpolate_frames(
-    frame_a: UploadFile = File(...),
-    frame_b: UploadFile = File(...),
-    num_mid: int = Form(6),
-    fps: int = Form(30)
-):
-    job_id = uuid4().hex
-    a_path = STORAGE / f"{job_id}_a.png"
-    b_path = STORAGE / f"{job_id}_b.png"
-    out_path = STORAGE / f"{job_id}_seq.mp4"
-
-    save_upload(frame_a, a_path)
-    save_upload(frame_b, b_path)
-
-    # 🆕 jobをローカルで定義（ここが重要）
-    job = JobStatus(id=job_id, status="running", kind="frames")
-    JOBS[job_id] = job
-
-    try:
-        worker.interpolate_two_frames(a_path, b_path, out_path, num_mid=num_mid, fps=fps)
-
-        job.status = "done"
-        job.output_url = f"/api/download/{job_id}"
-
-        frames_folder = Path(f"/data/{job_id}_seq_frames/output")
-        job.frames_url = f"/data/{job_id}_seq_frames/output/" if frames_folder.exists() else None
-
-    except Exception as e:
-        job.status = "error"
-        job.error = str(e)
-
-    return job
-
-
-# ============================================================
-# 🔍 ジョブステータス取得
-# ============================================================
-@app.get("/api/jobs/{job_id}", response_model=JobStatus)
-async def get_job(job_id: str):
-    job = JOBS.get(job_id)
-    if not job:
-        return JSONResponse(status_code=404, content={"detail": "job not found"})
-    return job
-
-
-# ============================================================
-# 📦 MP4ダウンロード
-# ============================================================
-@app.get("/api/download/{job_id}")
-async def download(job_id: str):
-    out = STORAGE / f"{job_id}_out.mp4"
-    if not out.exists():
-        out = STORAGE / f"{job_id}_seq.mp4"
-    if not out.exists():
-        return JSONResponse(status_code=404, content={"detail": "file not found"})
-    return FileResponse(str(out), media_type="video/mp4", filename=out.name)
-
-
-# ============================================================
-# 🗜️ 中間フレームZIPダウンロード
-# ============================================================
-@app.get("/api/download_frames/{job_id}")
-def download_frames(job_id: str):
-    folder = Path(f"/data/{job_id}_seq_frames/output")
-    if not folder.exists():
-        return JSONResponse(status_code=404, content={"detail": "frames not found"})
-    zip_path = folder.parent / f"{job_id}_frames.zip"
-    shutil.make_archive(zip_path.with_suffix(""), 'zip', folder)
-    return FileResponse(zip_path, filename=f"{job_id}_frames.zip")
-
+from fastapi import FastAPI, UploadFile, File, Form, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel
+from typing import Any, Dict, Optional
+from uuid import uuid4
+from pathlib import Path
+import asyncio
+import re
+
+from settings import settings
+from rife_worker import RIFEWorker, stream_dir
+from inference_engine import FLOW_SCALES, model_version
+from scheduler import JobScheduler
+from job_store import JobStore
+from progress import ProgressBoard
+from result_cache import ResultCache
+from janitor import Janitor
+from downloads import ensure_zip, file_response
+from utils.video import HLS_PLAYLIST
+import metrics
+from profiling import JobProfiler
+from scratch import cleanup_orphans
+from uploads import (
+    UploadConflict,
+    UploadManager,
+    UploadTooLarge,
+    max_upload_bytes,
+    save_upload,
+)
+
+# ============================================================
+# FastAPI 初期化
+# ============================================================
+app = FastAPI(title="RIFE Interpolation API")
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=settings.cors_origins,
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# multipart のフォーム項目ぶんの余裕（Content-Length はファイル本体より少し大きい）
+_FORM_OVERHEAD = 1 << 20
+
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    """Content-Length が上限を超える投稿は本文を読む前に 413 で断る"""
+    length = request.headers.get("content-length")
+    if request.method in ("POST", "PUT", "PATCH") and length and length.isdigit() \
+            and int(length) > max_upload_bytes() + _FORM_OVERHEAD:
+        return JSONResponse(status_code=413, content={"detail": "upload too large"})
+    return await call_next(request)
+
+
+@app.exception_handler(UploadTooLarge)
+async def upload_too_large(request: Request, exc: UploadTooLarge):
+    return JSONResponse(status_code=413, content={"detail": str(exc)})
+
+
+@app.exception_handler(UploadConflict)
+async def upload_conflict(request: Request, exc: UploadConflict):
+    return JSONResponse(status_code=409, content={"detail": str(exc), "offset": exc.offset},
+                        headers={"Upload-Offset": str(exc.offset)})
+
+
+worker = RIFEWorker()
+store = JobStore()
+uploads = UploadManager()
+
+
+def persist_job(job: "JobStatus"):
+    """スケジューラが状態を変えるたびに SQLite に書き戻す"""
+    store.update(job.id, status=job.status, error=job.error, result=job.result,
+                 progress=job.progress, output_url=job.output_url, frames_url=job.frames_url)
+
+
+scheduler = JobScheduler(on_update=persist_job)
+# 実行中ジョブの進捗（ワーカーが加算し、定期的に SQLite に書き戻す）
+board = ProgressBoard(on_flush=lambda job_id, snapshot: store.update(job_id, progress=snapshot))
+
+
+@app.on_event("startup")
+def load_model():
+    """起動時に RIFE モデルを一度だけロードして常駐させ、ジョブワーカーを起動"""
+    worker.load()
+    scheduler.start()
+    board.start()
+    janitor.start()
+    cleanup_orphans()
+    model_version()  # 重みのハッシュを先に計算しておく（キャッシュキー用）
+    recover_jobs()
+    # 起動直後は再起動前の自分の heartbeat がまだ期限内のことがあるので、以降も定期的に回収する
+    store.start(on_beat=recover_jobs)
+
+
+@app.on_event("shutdown")
+def stop_scheduler():
+    scheduler.stop()
+    board.stop()
+    janitor.stop()
+    worker.close()
+    store.stop()
+
+
+STORAGE = Path(settings.storage)
+STORAGE.mkdir(parents=True, exist_ok=True)
+cache = ResultCache()
+# ジョブ成果物の記録と TTL / 容量上限による掃除
+janitor = Janitor(store, uploads=uploads)
+
+# /metrics の読み出し時に値を取るゲージ（ストレージは走査が重いので最大 60 秒キャッシュ）
+metrics.Gauge("rife_jobs_in_flight", "Jobs queued or running in this process", ["state"],
+              collect=lambda: {("queued",): scheduler.queue_depth, ("running",): scheduler.running})
+metrics.Gauge("rife_storage_bytes", "Bytes stored under the data directory by category", ["category"],
+              collect=lambda: {(name,): entry["bytes"]
+                               for name, entry in janitor.usage(max_age=60)["categories"].items()})
+
+
+# ============================================================
+# ジョブ情報モデル
+# ============================================================
+class JobStatus(BaseModel):
+    id: str
+    status: str
+    kind: str
+    output_url: Optional[str] = None
+    frames_url: Optional[str] = None  # 🆕 中間フレーム用URL
+    stream_url: Optional[str] = None  # 🆕 progressive ジョブの HLS プレイリスト（処理中から再生可）
+    profile_url: Optional[str] = None  # 🆕 profile=true のジョブのプロファイル（ZIP）
+    error: Optional[str] = None
+    # 🆕 ワーカーが返す処理統計（エンコーダ実行回数など）
+    result: Optional[Dict[str, Any]] = None
+    # 🆕 投入時のパラメータ・進捗・時刻（SQLite に永続化）
+    params: Optional[Dict[str, Any]] = None
+    progress: Optional[Dict[str, Any]] = None
+    created_at: Optional[float] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    # 🆕 待ち行列の状態（queued のときは queue_position = 前に並んでいるジョブ数）
+    queue_position: Optional[int] = None
+    queue_depth: Optional[int] = None
+    running_jobs: Optional[int] = None
+    max_workers: Optional[int] = None
+
+
+def with_queue_info(job: JobStatus) -> JobStatus:
+    stats = scheduler.stats()
+    return job.model_copy(update={
+        "queue_position": scheduler.position(job.id),
+        "queue_depth": stats["queue_depth"],
+        "running_jobs": stats["running"],
+        "max_workers": stats["max_workers"],
+    })
+
+
+def job_from_row(row: dict) -> JobStatus:
+    job = JobStatus(**{k: v for k, v in row.items() if k in JobStatus.model_fields})
+    stream = (row.get("files") or {}).get("stream")
+    if stream and (Path(stream) / HLS_PLAYLIST).exists():
+        job.stream_url = f"/api/stream/{job.id}/{HLS_PLAYLIST}"
+    if (row.get("files") or {}).get("profile") and profile_zip(job.id).exists():
+        job.profile_url = f"/api/profile/{job.id}"
+    return job
+
+
+# ============================================================
+# 🏃 ジョブ実行（パラメータだけから再実行できるよう kind ごとに定義）
+# ============================================================
+def run_video(job: JobStatus, params: dict):
+    in_path = STORAGE / f"{job.id}_in.mp4"
+    out_path = STORAGE / f"{job.id}_out.mp4"
+    with board.tracking(job) as progress:
+        job.result = worker.interpolate_video(in_path, out_path, progress=progress, **params)
+    job.output_url = f"/api/download/{job.id}"
+
+
+def run_frames(job: JobStatus, params: dict):
+    a_path = STORAGE / f"{job.id}_a.png"
+    b_path = STORAGE / f"{job.id}_b.png"
+    out_path = STORAGE / f"{job.id}_seq.mp4"
+    with board.tracking(job) as progress:
+        job.result = worker.interpolate_two_frames(a_path, b_path, out_path, progress=progress, **params)
+
+    job.output_url = f"/api/download/{job.id}"
+
+    frames_folder = frames_dir(job.id)
+    job.frames_url = f"/data/{job.id}_seq_frames/output/" if frames_folder.exists() else None
+    if frames_folder.exists():
+        ensure_zip(frames_folder, frames_zip(job.id))  # ダウンロードのたびに作り直さない
+
+
+def run_preview(job: JobStatus, params: dict):
+    in_path = STORAGE / f"{job.id}_in.mp4"
+    out_path = STORAGE / f"{job.id}_preview.mp4"
+    with board.tracking(job) as progress:
+        job.result = worker.preview_video(in_path, out_path, progress=progress, **params)
+    job.output_url = f"/api/download/{job.id}"
+
+
+RUNNERS = {"video": run_video, "frames": run_frames, "preview": run_preview}
+# 待ち行列での優先度（小さいほど先）。プレビューは本番ジョブを追い越す
+PRIORITIES = {"preview": -1}
+
+
+def enqueue(job: JobStatus, cache_key: Optional[str] = None):
+    runner = RUNNERS[job.kind]
+
+    def run(j: JobStatus):
+        params = dict(j.params or {})
+        try:
+            if params.pop("profile", False):
+                run_profiled(j, runner, params)
+            else:
+                runner(j, params)
+        finally:
+            register_artifacts(j.id)
+            metrics.FRAMES.inc((j.progress or {}).get("frames_done", 0), kind=j.kind)
+        if cache_key:
+            remember_result(j, cache_key)
+
+    scheduler.submit(job, run, priority=PRIORITIES.get(job.kind, 0))
+
+
+def run_profiled(job: JobStatus, runner, params: dict):
+    """
+    profile=true のジョブ: 実行全体を JobProfiler で囲み、成果物を {job_id}_profile/ と ZIP に残す
+    （失敗したジョブでも、遅い入力の原因を追えるよう書き出す）
+    """
+    profiler = JobProfiler(profile_dir(job.id), worker.engine)
+    try:
+        with profiler:
+            runner(job, params)
+    finally:
+        if profiler.summary is not None:
+            ensure_zip(profile_dir(job.id), profile_zip(job.id))
+            job.result = {**(job.result or {}), "profile": profiler.summary}
+
+
+def submit_job(job_id: str, kind: str, params: dict, files: dict) -> JobStatus:
+    """
+    ジョブを SQLite に登録してから待ち行列に積む
+    files["cache_key"] が結果キャッシュにあれば推論せず、その場で done にして返す
+    """
+    cache_key = files.get("cache_key")
+    if cache_key:
+        job = restore_cached(job_id, kind, params, files, cache_key)
+        if job is not None:
+            return with_queue_info(job)
+    job = job_from_row(store.create(job_id, kind, params=params, files=files))
+    enqueue(job, cache_key)
+    return with_queue_info(job)
+
+
+# ============================================================
+# ♻️ 結果キャッシュ
+# ============================================================
+def cache_key(kind: str, digests: list, params: dict) -> Optional[str]:
+    if not cache.enabled:
+        return None
+    return cache.key(kind, digests, cache.normalize(kind, params), model_version())
+
+
+def frames_dir(job_id: str) -> Path:
+    return STORAGE / f"{job_id}_seq_frames" / "output"
+
+
+def frames_zip(job_id: str) -> Path:
+    return STORAGE / f"{job_id}_seq_frames" / f"{job_id}_frames.zip"
+
+
+def with_profile(job_id: str, params: dict, files: dict, profile: bool):
+    """profile=true なら実行時にプロファイルを取る。キャッシュから返すと測れないので結果キャッシュは使わない"""
+    if profile:
+        params["profile"] = True
+        files["profile"] = str(profile_dir(job_id))
+        files["cache_key"] = None
+
+
+def profile_dir(job_id: str) -> Path:
+    return STORAGE / f"{job_id}_profile"
+
+
+def profile_zip(job_id: str) -> Path:
+    return STORAGE / f"{job_id}_profile.zip"
+
+
+def restore_cached(job_id: str, kind: str, params: dict, files: dict, key: str) -> Optional[JobStatus]:
+    cached = cache.lookup(key)
+    if cached is None:
+        return None
+    try:
+        cache.materialize(key, Path(files["output"]), frames_dir(job_id) if kind == "frames" else None)
+    except FileNotFoundError:
+        return None  # 参照直後に追い出された
+    print(f"♻️ Cache hit for job {job_id} ({kind})")
+    store.create(job_id, kind, params=params, files=files, status="done")
+    has_frames = kind == "frames" and frames_dir(job_id).exists()
+    result = {**cached, "output": files["output"], "cache": "hit"}
+    if kind == "video":
+        # 完成した MP4 だけを返すので HLS（stream_url）はない（progressive=true で投入されても）
+        result["progressive"] = False
+    store.update(job_id,
+                 result=result,
+                 output_url=f"/api/download/{job_id}",
+                 frames_url=f"/data/{job_id}_seq_frames/output/" if has_frames else None,
+                 finished_at=store.get(job_id)["created_at"])
+    register_artifacts(job_id)
+    return job_from_row(store.get(job_id))
+
+
+def register_artifacts(job_id: str):
+    """ジョブの入力・出力・中間フレームを成果物として記録（掃除の対象になる）"""
+    row = store.get(job_id)
+    files = (row or {}).get("files") or {}
+    janitor.register(job_id, [
+        *[("inputs", path) for path in files.get("inputs", [])],
+        ("outputs", files.get("output")),
+        ("frames", files.get("frames")),
+        ("streams", files.get("stream")),
+        ("profiles", files.get("profile")),
+        ("zips", str(profile_zip(job_id)) if files.get("profile") else None),
+    ])
+
+
+def remember_result(job: JobStatus, key: str):
+    """完了したジョブの出力をキャッシュに登録（失敗してもジョブは成功のまま）"""
+    try:
+        cache.put(key, Path(job.result["output"]), job.result,
+                  frames_dir(job.id) if job.kind == "frames" else None)
+    except Exception as e:
+        print(f"⚠️ Failed to cache result of {job.id}: {e}")
+
+
+def recover_jobs():
+    """
+    終了したプロセス（再起動前の自分や落ちたワーカー）が queued / running のまま残したジョブを再投入
+    入力ファイルが消えているものは error にする
+    """
+    for row in store.interrupted():
+        missing = [p for p in (row["files"] or {}).get("inputs", []) if not Path(p).exists()]
+        if missing or row["kind"] not in RUNNERS:
+            store.update(row["id"], status="error", error="interrupted by restart (inputs missing)")
+            continue
+        if not store.claim(row["id"], row["owner"]):
+            continue  # 別のワーカープロセスが回収済み
+        enqueue(job_from_row(store.get(row["id"])), (row["files"] or {}).get("cache_key"))
+        print(f"♻️ Recovered interrupted job {row['id']} ({row['kind']})")
+
+
+# ============================================================
+# 📤 分割アップロード（途中から再開可能）
+# ============================================================
+@app.post("/api/uploads", status_code=201)
+def create_upload(size: int = Form(...), filename: str = Form("")):
+    """全体サイズを申告して upload_id を受け取る"""
+    try:
+        return uploads.create(size, filename)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"detail": str(e)})
+
+
+@app.get("/api/uploads/{upload_id}")
+def get_upload(upload_id: str):
+    """受信済みサイズ（offset）の確認。再開時はこの位置から送る"""
+    try:
+        return uploads.status(upload_id)
+    except KeyError:
+        return JSONResponse(status_code=404, content={"detail": "upload not found"})
+
+
+@app.patch("/api/uploads/{upload_id}")
+async def append_upload(upload_id: str, request: Request):
+    """本文（生バイト列）を Upload-Offset ヘッダの位置から追記"""
+    offset = request.headers.get("upload-offset", "")
+    if not offset.isdigit():
+        return JSONResponse(status_code=400, content={"detail": "Upload-Offset header required"})
+    try:
+        status = await uploads.append(upload_id, int(offset), request.stream())
+    except KeyError:
+        return JSONResponse(status_code=404, content={"detail": "upload not found"})
+    return JSONResponse(content=status, headers={"Upload-Offset": str(status["offset"])})
+
+
+@app.delete("/api/uploads/{upload_id}")
+def delete_upload(upload_id: str):
+    try:
+        uploads.delete(upload_id)
+    except KeyError:
+        return JSONResponse(status_code=404, content={"detail": "upload not found"})
+    return {"deleted": upload_id}
+
+
+async def receive_video(file: Optional[UploadFile], upload_id: Optional[str], dst: Path,
+                        keep_upload: bool = False) -> str:
+    """
+    multipart の file か完了済みの upload_id から入力動画を dst に置き、sha256 を返す
+    keep_upload=True なら upload を消費しない（upload_id が無ければ KeyError）
+    """
+    if file is not None:
+        return await save_upload(file, dst)
+    return await run_in_threadpool(uploads.share if keep_upload else uploads.take, upload_id, dst)
+
+
+# ============================================================
+# 🎞️ 動画ファイル補間エンドポイント
+# ============================================================
+@app.post("/api/interpolate/video", response_model=JobStatus)
+async def interpolate_video(
+    file: Optional[UploadFile] = File(None),
+    upload_id: Optional[str] = Form(None),
+    exp: int = Form(2),
+    fps: Optional[int] = Form(None),
+    scale: Optional[float] = Form(None),
+    target_fps: Optional[float] = Form(None),
+    progressive: bool = Form(False),
+    profile: bool = Form(False)
+):
+    """
+    file（multipart）か、分割アップロード済みの upload_id のどちらかで入力を渡す
+    progressive=true なら処理中から stream_url（HLS）で先頭から再生できる
+    （結果キャッシュから即座に返す場合は完成品のみで、result["progressive"] は false）
+    profile=true なら推論と Python 側のプロファイルを取り、完了後に profile_url から取得できる
+    """
+    # scale 未指定なら解像度からフロースケールを自動選択
+    if scale and scale not in FLOW_SCALES:
+        return JSONResponse(status_code=400, content={"detail": f"scale must be one of {FLOW_SCALES}"})
+    if (file is None) == (upload_id is None):
+        return JSONResponse(status_code=400, content={"detail": "specify exactly one of file / upload_id"})
+    if target_fps is not None and target_fps <= 0:
+        return JSONResponse(status_code=400, content={"detail": "target_fps must be positive"})
+
+    job_id = uuid4().hex
+    in_path = STORAGE / f"{job_id}_in.mp4"
+    out_path = STORAGE / f"{job_id}_out.mp4"
+    try:
+        digest = await receive_video(file, upload_id, in_path)
+    except KeyError:
+        return JSONResponse(status_code=404, content={"detail": "upload not found"})
+
+    params = {"exp": exp, "fps": fps, "scale": scale, "target_fps": target_fps}
+    files = {"inputs": [str(in_path)], "output": str(out_path),
+             "cache_key": cache_key("video", [digest], params)}
+    if progressive:
+        params["progressive"] = True
+        files["stream"] = str(stream_dir(out_path))
+    with_profile(job_id, params, files, profile)
+    return await run_in_threadpool(submit_job, job_id, "video", params, files)
+
+
+# ============================================================
+# 👀 低解像度プレビュー（本番ジョブより先に実行）
+# ============================================================
+@app.post("/api/preview", response_model=JobStatus)
+async def preview(
+    request: Request,
+    file: Optional[UploadFile] = File(None),
+    upload_id: Optional[str] = Form(None),
+    start: float = Form(0.0),
+    duration: Optional[float] = Form(None),
+    exp: int = Form(1),
+    target_fps: Optional[float] = Form(None),
+    scale: Optional[float] = Form(None),
+    width: Optional[int] = Form(None),
+    wait: bool = Form(False)
+):
+    """
+    start 秒から duration 秒（既定 PREVIEW_SECONDS）だけを縮小・粗いフロースケールで補間した短いクリップ
+    upload_id は消費しないので、確認後に同じ upload_id で /api/interpolate/video を投入できる
+    wait=true なら完了まで待ってクリップ（MP4）を直接返す（PREVIEW_WAIT_S を過ぎたらジョブ情報を 202 で返す）
+    """
+    if scale and scale not in FLOW_SCALES:
+        return JSONResponse(status_code=400, content={"detail": f"scale must be one of {FLOW_SCALES}"})
+    if (file is None) == (upload_id is None):
+        return JSONResponse(status_code=400, content={"detail": "specify exactly one of file / upload_id"})
+    if target_fps is not None and target_fps <= 0:
+        return JSONResponse(status_code=400, content={"detail": "target_fps must be positive"})
+    if duration is not None and not 0 < duration <= settings.preview_max_seconds:
+        return JSONResponse(status_code=400, content={
+            "detail": f"duration must be in (0, {settings.preview_max_seconds}]"})
+    if start < 0 or (width is not None and width < 16):
+        return JSONResponse(status_code=400, content={"detail": "invalid start / width"})
+
+    job_id = uuid4().hex
+    in_path = STORAGE / f"{job_id}_in.mp4"
+    out_path = STORAGE / f"{job_id}_preview.mp4"
+    try:
+        digest = await receive_video(file, upload_id, in_path, keep_upload=True)
+    except KeyError:
+        return JSONResponse(status_code=404, content={"detail": "upload not found"})
+
+    params = {"start": start, "duration": duration, "exp": exp, "target_fps": target_fps,
+              "scale": scale, "width": width}
+    files = {"inputs": [str(in_path)], "output": str(out_path),
+             "cache_key": cache_key("preview", [digest], params)}
+    job = await run_in_threadpool(submit_job, job_id, "preview", params, files)
+    if not wait:
+        return job
+
+    deadline = asyncio.get_running_loop().time() + settings.preview_wait_s
+    while job.status not in ("done", "error") and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.05)
+        job = await run_in_threadpool(current_job, job_id)
+    if job.status == "error":
+        return JSONResponse(status_code=500, content={"detail": job.error})
+    if job.status != "done":
+        return JSONResponse(status_code=202, content=job.model_dump())
+    return file_response(out_path, request, "video/mp4", filename=out_path.name)
+
+
+# ============================================================
+# 🖼️ 2枚の画像 → 中間動画生成
+# ============================================================
+@app.post("/api/interpolate/frames", response_model=JobStatus)
+async def interpolate_frames(
+    frame_a: UploadFile = File(...),
+    frame_b: UploadFile = File(...),
+    num_mid: int = Form(6),
+    fps: int = Form(30),
+    exact: bool = Form(True),
+    scale: Optional[float] = Form(None),
+    profile: bool = Form(False)
+):
+    if scale and scale not in FLOW_SCALES:
+        return JSONResponse(status_code=400, content={"detail": f"scale must be one of {FLOW_SCALES}"})
+
+    job_id = uuid4().hex
+    a_path = STORAGE / f"{job_id}_a.png"
+    b_path = STORAGE / f"{job_id}_b.png"
+    out_path = STORAGE / f"{job_id}_seq.mp4"
+
+    digests = [await save_upload(frame_a, a_path), await save_upload(frame_b, b_path)]
+
+    params = {"num_mid": num_mid, "fps": fps, "exact": exact, "scale": scale}
+    files = {"inputs": [str(a_path), str(b_path)], "output": str(out_path),
+             "frames": str(STORAGE / f"{job_id}_seq_frames"),
+             "cache_key": cache_key("frames", digests, params)}
+    with_profile(job_id, params, files, profile)
+    return await run_in_threadpool(submit_job, job_id, "frames", params, files)
+
+
+# ============================================================
+# 🔍 ジョブステータス取得
+# ============================================================
+@app.get("/api/jobs/{job_id}", response_model=JobStatus)
+def get_job(job_id: str):
+    job = current_job(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"detail": "job not found"})
+    return job
+
+
+def current_job(job_id: str) -> Optional[JobStatus]:
+    """SQLite の記録に、このプロセスで実行中なら最新の進捗を重ねて返す"""
+    row = store.get(job_id)
+    if not row:
+        return None
+    job = job_from_row(row)
+    progress = board.get(job_id)
+    if progress is not None:
+        job.progress = progress.snapshot()
+    return with_queue_info(job)
+
+
+# ============================================================
+# 📡 進捗のプッシュ配信（Server-Sent Events）
+# ============================================================
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    """
+    ジョブ情報（progress を含む）が変わるたびに `event: progress` を送り、
+    done / error になったら最後の1件を送って閉じる
+    """
+    if await run_in_threadpool(store.get, job_id) is None:
+        return JSONResponse(status_code=404, content={"detail": "job not found"})
+
+    async def stream():
+        last = None
+        while not await request.is_disconnected():
+            job = await run_in_threadpool(current_job, job_id)
+            if job is None:
+                break
+            payload = job.model_dump_json()
+            if payload != last:
+                last = payload
+                yield f"event: progress\ndata: {payload}\n\n"
+            if job.status in ("done", "error"):
+                break
+            await asyncio.sleep(settings.progress_interval_s)
+
+    # X-Accel-Buffering: nginx にバッファリングさせず即時に流す
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# ============================================================
+# 🧵 待ち行列の状態
+# ============================================================
+@app.get("/api/queue")
+def get_queue():
+    return {**scheduler.stats(), "jobs": store.counts()}
+
+
+# ============================================================
+# 💽 ストレージ使用量（分類ごと）
+# ============================================================
+@app.get("/api/storage")
+def get_storage():
+    return janitor.usage()
+
+
+# ============================================================
+# ♻️ 結果キャッシュの状態（ヒット率・使用量）
+# ============================================================
+@app.get("/api/cache")
+def get_cache():
+    return cache.stats()
+
+
+# ============================================================
+# 📦 動的バッチングの状態（バッチサイズ分布・キュー待ち時間）
+# ============================================================
+@app.get("/api/batching")
+def get_batching():
+    if worker.batcher is None:
+        return {"enabled": False}
+    return worker.batcher.stats()
+
+
+# ============================================================
+# 📈 Prometheus メトリクス
+# ============================================================
+@app.get("/metrics")
+def get_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+# ============================================================
+# 📦 MP4ダウンロード
+# ============================================================
+@app.get("/api/download/{job_id}")
+def download(job_id: str, request: Request):
+    janitor.touch(job_id)
+    output = ((store.get(job_id) or {}).get("files") or {}).get("output")
+    out = Path(output) if output else None
+    if out is None or not out.exists():
+        return JSONResponse(status_code=404, content={"detail": "file not found"})
+    return file_response(out, request, "video/mp4", filename=out.name)
+
+
+# ============================================================
+# 📡 progressive ジョブの HLS（処理中はプレイリストが伸び、完了で #EXT-X-ENDLIST が付く）
+# ============================================================
+_STREAM_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".m4s": "video/iso.segment",
+    ".mp4": "video/mp4",
+}
+
+
+@app.get("/api/stream/{job_id}/{name}")
+def stream(job_id: str, name: str, request: Request):
+    row = store.get(job_id)
+    folder = ((row or {}).get("files") or {}).get("stream")
+    path = Path(folder) / name if folder else None
+    # 書き込み途中の *.tmp やディレクトリ外は返さない
+    if path is None or not re.fullmatch(r"[\w.-]+", name) \
+            or path.suffix not in _STREAM_TYPES or not path.is_file():
+        return JSONResponse(status_code=404, content={"detail": "stream not found"})
+    response = file_response(path, request, _STREAM_TYPES[path.suffix])
+    if path.suffix == ".m3u8":
+        response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+# ============================================================
+# 🗜️ 中間フレームZIPダウンロード
+# ============================================================
+@app.get("/api/download_frames/{job_id}")
+def download_frames(job_id: str, request: Request):
+    """ジョブ完了時に作った ZIP を Range 対応で返す（キャッシュから復元したジョブは初回に作成）"""
+    janitor.touch(job_id)
+    folder = frames_dir(job_id)
+    if not folder.exists():
+        return JSONResponse(status_code=404, content={"detail": "frames not found"})
+    zip_path = ensure_zip(folder, frames_zip(job_id))
+    return file_response(zip_path, request, "application/zip", filename=zip_path.name)
+
+
+# ============================================================
+# 🔬 profile=true のジョブのプロファイル
+# ============================================================
+_PROFILE_TYPES = {
+    ".json": "application/json",
+    ".txt": "text/plain; charset=utf-8",
+    ".folded": "text/plain; charset=utf-8",
+}
+
+
+@app.get("/api/profile/{job_id}")
+def download_profile(job_id: str, request: Request):
+    """ジョブ終了時に作ったプロファイル一式の ZIP"""
+    janitor.touch(job_id)
+    zip_path = profile_zip(job_id)
+    if not ((store.get(job_id) or {}).get("files") or {}).get("profile") or not zip_path.exists():
+        return JSONResponse(status_code=404, content={"detail": "profile not found"})
+    return file_response(zip_path, request, "application/zip", filename=zip_path.name)
+
+
+@app.get("/api/profile/{job_id}/{name}")
+def download_profile_file(job_id: str, name: str, request: Request):
+    """個別のファイル（torch_trace.json を Perfetto に直接読ませる場合など）"""
+    folder = ((store.get(job_id) or {}).get("files") or {}).get("profile")
+    path = Path(folder) / name if folder else None
+    if path is None or not re.fullmatch(r"[\w.-]+", name) \
+            or path.suffix not in _PROFILE_TYPES or not path.is_file():
+        return JSONResponse(status_code=404, content={"detail": "profile not found"})
+    return file_response(path, request, _PROFILE_TYPES[path.suffix], filename=name)
@@ -0,0 +1,224 @@
+# /app/metrics.py
+# ============================================================
+# Prometheus 形式のメトリクス（/metrics）と計測フック
+# ワーカーや utils/video.py は span() / observe() で区間の秒数を記録するだけで、
+# どの histogram に入れるかはこのモジュールの対応表で決まる（未登録の名前は何もしない）
+#   with metrics.span("ffmpeg", op="extract"):
+#       subprocess.run(...)
+# add_tracer() で登録した関数にも同じ (名前, 秒数, ラベル) が渡る（ログやトレーサ連携用）
+# ============================================================
+
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}", *self._samples()]
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """単調増加のカウンタ"""
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """
+    現在値。collect を渡すと /metrics の読み出し時にその場で値を取る
+    collect は {ラベル値のタプル: 値}（ラベルなしなら値そのもの）を返す
+    """
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 collect: Optional[Callable[[], object]] = None):
+        super().__init__(name, help, labelnames)
+        self.collect = collect
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def _samples(self) -> List[str]:
+        if self.collect is not None:
+            try:
+                collected = self.collect()
+            except Exception as e:
+                print(f"⚠️ Failed to collect {self.name}: {e}")
+                return []
+            items = sorted(collected.items()) if isinstance(collected, dict) else [((), collected)]
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    """累積バケット付きのヒストグラム（observe はバケットの二分探索と加算だけ）"""
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 60)):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[LabelValues, list] = {}  # [バケットごとの件数..., 合計, 件数]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = []
+        for key, entry in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            inf = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{inf} {entry[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(entry[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {entry[-1]}")
+        return lines
+
+
+REGISTRY: List[_Metric] = []
+
+
+def render() -> str:
+    """全メトリクスを Prometheus のテキスト形式で返す"""
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+# ============================================================
+# 📏 標準メトリクス
+# ============================================================
+_SHORT = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+_LONG = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+UPLOAD_SECONDS = Histogram("rife_upload_seconds", "Time spent receiving an upload or upload chunk",
+                           ["kind"], _LONG)
+UPLOAD_BYTES = Counter("rife_upload_bytes_total", "Bytes received from clients", ["kind"])
+FFMPEG_SECONDS = Histogram("rife_ffmpeg_seconds", "Wall time of ffmpeg invocations", ["op"], _LONG)
+INFERENCE_SECONDS = Histogram("rife_inference_seconds",
+                              "Model inference time per source frame pair (all timesteps of the pair)",
+                              ["path"], _SHORT)
+QUEUE_WAIT_SECONDS = Histogram("rife_queue_wait_seconds", "Time jobs spend queued before running",
+                               ["kind"], _LONG)
+JOB_SECONDS = Histogram("rife_job_duration_seconds", "Job run time by kind and final status",
+                        ["kind", "status"], _LONG)
+JOBS = Counter("rife_jobs_total", "Finished jobs by kind and final status", ["kind", "status"])
+FRAMES = Counter("rife_frames_processed_total", "Output frames produced", ["kind"])
+
+# span() / observe() の名前 → 記録先
+_SPANS: Dict[str, Histogram] = {
+    "upload": UPLOAD_SECONDS,
+    "ffmpeg": FFMPEG_SECONDS,
+    "inference": INFERENCE_SECONDS,
+    "queue_wait": QUEUE_WAIT_SECONDS,
+    "job": JOB_SECONDS,
+}
+
+
+# ============================================================
+# 🪝 計測フック
+# ============================================================
+_tracers: List[Callable[[str, float, Dict[str, str]], None]] = []
+
+
+def add_tracer(fn: Callable[[str, float, Dict[str, str]], None]):
+    """span / observe のたびに fn(名前, 秒数, ラベル) を呼ぶ（例外は握りつぶす）"""
+    _tracers.append(fn)
+
+
+def remove_tracer(fn: Callable[[str, float, Dict[str, str]], None]):
+    if fn in _tracers:
+        _tracers.remove(fn)
+
+
+def observe(name: str, seconds: float, **labels):
+    """計測済みの秒数を記録（未登録の名前はトレーサにだけ渡す）"""
+    histogram = _SPANS.get(name)
+    if histogram is not None:
+        histogram.observe(seconds, **labels)
+    for tracer in _tracers:
+        try:
+            tracer(name, seconds, labels)
+        except Exception as e:
+            print(f"⚠️ Tracer failed on {name}: {e}")
+
+
+@contextmanager
+def span(name: str, **labels) -> Iterator[None]:
+    """with ブロックの所要時間を observe する（例外で抜けても記録する）"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
@@ -0,0 +1,196 @@
+# /app/pipeline.py
+# ============================================================
+# デコード → 推論 → エンコード の3段パイプライン
+# デコーダとエンコーダを別スレッドで動かし、段の間を上限付きキューでつなぐ
+# キューが満杯なら上流が待つ（バックプレッシャ）ので、メモリ上のフレーム数は一定
+# ============================================================
+
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from settings import settings
+
+STAGES = ("decode", "infer", "encode")
+
+_DONE = object()
+_POLL = 0.1
+
+
+class StageClock:
+    """1ステージの処理時間(busy)と、上流/下流を待っていた時間(idle)"""
+
+    def __init__(self):
+        self.busy = 0.0
+        self.idle = 0.0
+        self.items = 0
+
+    def stats(self) -> dict:
+        total = self.busy + self.idle
+        return {
+            "busy_s": round(self.busy, 3),
+            "idle_s": round(self.idle, 3),
+            "utilization": round(self.busy / total, 3) if total else None,
+            "frames": self.items,
+        }
+
+
+class Pipeline:
+    """
+    source（デコード済みフレームのイテレータ）を decoder スレッドで先読みし、
+    transform（推論）を呼び出し元スレッドで、sink（書き出し）を encoder スレッドで実行する
+    どこかの段で例外が起きたら全段を止め、呼び出し元で同じ例外を送出する
+    """
+
+    def __init__(self, depth: int = settings.pipeline_depth):
+        self.depth = max(1, depth)
+        self.clocks: Dict[str, StageClock] = {name: StageClock() for name in STAGES}
+        self._stop = threading.Event()
+        self._errors: List[BaseException] = []
+
+    def run(self,
+            source: Iterable,
+            transform: Callable[[Iterator], Iterator],
+            sink: Callable[[Any], None]) -> dict:
+        in_q: "queue.Queue" = queue.Queue(self.depth)
+        out_q: "queue.Queue" = queue.Queue(self.depth)
+        # 呼び出し元のスレッド名を頭に付ける（ジョブのプロファイルで子スレッドとして拾う）
+        parent = threading.current_thread().name
+        decoder = threading.Thread(target=self._decode, args=(source, in_q),
+                                   name=f"{parent}/decode", daemon=True)
+        encoder = threading.Thread(target=self._encode, args=(out_q, sink),
+                                   name=f"{parent}/encode", daemon=True)
+        decoder.start()
+        encoder.start()
+
+        clock = self.clocks["infer"]
+        start = time.perf_counter()
+        try:
+            for item in transform(self._drain(in_q)):
+                clock.items += 1
+                if not self._put(out_q, item, clock):
+                    self._raise()
+            if not self._put(out_q, _DONE, clock):
+                self._raise()
+        except BaseException:
+            self._stop.set()
+            raise
+        finally:
+            decoder.join()
+            encoder.join()
+            # 推論段の busy は「全体時間 − キュー待ち」
+            clock.busy = max(0.0, time.perf_counter() - start - clock.idle)
+        self._raise()
+        return self.stats()
+
+    def stats(self) -> dict:
+        stages = {name: clock.stats() for name, clock in self.clocks.items()}
+        return {
+            "pipeline": stages,
+            "bottleneck": max(STAGES, key=lambda name: self.clocks[name].busy),
+        }
+
+    # ============================================================
+    # 🧵 各段
+    # ============================================================
+    def _decode(self, source: Iterable, in_q: "queue.Queue"):
+        clock = self.clocks["decode"]
+        it = iter(source)
+        try:
+            while not self._stop.is_set():
+                t_start = time.perf_counter()
+                try:
+                    item = next(it)
+                except StopIteration:
+                    break
+                clock.busy += time.perf_counter() - t_start
+                clock.items += 1
+                if not self._put(in_q, item, clock):
+                    return
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            close = getattr(it, "close", None)
+            if close is not None:
+                close()
+        self._put(in_q, _DONE, clock)
+
+    def _drain(self, in_q: "queue.Queue") -> Iterator:
+        """推論段への入力。decoder の例外はここで送出される"""
+        clock = self.clocks["infer"]
+        while True:
+            item = self._get(in_q, clock)
+            if item is _DONE:
+                self._raise()
+                return
+            yield item
+
+    def _encode(self, out_q: "queue.Queue", sink: Callable[[Any], None]):
+        clock = self.clocks["encode"]
+        try:
+            while True:
+                item = self._get(out_q, clock)
+                if item is _DONE:
+                    return
+                t_start = time.perf_counter()
+                sink(item)
+                clock.busy += time.perf_counter() - t_start
+                clock.items += 1
+        except BaseException as e:
+            self._fail(e)
+
+    # ============================================================
+    # 🔧 キュー操作（停止要求を監視しながら待つ）
+    # ============================================================
+    def _put(self, q: "queue.Queue", item, clock: StageClock) -> bool:
+        t_start = time.perf_counter()
+        try:
+            while not self._stop.is_set():
+                try:
+                    q.put(item, timeout=_POLL)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        finally:
+            clock.idle += time.perf_counter() - t_start
+
+    def _get(self, q: "queue.Queue", clock: StageClock):
+        t_start = time.perf_counter()
+        try:
+            while True:
+                try:
+                    return q.get(timeout=_POLL)
+                except queue.Empty:
+                    if self._stop.is_set():
+                        return _DONE
+        finally:
+            clock.idle += time.perf_counter() - t_start
+
+    def _fail(self, error: BaseException):
+        self._errors.append(error)
+        self._stop.set()
+
+    def _raise(self):
+        if self._errors:
+            raise self._errors[0]
+        if self._stop.is_set():
+            raise RuntimeError("pipeline aborted")
+
+
+def merge_pipeline_stats(parts: List[Optional[dict]]) -> Optional[dict]:
+    """セグメントごとのパイプライン統計を段ごとに合算"""
+    parts = [p for p in parts if p]
+    if not parts:
+        return None
+    merged: Dict[str, StageClock] = {name: StageClock() for name in STAGES}
+    for stages in parts:
+        for name, values in stages.items():
+            merged[name].busy += values["busy_s"]
+            merged[name].idle += values["idle_s"]
+            merged[name].items += values["frames"]
+    return {
+        "pipeline": {name: clock.stats() for name, clock in merged.items()},
+        "bottleneck": max(STAGES, key=lambda name: merged[name].busy),
+    }
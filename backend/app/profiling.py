@@ -0,0 +1,278 @@
+# /app/profiling.py
+# ============================================================
+# ジョブ単位のプロファイル（profile=true のジョブだけ）
+#   torch_trace.json : torch profiler の Chrome トレース（chrome://tracing / Perfetto で開く）
+#                      IFBlock.blockN / Head.encode / warp の区間付き
+#   torch_ops.txt    : 区間・演算子ごとの集計表
+#   python.folded    : RIFEWorker 側 Python のサンプリング結果（collapsed 形式。speedscope / flamegraph.pl で読める）
+#   python_top.txt   : サンプル数の多い関数（self / total）
+#   summary.json     : 上の要約（ジョブの result["profile"] にも入る）
+# フック・warp の差し替え・サンプラはプロファイル中だけ登録する。モデルは全ジョブで共有なので、
+# その間に並行して走る他ジョブもフックを通るが、スレッドの照合だけで素通りする（区間は開かない）
+# ただし torch profiler（Kineto）の CPU 演算子の記録はプロセス全体なので、並行ジョブの演算子はトレースに混ざる
+# ============================================================
+
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from settings import settings
+
+# 区間を付けるモジュール（IFNet_HDv3 のクラス名）
+_TRACED_MODULES = ("IFBlock", "Head")
+
+_state = threading.local()
+# torch profiler とモデルへのフックはプロセスで同時に1つだけ
+_torch_lock = threading.Lock()
+
+
+def active() -> bool:
+    """
+    呼び出し元スレッドがプロファイル中か
+    IFNet の区間とステップはジョブのスレッドの forward にだけ付けるので、
+    プロファイル中は推論をバッチングサーバや子プロセスに逃がさない
+    """
+    return getattr(_state, "profiling", False)
+
+
+class JobProfiler:
+    """
+    with ブロックの間、呼び出し元スレッド（ジョブのスレッド）の推論を torch profiler で記録し、
+    ジョブのスレッドとその子スレッド（Pipeline の decode / encode）の Python スタックを一定間隔で数える
+    抜けるときに out_dir へ書き出し、summary に要約を入れる（例外で抜けても書き出す）
+    """
+
+    def __init__(self, out_dir: Path, engine=None):
+        self.out_dir = Path(out_dir)
+        self.engine = engine
+        self.summary: Optional[dict] = None
+        self._sampler: Optional[_Sampler] = None
+        self._torch: Optional[_TorchTrace] = None
+        self._started = 0.0
+
+    def __enter__(self) -> "JobProfiler":
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self._started = time.perf_counter()
+        _state.profiling = True
+        self._sampler = _Sampler(threading.current_thread(), settings.profile_sample_ms / 1000)
+        self._sampler.start()
+        self._torch = _TorchTrace.start(self.engine, self.out_dir)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _state.profiling = False
+        elapsed = time.perf_counter() - self._started
+        self._sampler.stop()
+        summary = {"wall_s": round(elapsed, 3), "dir": str(self.out_dir)}
+        try:
+            summary["python"] = self._sampler.write(self.out_dir)
+            summary["torch"] = self._torch.stop() if isinstance(self._torch, _TorchTrace) \
+                else {"skipped": self._torch}
+            summary["files"] = sorted({*(p.name for p in self.out_dir.iterdir() if p.is_file()), "summary.json"})
+            (self.out_dir / "summary.json").write_text(json.dumps(summary, indent=2, ensure_ascii=False))
+            print(f"🔬 Profile written → {self.out_dir}")
+        except Exception as e:
+            print(f"⚠️ Failed to write profile to {self.out_dir}: {e}")
+            summary["error"] = str(e)
+        self.summary = summary
+        return False
+
+
+# ============================================================
+# 🔥 torch profiler（IFNet の区間付き）
+# ============================================================
+class _TorchTrace:
+    """
+    torch profiler を開始し、IFNet の IFBlock / Head の forward と warp() を record_function の区間で囲む
+    トレースが大きくなりすぎないよう、先頭 profile_torch_steps 回の IFNet forward だけ記録する
+    """
+
+    def __init__(self, torch, flownet, out_dir: Path):
+        self.torch = torch
+        self.out_dir = out_dir
+        self.thread = threading.get_ident()
+        self.steps = 0
+        self.result: dict = {}
+        self._handles = []
+        self._scopes: list = []  # プロファイル中のスレッドだけが積む
+        for name, module in flownet.named_modules():
+            kind = type(module).__name__
+            if kind in _TRACED_MODULES:
+                self._handles.append(module.register_forward_pre_hook(self._enter(f"{kind}.{name}")))
+                self._handles.append(module.register_forward_hook(self._exit))
+        # 1回の forward を profiler の1ステップとして数える
+        self._handles.append(flownet.register_forward_hook(self._step))
+        # warp は IFNet_HDv3 のモジュール関数として呼ばれるので、モジュール属性を一時的に差し替える
+        self._warp_module = sys.modules.get(type(flownet).__module__)
+        self._warp = getattr(self._warp_module, "warp", None)
+        if self._warp is not None:
+            self._warp_module.warp = self._traced_warp(self._warp)
+
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        self.profiler = torch.profiler.profile(
+            activities=activities,
+            schedule=self._schedule,
+            on_trace_ready=self._write,
+            record_shapes=True,
+        )
+        self.profiler.start()
+
+    @classmethod
+    def start(cls, engine, out_dir: Path):
+        """開始できなければ理由の文字列を返す（Python 側のプロファイルだけ取る）"""
+        if engine is None:
+            return "inference runs in a subprocess"
+        if not _torch_lock.acquire(blocking=False):
+            return "another profiled job is running"
+        try:
+            engine.load()
+            return cls(engine.torch, engine.model.flownet, out_dir)
+        except Exception as e:
+            _torch_lock.release()
+            print(f"⚠️ torch profiler unavailable: {e}")
+            return f"torch profiler unavailable: {e}"
+
+    def _schedule(self, step: int):
+        actions = self.torch.profiler.ProfilerAction
+        last = settings.profile_torch_steps - 1
+        if step < last:
+            return actions.RECORD
+        return actions.RECORD_AND_SAVE if step == last else actions.NONE
+
+    def _enter(self, label: str):
+        def hook(module, args):
+            if threading.get_ident() != self.thread:
+                return  # 並行して走る他ジョブの forward
+            scope = self.torch.profiler.record_function(label)
+            scope.__enter__()
+            self._scopes.append(scope)
+        return hook
+
+    def _exit(self, module, args, output):
+        if threading.get_ident() != self.thread:
+            return
+        if self._scopes:
+            self._scopes.pop().__exit__(None, None, None)
+
+    def _traced_warp(self, warp):
+        record_function = self.torch.profiler.record_function
+        thread = self.thread
+
+        def traced_warp(*args, **kwargs):
+            if threading.get_ident() != thread:
+                return warp(*args, **kwargs)
+            with record_function("warp"):
+                return warp(*args, **kwargs)
+        return traced_warp
+
+    def _step(self, module, args, output):
+        # 他のジョブのスレッドの forward は数えない（記録もされない）
+        if threading.get_ident() == self.thread:
+            self.steps += 1
+            self.profiler.step()
+
+    def _write(self, profiler):
+        trace = self.out_dir / "torch_trace.json"
+        profiler.export_chrome_trace(str(trace))
+        averages = profiler.key_averages()
+        sort_by = "self_cuda_time_total" if self.torch.cuda.is_available() else "self_cpu_time_total"
+        (self.out_dir / "torch_ops.txt").write_text(averages.table(sort_by=sort_by, row_limit=60))
+        ranges = [e for e in averages
+                  if e.key == "warp" or e.key.split(".")[0] in _TRACED_MODULES]
+        range_keys = {e.key for e in ranges}
+        self.result = {
+            "ranges": {e.key: {"count": e.count,
+                               "cpu_ms": round(e.cpu_time_total / 1000, 3),
+                               "device_ms": round(getattr(e, "device_time_total", 0) / 1000, 3)}
+                       for e in sorted(ranges, key=lambda e: e.key)},
+            "top_ops": [{"op": e.key, "self_cpu_ms": round(e.self_cpu_time_total / 1000, 3),
+                         "count": e.count}
+                        for e in sorted(averages, key=lambda e: e.self_cpu_time_total, reverse=True)
+                        if e.key not in range_keys][:10],
+        }
+
+    def stop(self) -> dict:
+        try:
+            self.profiler.stop()
+        finally:
+            for handle in self._handles:
+                handle.remove()
+            if self._warp is not None:
+                self._warp_module.warp = self._warp
+            _torch_lock.release()
+        return {"forwards": self.steps,
+                "recorded_forwards": min(self.steps, settings.profile_torch_steps),
+                **self.result}
+
+
+# ============================================================
+# 🐍 Python 側のサンプリング
+# ============================================================
+class _Sampler(threading.Thread):
+    """
+    interval 秒ごとに sys._current_frames() を読み、対象スレッドのスタックを数える
+    対象はジョブのスレッドと、名前が「ジョブのスレッド名/」で始まる子スレッド
+    """
+
+    def __init__(self, root: threading.Thread, interval: float):
+        super().__init__(name=f"{root.name}-profiler", daemon=True)
+        self.prefix = root.name
+        self.interval = max(interval, 0.001)
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self._sample()
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+    def _sample(self):
+        names = {t.ident: t.name for t in threading.enumerate()
+                 if t.name == self.prefix or t.name.startswith(self.prefix + "/")}
+        frames = sys._current_frames()
+        self.samples += 1
+        for ident, name in names.items():
+            frame = frames.get(ident)
+            stack: List[str] = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join([name, *reversed(stack)])] += 1
+
+    def write(self, out_dir: Path) -> dict:
+        (out_dir / "python.folded").write_text(
+            "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common()))
+        # スレッドごとに集計（decode / encode はキュー待ちが大半なので、混ぜるとジョブのスレッドが埋もれる）
+        threads: Dict[str, Tuple[Counter, Counter]] = {}
+        for stack, count in self.stacks.items():
+            thread, *frames = stack.split(";")
+            own, total = threads.setdefault(thread, (Counter(), Counter()))
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+        lines = []
+        for thread, (own, total) in sorted(threads.items()):
+            n = sum(own.values())
+            lines += [f"# {thread} ({n} samples)", f"{'self%':>7} {'total%':>7}  function"]
+            lines += [f"{100 * c / n:7.1f} {100 * total[f] / n:7.1f}  {f}" for f, c in own.most_common(30)]
+            lines.append("")
+        (out_dir / "python_top.txt").write_text("\n".join(lines))
+        own, _ = threads.get(self.prefix, (Counter(), Counter()))
+        n = sum(own.values()) or 1
+        return {
+            "samples": self.samples,
+            "interval_ms": round(self.interval * 1000, 3),
+            "top_self": [{"function": f, "percent": round(100 * c / n, 1)} for f, c in own.most_common(10)],
+        }
@@ -0,0 +1,128 @@
+# /app/progress.py
+# ============================================================
+# ジョブ進捗のカウンタ
+# ワーカーはフレームを書くたびに整数を1つ足すだけ（ロックなし）で、
+# fps / ETA の計算や SQLite への書き戻しは読み出し側と定期フラッシュで行う
+# ============================================================
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+from settings import settings
+
+
+class Progress:
+    """1ジョブ分の進捗（frames_done はホットパスから加算される）"""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.stage = "queued"
+        self.frames_done = 0
+        self.frames_total: Optional[int] = None
+        self.started = time.monotonic()
+        self._stage_started = self.started
+        self._stage_done = 0
+
+    def set_stage(self, stage: str, total: Optional[int] = None):
+        """段階を切り替え、スループットの計測をやり直す"""
+        self.stage = stage
+        if total is not None:
+            self.frames_total = total
+        self._stage_started = time.monotonic()
+        self._stage_done = self.frames_done
+
+    def advance(self, n: int = 1):
+        self.frames_done += n
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        done, total = self.frames_done, self.frames_total
+        elapsed = now - self._stage_started
+        fps = (done - self._stage_done) / elapsed if elapsed > 0 else 0.0
+        eta = (total - done) / fps if fps > 0 and total else None
+        return {
+            "stage": self.stage,
+            "frames_done": done,
+            "frames_total": total,
+            "fps": round(fps, 2),
+            "eta_s": round(max(0.0, eta), 1) if eta is not None else None,
+            "elapsed_s": round(now - self.started, 1),
+        }
+
+
+class ProgressBoard:
+    """実行中ジョブの Progress を保持し、定期的にスナップショットを書き戻す"""
+
+    def __init__(self,
+                 on_flush: Optional[Callable[[str, dict], None]] = None,
+                 interval: float = settings.progress_flush_s):
+        self.on_flush = on_flush
+        self.interval = interval
+        self._jobs: Dict[str, Progress] = {}
+        self._flushed: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def track(self, job_id: str) -> Progress:
+        with self._lock:
+            progress = self._jobs.get(job_id)
+            if progress is None:
+                progress = self._jobs[job_id] = Progress(job_id)
+            return progress
+
+    def get(self, job_id: str) -> Optional[Progress]:
+        return self._jobs.get(job_id)
+
+    def finish(self, job_id: str) -> Optional[dict]:
+        """ジョブ終了時に最終スナップショットを返して登録を外す"""
+        with self._lock:
+            progress = self._jobs.pop(job_id, None)
+            self._flushed.pop(job_id, None)
+        return progress.snapshot() if progress is not None else None
+
+    @contextmanager
+    def tracking(self, job):
+        """ジョブ実行中だけ Progress を登録し、終了時の値を job.progress に残す"""
+        progress = self.track(job.id)
+        try:
+            yield progress
+            progress.stage = "done"
+        except BaseException:
+            progress.stage = "error"
+            raise
+        finally:
+            job.progress = self.finish(job.id)
+
+    # ============================================================
+    # 💾 定期フラッシュ（複数プロセス構成でもポーリングで進捗が見えるように）
+    # ============================================================
+    def start(self):
+        if self._thread is None and self.on_flush is not None and self.interval > 0:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="progress-flush", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                jobs = list(self._jobs.values())
+            for progress in jobs:
+                if progress.job_id not in self._jobs:
+                    continue  # 終了済み（最終値はジョブ側で保存される）
+                key = (progress.stage, progress.frames_done, progress.frames_total)
+                if self._flushed.get(progress.job_id) == key:
+                    continue
+                self._flushed[progress.job_id] = key
+                try:
+                    self.on_flush(progress.job_id, progress.snapshot())
+                except Exception as e:
+                    print(f"⚠️ Failed to flush progress of {progress.job_id}: {e}")
@@ -0,0 +1,230 @@
+# /app/result_cache.py
+# ============================================================
+# 内容アドレス方式の結果キャッシュ
+# キー = 入力ファイルのハッシュ + 正規化したパラメータ + モデルのバージョン
+# 同じ入力・同じ設定の再投入は推論せずに既存の出力を返す（/data 上でサイズ上限付き LRU）
+# ============================================================
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from settings import settings
+
+_CHUNK = 1 << 20
+
+
+def file_digest(path: Path) -> str:
+    """ファイル内容の sha256（アップロード時にハッシュがない場合用）"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _link_or_copy(src: Path, dst: Path):
+    """同じボリューム内ならハードリンク（容量を増やさない）、できなければコピー"""
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    if dst.exists():
+        dst.unlink()
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _link_tree(src: Path, dst: Path):
+    for path in src.rglob("*"):
+        if path.is_file():
+            _link_or_copy(path, dst / path.relative_to(src))
+
+
+def _tree_size(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+class ResultCache:
+    """
+    1エントリ = cache/<key>/ ディレクトリ
+      output.mp4   : 出力動画
+      frames/      : 中間フレーム（frames ジョブのみ）
+      result.json  : ワーカーが返した統計
+    最終アクセス時刻は result.json の mtime で管理し、合計サイズが上限を超えたら古い順に削除
+    """
+
+    def __init__(self,
+                 root: Optional[Path] = None,
+                 max_mb: int = settings.result_cache_mb):
+        self.root = Path(root or Path(settings.storage) / "cache")
+        self.max_bytes = max_mb * 2 ** 20
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._sizes: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        for entry in self.root.iterdir():
+            if (entry / "result.json").exists():
+                self._sizes[entry.name] = _tree_size(entry)
+            else:
+                shutil.rmtree(entry, ignore_errors=True)  # 書き込み途中で落ちたエントリ
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    # ============================================================
+    # 🔑 キー
+    # ============================================================
+    @staticmethod
+    def key(kind: str, digests: List[str], params: Dict[str, Any], model_version: str) -> str:
+        """入力ハッシュ・正規化済みパラメータ・モデルバージョンから決まるキー"""
+        material = json.dumps({
+            "kind": kind,
+            "inputs": digests,
+            "params": params,
+            "model": model_version,
+        }, sort_keys=True)
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    @staticmethod
+    def normalize(kind: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        出力に影響するパラメータだけを型を揃えて残す
+        target_fps 指定時の exp のように結果を変えない値は落とし、出力を左右する設定値を足す
+        """
+        def num(value):
+            return float(value) if value is not None else None
+
+        if kind == "video":
+            normalized = {
+                "exp": None if params.get("target_fps") else int(params.get("exp", 2)),
+                "fps": num(params.get("fps")),
+                "scale": num(params.get("scale")),
+                "target_fps": num(params.get("target_fps")),
+                "scene": [settings.scene_detect, settings.scene_dup_mad,
+                          settings.scene_cut_mad, settings.scene_cut_ssim],
+            }
+        elif kind == "preview":
+            normalized = {
+                "exp": None if params.get("target_fps") else int(params.get("exp", 1)),
+                "target_fps": num(params.get("target_fps")),
+                "start": num(params.get("start")),
+                "duration": num(params.get("duration") or settings.preview_seconds),
+                "scale": num(params.get("scale") or settings.preview_scale),
+                "width": int(params.get("width") or settings.preview_width),
+            }
+        else:
+            normalized = {
+                "num_mid": int(params.get("num_mid", 6)),
+                "fps": num(params.get("fps")),
+                "exact": bool(params.get("exact", True)),
+                "scale": num(params.get("scale")),
+            }
+        normalized["mode"] = settings.inference_mode
+        # メモリ予算でタイル分割するか・継ぎ目のフェザー幅で出力が変わる（どの kind もタイル分割され得る）
+        normalized["tiling"] = [settings.inference_memory_mb, settings.tile_overlap]
+        return normalized
+
+    # ============================================================
+    # 🔍 参照 / 保存
+    # ============================================================
+    def lookup(self, key: str) -> Optional[dict]:
+        """ヒットすれば保存済みの統計を返し、最終アクセス時刻を更新する"""
+        if not self.enabled:
+            return None
+        meta = self.root / key / "result.json"
+        with self._lock:
+            if key not in self._sizes and meta.exists():
+                # 別プロセスが登録したエントリ
+                self._sizes[key] = _tree_size(meta.parent)
+            if key not in self._sizes:
+                self.misses += 1
+                return None
+        try:
+            os.utime(meta)
+            result = json.loads(meta.read_text())
+        except FileNotFoundError:
+            with self._lock:
+                self._sizes.pop(key, None)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return result
+
+    def materialize(self, key: str, output: Path, frames_dir: Optional[Path] = None):
+        """キャッシュの出力をジョブ用のパスに展開（ハードリンク）"""
+        entry = self.root / key
+        _link_or_copy(entry / "output.mp4", output)
+        if frames_dir is not None and (entry / "frames").exists():
+            _link_tree(entry / "frames", frames_dir)
+
+    def put(self, key: str, output: Path, result: dict, frames_dir: Optional[Path] = None):
+        """完了したジョブの出力をキャッシュに登録し、上限を超えた分を追い出す"""
+        if not self.enabled or not Path(output).exists():
+            return
+        entry = self.root / key
+        tmp = self.root / f".{key}.{os.getpid()}.{threading.get_ident()}"
+        try:
+            _link_or_copy(Path(output), tmp / "output.mp4")
+            if frames_dir is not None and Path(frames_dir).exists():
+                _link_tree(Path(frames_dir), tmp / "frames")
+            # result.json を最後に書く（これがあるエントリだけを有効とみなす）
+            (tmp / "result.json").write_text(json.dumps(result))
+            with self._lock:
+                if key in self._sizes:
+                    return
+                tmp.rename(entry)
+                self._sizes[key] = _tree_size(entry)
+                self.stores += 1
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            total = sum(self._sizes.values())
+            if total <= self.max_bytes:
+                return
+            by_access = sorted(self._sizes, key=lambda k: self._last_access(k))
+            victims = []
+            for key in by_access:
+                if total <= self.max_bytes:
+                    break
+                total -= self._sizes.pop(key)
+                victims.append(key)
+            self.evictions += len(victims)
+        for key in victims:
+            print(f"🧹 Evicting cached result {key[:12]}")
+            shutil.rmtree(self.root / key, ignore_errors=True)
+
+    def _last_access(self, key: str) -> float:
+        try:
+            return (self.root / key / "result.json").stat().st_mtime
+        except FileNotFoundError:
+            return 0.0
+
+    # ============================================================
+    # 📊 状態
+    # ============================================================
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._sizes),
+                "bytes": sum(self._sizes.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "stores": self.stores,
+                "evictions": self.evictions,
+            }
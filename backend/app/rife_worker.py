@@ -1,88 +1,630 @@
-import os
-import subprocess
-import shutil
-from pathlib import Path
-from typing import Literal, Optional
-
-from settings import settings
-from utils.video import (
-    extract_frames,
-    ensure_dir,
-    auto_encode_video,   # glob対応
-)
-
-RIFE_PY = Path(settings.rife_repo) / "inference_video.py"
-
-
-class RIFEWorker:
-    """RIFE フレーム補間処理ワーカー"""
-
-    def __init__(self, storage: str = settings.storage):
-        self.storage = Path(storage)
-        ensure_dir(self.storage)
-
-    # ============================================================
-    # 🎞️ 動画全体補間
-    # ============================================================
-    def interpolate_video(self,
-                          input_video: Path,
-                          out_video: Path,
-                          exp: int = 2,
-                          fps: Optional[int] = None,
-                          scale: Literal[1, 2, 4] = 1):
-        work_dir = self.storage / "tmp_frames"
-        ensure_dir(work_dir)
-
-        extract_frames(input_video, work_dir, fps or 30)
-
-        cmd = [
-            "python3", str(RIFE_PY),
-            "--img", str(work_dir),
-            "--output", str(work_dir / "output"),
-            "--exp", str(exp),
-        ]
-        print("🚀 Running RIFE:", " ".join(cmd))
-        subprocess.run(cmd, check=True)
-
-        auto_encode_video(work_dir / "output", out_video, fps=fps or 30)
-        print(f"✅ RIFE interpolation complete → {out_video}")
-        return out_video
-
-    # ============================================================
-    # 🖼️ 2枚の画像補間
-    # ============================================================
-    def interpolate_two_frames(self,
-                               frame_a: Path,
-                               frame_b: Path,
-                               out_video: Path,
-                               num_mid: int = 6,
-                               fps: int = 30):
-        work_dir = Path(out_video).with_suffix("").parent / (out_video.stem + "_frames")
-        if work_dir.exists():
-            shutil.rmtree(work_dir)
-        ensure_dir(work_dir)
-
-        tmp_pair = work_dir / "pair"
-        ensure_dir(tmp_pair)
-        shutil.copy(frame_a, tmp_pair / "000000.png")
-        shutil.copy(frame_b, tmp_pair / "000001.png")
-
-        exp = 1
-        while (2 ** exp) - 1 < num_mid:
-            exp += 1
-
-        cmd = [
-            "python3", str(RIFE_PY),
-            "--img", str(tmp_pair),
-            "--output", str(work_dir / "output"),
-            "--exp", str(exp),
-        ]
-        print("🚀 Running RIFE (pair):", " ".join(cmd))
-        subprocess.run(cmd, check=True)
-
-        auto_encode_video(work_dir / "output", out_video, fps=fps)
-        print(f"🎬 Video created → {out_video}")
-
-        # ❌ job は main.py 側で管理されるので、ここでは触らない
-        return out_video
-
+import contextlib
+import itertools
+import math
+import os
+import subprocess
+import shutil
+import threading
+import time
+from fractions import Fraction
+from pathlib import Path
+from typing import Iterator, List, Literal, Optional
+
+import cv2
+import numpy as np
+
+from settings import settings
+from inference_engine import RIFEEngine, FLOW_SCALES, auto_flow_scale
+from utils.video import (
+    extract_frames,
+    ensure_dir,
+    auto_encode_video,   # glob対応
+    probe_video,
+    VideoInfo,
+    read_clip,
+    read_frames,
+    read_thumbnails,
+    FrameWriter,
+    concat_videos,
+)
+from utils.retime import (
+    as_fraction,
+    retime_ratio,
+    pair_timesteps,
+    max_pair_timesteps,
+    lands_on_frame,
+    count_output_frames,
+)
+from utils import scene
+from pipeline import Pipeline
+from batcher import BatchServer
+from progress import Progress
+import segments
+import profiling
+from scratch import scratch_dir
+from metrics import observe
+
+RIFE_PY = Path(settings.rife_repo) / "inference_video.py"
+
+# PNG 連番の1画素あたりの平均サイズ（bgr24 の 3 バイトに対する圧縮後の目安）
+_PNG_BYTES_PER_PIXEL = 1.8
+
+
+class RIFEWorker:
+    """RIFE フレーム補間処理ワーカー"""
+
+    def __init__(self,
+                 storage: str = settings.storage,
+                 mode: Literal["inprocess", "subprocess"] = settings.inference_mode,
+                 pipeline: Literal["stream", "frames"] = settings.video_pipeline):
+        self.storage = Path(storage)
+        ensure_dir(self.storage)
+        self.mode = mode
+        self.pipeline = pipeline
+        self.engine = RIFEEngine() if mode == "inprocess" else None
+        self.batcher: Optional[BatchServer] = None
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    # ============================================================
+    # 🧠 モデル常駐（起動時に呼ぶ）
+    # ============================================================
+    def load(self):
+        """常駐モードならモデルを事前ロード。失敗時は subprocess モードへフォールバック"""
+        if self.engine is None:
+            print("🐢 RIFE worker mode: subprocess")
+            return
+        try:
+            self.engine.load()
+            print("⚡ RIFE worker mode: inprocess")
+            # ジョブが1つずつしか走らないなら他ジョブと束ねる相手がおらず、待ち時間が増えるだけ
+            if settings.batch_max_size > 1 and settings.max_workers > 1:
+                self.batcher = BatchServer(self.engine).start()
+        except Exception as e:
+            print(f"⚠️ RIFE model load failed ({e}) → falling back to subprocess mode")
+            self.engine = None
+            self.mode = "subprocess"
+
+    # ============================================================
+    # 🎞️ 動画全体補間
+    # ============================================================
+    def interpolate_video(self,
+                          input_video: Path,
+                          out_video: Path,
+                          exp: int = 2,
+                          fps: Optional[int] = None,
+                          scale: Optional[float] = None,
+                          target_fps: Optional[float] = None,
+                          detect_scenes: Optional[bool] = None,
+                          progressive: bool = False,
+                          progress: Optional[Progress] = None):
+        """
+        exp       : 2^exp 倍にフレームを増やす（target_fps 未指定時）
+        fps       : 指定時のみソースをこのレートにリサンプル（未指定ならネイティブフレームのまま）
+        scale     : フロースケール（None なら解像度から自動選択）
+        target_fps: 出力フレームレート。ソースと重ならない出力フレームだけを推論する
+        detect_scenes: 重複/カットのペアを事前判定し、推論せずコピーで埋める（既定は設定値）
+        progressive: 処理中から再生できるよう stream_dir(out_video) に HLS を逐次書き出す
+                     （常駐モデルのストリーミング経路のみ。セグメント並列は使わない）
+        progress  : 進捗カウンタ（出力フレームを書くたびに加算）
+        出力レートは target_fps、未指定なら ソースfps × 2^exp
+        """
+        progress = progress or Progress(str(out_video))
+        progress.set_stage("probe")
+        info = probe_video(input_video)
+        # VFR 入力は平均レートの CFR に揃えてから補間する
+        resample = fps or (info.fps if info.vfr else None)
+        src_fps = as_fraction(resample) if resample else info.fps
+        ratio = retime_ratio(src_fps, target_fps, exp)
+        out_fps = as_fraction(target_fps) if target_fps else src_fps * ratio
+
+        if resample is None and info.frame_count:
+            source_total = info.frame_count
+        elif info.duration:
+            source_total = round(info.duration * src_fps)
+        else:
+            source_total = None
+        plan = {
+            "source_fps": float(src_fps),
+            "fps": float(out_fps),
+            "source_frames_total": source_total,
+            "frames_total": count_output_frames(source_total, ratio) if source_total else None,
+        }
+
+        scale = self._flow_scale(scale, info.width, info.height)
+        plan["flow_scale"] = scale
+        if self.engine is not None:
+            # タイル分割の判断はペアごとの推論枚数で決まる（target_fps の変換では ratio と一致しない）
+            n = max_pair_timesteps(ratio)
+            plan["tile_size"] = self.engine.plan_batch(info.height, info.width, n, scale)[1] if n else None
+
+        hls_dir = stream_dir(out_video) if progressive and self.engine is not None else None
+        plan["progressive"] = hls_dir is not None
+
+        codes = None
+        if self.engine is not None and (settings.scene_detect if detect_scenes is None else detect_scenes):
+            progress.set_stage("scene")
+            codes = self._detect_scenes(input_video, info, resample)
+            plan.update(scene.summarize(codes))
+
+        # 長尺動画はセグメントに分けてプロセスプールで並列補間
+        if hls_dir is None and self._use_segments(source_total):
+            progress.set_stage("interpolate", plan["frames_total"])
+            stats = self._interpolate_video_segmented(input_video, out_video, info, ratio, resample,
+                                                      out_fps, codes, scale, source_total, progress)
+            return {"output": str(out_video), **plan, **stats}
+
+        # 常駐モデルがあればディスクを介さないストリーミング経路を使う
+        if self.engine is not None and (self.pipeline == "stream" or hls_dir is not None):
+            progress.set_stage("interpolate", plan["frames_total"])
+            stats = self._interpolate_video_stream(input_video, out_video, info, ratio, resample,
+                                                   out_fps, codes, scale, progress=progress,
+                                                   hls_dir=hls_dir)
+            return {"output": str(out_video), **plan, **stats}
+
+        # 抽出フレームと補間フレームはジョブ専用の作業ディレクトリへ（小さければ RAM ディスク）
+        estimate = None
+        if source_total:
+            estimate = int(info.width * info.height * _PNG_BYTES_PER_PIXEL
+                           * (source_total + plan["frames_total"]))
+        with scratch_dir("frames", estimate) as work_dir:
+            progress.set_stage("extract")
+            extract_frames(input_video, work_dir, resample)
+
+            progress.set_stage("interpolate", plan["frames_total"])
+            stats = self._run_rife(work_dir, work_dir / "output", exp, ratio, codes, scale, progress)
+
+            progress.set_stage("encode")
+            if self.engine is None:
+                # subprocess は 2^exp 倍でしか出力できないため、オーバーサンプルして間引く
+                oversampled = src_fps * 2 ** _subprocess_exp(ratio)
+                auto_encode_video(work_dir / "output", out_video, fps=oversampled,
+                                  out_fps=out_fps if out_fps != oversampled else None)
+            else:
+                auto_encode_video(work_dir / "output", out_video, fps=out_fps)
+        print(f"✅ RIFE interpolation complete → {out_video}")
+        return {"output": str(out_video), **plan, **stats}
+
+    def _interpolate_video_stream(self,
+                                  input_video: Path,
+                                  out_video: Path,
+                                  info: VideoInfo,
+                                  ratio: Fraction,
+                                  resample: Optional[Fraction],
+                                  out_fps: Fraction,
+                                  codes: Optional[np.ndarray] = None,
+                                  scale: float = 1.0,
+                                  start: int = 0,
+                                  end: Optional[int] = None,
+                                  progress: Optional[Progress] = None,
+                                  hls_dir: Optional[Path] = None) -> dict:
+        """
+        ffmpeg(rawvideo) → RIFE → ffmpeg(stdin) のストリーミング補間
+        デコード・推論・エンコードは Pipeline で並行に動き、段の間のキュー分だけフレームを保持する
+        start / end を指定するとソースフレーム [start, end] の区間だけを処理する（セグメント用）
+        end の出力は次のセグメントの先頭になるので、最後のソースフレームは end=None のときだけ書く
+        hls_dir を指定するとエンコード結果を HLS セグメントとして逐次公開し、最後に out_video へまとめる
+        """
+        width, height = info.width, info.height
+        print(f"🚀 Running RIFE (stream): {width}x{height}, x{float(ratio):g} → {out_fps} fps"
+              + (f", frames {start}..{end if end is not None else 'end'}" if start or end else ""))
+
+        stats: dict = {}
+        if hls_dir is not None and hls_dir.exists():
+            shutil.rmtree(hls_dir)  # 再実行時は前回のプレイリストを捨てる
+        decoder = read_frames(input_video, width, height, resample, start=start, end=end, source_fps=info.fps)
+        # 中断・エラー時も read_frames の finally（ffmpeg の停止）を走らせる（chain で包むと close が届かない）
+        with contextlib.closing(decoder):
+            frames = decoder
+            if start:
+                first = next(decoder, None)
+                if first is None:
+                    # リサンプル時のフレーム数は尺からの見積もりなので、末尾のセグメントが空になることがある
+                    # （最後のフレームは前のセグメントが書く）
+                    print(f"⏭️ Segment from frame {start} is past the end of the source, skipped")
+                    return {"source_frames": 0, "frames_out": 0}
+                frames = itertools.chain([first], decoder)
+            with FrameWriter(out_video, width, height, out_fps,
+                             hls_dir=hls_dir, segment_s=settings.hls_segment_s) as writer:
+                stats.update(Pipeline().run(
+                    frames,
+                    lambda source: self._generate_frames(source, ratio, stats, codes, scale,
+                                                         offset=start, emit_last=end is None, end=end),
+                    _counted(writer.write, progress),
+                ))
+
+        print(f"✅ RIFE interpolation complete → {out_video} (bottleneck: {stats['bottleneck']})")
+        return stats
+
+    # ============================================================
+    # 👀 低解像度プレビュー
+    # ============================================================
+    def preview_video(self,
+                      input_video: Path,
+                      out_video: Path,
+                      start: float = 0.0,
+                      duration: Optional[float] = None,
+                      exp: int = 1,
+                      target_fps: Optional[float] = None,
+                      scale: Optional[float] = None,
+                      width: Optional[int] = None,
+                      progress: Optional[Progress] = None):
+        """
+        start 秒から duration 秒だけを幅 width に縮小し、粗いフロースケールで補間した短いクリップを作る
+        本番と同じ _generate_frames を通すので、補間の見た目（破綻の有無）を数秒で確認できる
+        シーン判定・タイル分割・セグメント並列は使わない（常駐モデル専用）
+        """
+        if self.engine is None:
+            raise RuntimeError("preview requires the in-process model (inference_mode=inprocess)")
+        progress = progress or Progress(str(out_video))
+        progress.set_stage("probe")
+        info = probe_video(input_video)
+        resample = info.fps if info.vfr else None
+        src_fps = info.fps
+        ratio = retime_ratio(src_fps, target_fps, exp)
+        out_fps = as_fraction(target_fps) if target_fps else src_fps * ratio
+
+        duration = min(duration or settings.preview_seconds, settings.preview_max_seconds)
+        if info.duration:
+            start = max(0.0, min(start, info.duration - duration))
+        out_w = min(width or settings.preview_width, info.width) // 2 * 2
+        out_h = max(2, round(out_w * info.height / info.width / 2) * 2)
+        scale = self._flow_scale(scale or settings.preview_scale, out_w, out_h)
+
+        source_total = max(1, round(duration * src_fps))
+        plan = {
+            "preview": {"start": start, "duration": duration, "width": out_w, "height": out_h},
+            "source_fps": float(src_fps),
+            "fps": float(out_fps),
+            "flow_scale": scale,
+            "frames_total": count_output_frames(source_total, ratio),
+        }
+        print(f"👀 Running RIFE (preview): {start:g}s+{duration:g}s, {out_w}x{out_h}, "
+              f"x{float(ratio):g}, scale={scale}")
+
+        progress.set_stage("interpolate", plan["frames_total"])
+        stats: dict = {}
+        frames = read_clip(input_video, out_w, out_h, start, duration, resample)
+        with FrameWriter(out_video, out_w, out_h, out_fps) as writer:
+            stats.update(Pipeline().run(
+                frames,
+                lambda source: self._generate_frames(source, ratio, stats, scale=scale),
+                _counted(writer.write, progress),
+            ))
+        return {"output": str(out_video), **plan, **stats}
+
+    # ============================================================
+    # 🧩 セグメント並列補間
+    # ============================================================
+    def _use_segments(self, source_total: Optional[int]) -> bool:
+        return (self.engine is not None
+                and self.pipeline == "stream"
+                and not profiling.active()
+                and settings.segment_workers > 1
+                and bool(source_total)
+                and source_total > settings.segment_frames)
+
+    def _segment_pool(self):
+        """子プロセスごとにモデルを常駐させたプールを初回だけ作成"""
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = segments.create_pool(settings.segment_workers)
+            return self._pool
+
+    def _interpolate_video_segmented(self,
+                                     input_video: Path,
+                                     out_video: Path,
+                                     info: VideoInfo,
+                                     ratio: Fraction,
+                                     resample: Optional[Fraction],
+                                     out_fps: Fraction,
+                                     codes: Optional[np.ndarray],
+                                     scale: float,
+                                     source_total: int,
+                                     progress: Optional[Progress] = None) -> dict:
+        """
+        ソースを segment_frames ごとに区切って並列に補間し、concat demuxer で再エンコードなしに連結
+        セグメント k は [start, end) の出力だけを書くので、境界フレームは重複も欠落もしない
+        子プロセスの進捗は見えないため、progress はセグメント完了ごとにまとめて進める
+        """
+        plan = segments.plan_segments(source_total, settings.segment_frames)
+        print(f"🧩 Running RIFE (segmented): {len(plan)} segments × {settings.segment_workers} processes")
+
+        # セグメントの mp4 は大きさが読めないのでディスク側の作業ディレクトリに置く
+        with scratch_dir("segments") as seg_dir:
+            parts = [seg_dir / f"{k:05d}.mp4" for k in range(len(plan))]
+            pool = self._segment_pool()
+            futures = [
+                pool.submit(segments.render_segment, dict(
+                    input_video=input_video, out_video=part, info=info, ratio=ratio,
+                    resample=resample, out_fps=out_fps, codes=codes, scale=scale,
+                    start=start, end=end,
+                ))
+                for part, (start, end) in zip(parts, plan)
+            ]
+            if progress is not None:
+                for future in futures:
+                    future.add_done_callback(
+                        lambda f: f.exception() is None and progress.advance(f.result()["frames_out"]))
+            try:
+                results = [f.result() for f in futures]
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+            stats = segments.merge_stats(results)
+            if progress is not None:
+                progress.set_stage("concat")
+            # ソースの末尾より後ろだった（空の）セグメントは出力がないので連結しない
+            concat_videos([part for part, r in zip(parts, results) if r["frames_out"]], out_video)
+
+        print(f"✅ RIFE interpolation complete → {out_video}")
+        return stats
+
+    def close(self):
+        """バッチサーバとセグメント用プロセスプールを停止"""
+        if self.batcher is not None:
+            self.batcher.stop()
+            self.batcher = None
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+    def _detect_scenes(self,
+                       input_video: Path,
+                       info: VideoInfo,
+                       resample: Optional[Fraction]) -> np.ndarray:
+        """縮小グレースケールの事前パスで各ペアを normal / duplicate / cut に分類"""
+        width = min(settings.scene_thumb_width, info.width)
+        height = max(2, round(width * info.height / info.width / 2) * 2)
+        codes = scene.classify_thumbnails(
+            read_thumbnails(input_video, width, height, resample),
+            dup_mad=settings.scene_dup_mad,
+            cut_mad=settings.scene_cut_mad,
+            cut_ssim=settings.scene_cut_ssim,
+        )
+        print(f"🎬 Scene pre-pass: {scene.summarize(codes)}")
+        return codes
+
+    def _generate_frames(self,
+                         frames: Iterator[np.ndarray],
+                         ratio: Fraction,
+                         stats: dict,
+                         codes: Optional[np.ndarray] = None,
+                         scale: float = 1.0,
+                         offset: int = 0,
+                         emit_last: bool = True,
+                         end: Optional[int] = None) -> Iterator[np.ndarray]:
+        """
+        ソースフレーム列から出力フレーム列を生成する
+        ratio = 1ソース区間あたりの出力枚数（2^exp もしくは target_fps / src_fps）
+        ソース時刻に重なる出力はコピー、それ以外の timestep だけをペア単位でバッチ推論
+        codes（scene の判定結果）が duplicate / cut のペアは推論せずソースフレームで埋める
+        offset は frames[0] のソースフレーム番号（セグメント処理時の通し番号）
+        end（セグメントの最後のソースフレーム）より手前でソースが尽きたら、そこが動画の末尾なので
+        emit_last でなくても最後のフレームを書く
+        """
+        frames = iter(frames)
+        prev = next(frames, None)
+        if prev is None:
+            raise RuntimeError("no frames decoded")
+
+        cache = self.engine.new_cache()
+        copied = interpolated = skipped = 0
+        infer_time = 0.0
+        last = 0
+        for i, cur in enumerate(frames, start=offset):
+            timesteps = pair_timesteps(i, ratio)
+            if timesteps and timesteps[0] == 0:
+                yield prev
+                copied += 1
+                timesteps = timesteps[1:]
+            kind = codes[i] if codes is not None and i < len(codes) else scene.NORMAL
+            if timesteps and kind != scene.NORMAL:
+                # 重複は直前フレーム、カットは時刻が近い側のフレームをそのまま使う
+                for t in timesteps:
+                    yield prev if kind == scene.DUPLICATE or t < 0.5 else cur
+                skipped += len(timesteps)
+            elif timesteps:
+                t_start = time.perf_counter()
+                mids = self.engine.interpolate_n(
+                    prev, cur, len(timesteps),
+                    scale=scale,
+                    timesteps=[float(t) for t in timesteps],
+                    cache=cache, keys=(i, i + 1))
+                elapsed = time.perf_counter() - t_start
+                observe("inference", elapsed, path="video")
+                infer_time += elapsed
+                interpolated += len(timesteps)
+                yield from mids
+            prev = cur
+            last = i + 1
+        if (emit_last or (end is not None and last < end)) and lands_on_frame(last, ratio):
+            yield prev
+            copied += 1
+
+        stats.update({
+            "source_frames": last - offset + 1,
+            "frames_out": copied + interpolated + skipped,
+            "frames_copied": copied,
+            "frames_interpolated": interpolated,
+            "frames_skipped": skipped,
+            "ms_per_frame": round(1000 * infer_time / interpolated, 2) if interpolated else None,
+            **cache.stats(),
+        })
+
+    # ============================================================
+    # 🖼️ 2枚の画像補間
+    # ============================================================
+    def interpolate_two_frames(self,
+                               frame_a: Path,
+                               frame_b: Path,
+                               out_video: Path,
+                               num_mid: int = 6,
+                               fps: int = 30,
+                               exact: bool = True,
+                               scale: Optional[float] = None,
+                               progress: Optional[Progress] = None):
+        """
+        exact=True（常駐モデル時）: t=i/(num_mid+1) を1バッチで推論し、ちょうど num_mid 枚を生成
+        exact=False / subprocess: 2**exp - 1 >= num_mid となる exp で再帰補間（従来動作）
+        """
+        progress = progress or Progress(str(out_video))
+        work_dir = Path(out_video).with_suffix("").parent / (out_video.stem + "_frames")
+        if work_dir.exists():
+            shutil.rmtree(work_dir)
+        ensure_dir(work_dir)
+
+        if exact and self.engine is not None:
+            progress.set_stage("interpolate", num_mid + 2)
+            stats = self._interpolate_pair_exact(frame_a, frame_b, work_dir / "output", num_mid, scale)
+            progress.advance(num_mid + 2)
+            progress.set_stage("encode")
+            auto_encode_video(work_dir / "output", out_video, fps=fps)
+            print(f"🎬 Video created → {out_video}")
+            return {"output": str(out_video), **stats}
+
+        exp = 1
+        while (2 ** exp) - 1 < num_mid:
+            exp += 1
+
+        img = _read_frame(frame_a)
+        scale = self._flow_scale(scale, img.shape[1], img.shape[0])
+        progress.set_stage("interpolate", 2 ** exp + 1)
+        with scratch_dir("pair", 2 * os.path.getsize(frame_a) + 2 * os.path.getsize(frame_b)) as tmp_pair:
+            shutil.copy(frame_a, tmp_pair / "000000.png")
+            shutil.copy(frame_b, tmp_pair / "000001.png")
+            stats = self._run_rife(tmp_pair, work_dir / "output", exp, scale=scale, progress=progress)
+        progress.set_stage("encode")
+
+        auto_encode_video(work_dir / "output", out_video, fps=fps)
+        print(f"🎬 Video created → {out_video}")
+
+        # ❌ job は main.py 側で管理されるので、ここでは触らない
+        return {"output": str(out_video), **stats}
+
+    # ============================================================
+    # 🚀 RIFE 実行（常駐モデル / subprocess）
+    # ============================================================
+    def _run_rife(self, img_dir: Path, out_dir: Path, exp: int,
+                  ratio: Optional[Fraction] = None,
+                  codes: Optional[np.ndarray] = None,
+                  scale: float = 1.0,
+                  progress: Optional[Progress] = None) -> dict:
+        """
+        補間を実行し、統計（エンコーダ実行回数など）を返す
+        ratio は常駐モデルでのみ有効（subprocess は ratio 以上の 2^exp 倍で実行）
+        """
+        if self.engine is not None:
+            return self._run_rife_inprocess(img_dir, out_dir, ratio or Fraction(2 ** exp), codes, scale,
+                                            progress)
+        if ratio is not None:
+            exp = _subprocess_exp(ratio)
+        self._run_rife_subprocess(img_dir, out_dir, exp, scale)
+        return {}
+
+    def _interpolate_pair_exact(self, frame_a: Path, frame_b: Path, out_dir: Path, num_mid: int,
+                                scale: Optional[float] = None) -> dict:
+        """2枚の間にちょうど num_mid 枚を生成し、out_dir に 000001.png から書き出す"""
+        ensure_dir(out_dir)
+        img0 = _read_frame(frame_a)
+        img1 = _read_frame(frame_b)
+        if img1.shape != img0.shape:
+            img1 = cv2.resize(img1, (img0.shape[1], img0.shape[0]), interpolation=cv2.INTER_AREA)
+
+        scale = self._flow_scale(scale, img0.shape[1], img0.shape[0])
+        print(f"🚀 Running RIFE (pair, exact): num_mid={num_mid}, scale={scale}")
+        t_start = time.perf_counter()
+        if self.batcher is not None and not profiling.active():
+            # 同時に来た他ジョブの要求と同じ forward にまとめて推論
+            timesteps = [(i + 1) / (num_mid + 1) for i in range(num_mid)]
+            mids, queue_ms = self.batcher.interpolate(img0, img1, timesteps, scale)
+            extra = {"batched": True, "queue_ms": queue_ms}
+        else:
+            cache = self.engine.new_cache()
+            mids = self.engine.interpolate_n(img0, img1, num_mid, scale=scale, cache=cache, keys=(0, 1))
+            extra = cache.stats()
+        elapsed = time.perf_counter() - t_start
+        observe("inference", elapsed, path="pair")
+        for index, frame in enumerate([img0, *mids, img1], start=1):
+            cv2.imwrite(str(out_dir / f"{index:06d}.png"), frame)
+        return {
+            "num_mid": len(mids),
+            "flow_scale": scale,
+            "ms_per_frame": round(1000 * elapsed / max(1, len(mids)), 2),
+            **extra,
+        }
+
+    @staticmethod
+    def _flow_scale(scale: Optional[float], width: int, height: int) -> float:
+        """指定があれば検証して使い、なければ解像度から自動選択"""
+        if not scale:
+            return auto_flow_scale(width, height)
+        if float(scale) not in FLOW_SCALES:
+            raise ValueError(f"scale must be one of {FLOW_SCALES}")
+        return float(scale)
+
+    def _run_rife_subprocess(self, img_dir: Path, out_dir: Path, exp: int, scale: float = 1.0):
+        cmd = [
+            "python3", str(RIFE_PY),
+            "--img", str(img_dir),
+            "--output", str(out_dir),
+            "--exp", str(exp),
+            "--scale", str(scale),
+        ]
+        print("🚀 Running RIFE:", " ".join(cmd))
+        subprocess.run(cmd, check=True)
+
+    def _run_rife_inprocess(self, img_dir: Path, out_dir: Path, ratio: Fraction,
+                            codes: Optional[np.ndarray] = None,
+                            scale: float = 1.0,
+                            progress: Optional[Progress] = None) -> dict:
+        """常駐モデルで連番PNGを補間し、out_dir に 000001.png から連番で書き出す"""
+        frames: List[Path] = sorted(img_dir.glob("*.png"))
+        if not frames:
+            raise RuntimeError(f"no frames found in {img_dir}")
+        if out_dir.exists():
+            shutil.rmtree(out_dir)
+        ensure_dir(out_dir)
+
+        print(f"🚀 Running RIFE (inprocess): {len(frames)} frames, x{float(ratio):g}")
+
+        stats: dict = {}
+        source = (_read_frame(path) for path in frames)
+        index = itertools.count(1)
+        stats.update(Pipeline().run(
+            source,
+            lambda decoded: self._generate_frames(decoded, ratio, stats, codes, scale),
+            _counted(lambda frame: cv2.imwrite(str(out_dir / f"{next(index):06d}.png"), frame), progress),
+        ))
+        return stats
+
+
+def stream_dir(out_video: Path) -> Path:
+    """progressive 出力の HLS（プレイリストとセグメント）の置き場所"""
+    out_video = Path(out_video)
+    return out_video.with_name(f"{out_video.stem}_hls")
+
+
+def _counted(sink, progress: Optional[Progress]):
+    """書き出し関数に進捗カウンタの加算を付け足す（progress なしならそのまま）"""
+    if progress is None:
+        return sink
+
+    def write(frame):
+        sink(frame)
+        progress.advance()
+    return write
+
+
+def _subprocess_exp(ratio: Fraction) -> int:
+    """ratio 倍以上になる最小の exp（inference_video.py は 2^exp 倍のみ対応）"""
+    return max(1, math.ceil(math.log2(ratio)))
+
+
+def _read_frame(path: Path):
+    frame = cv2.imread(str(path), cv2.IMREAD_COLOR)
+    if frame is None:
+        raise RuntimeError(f"failed to read frame: {path}")
+    return frame
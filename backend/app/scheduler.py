@@ -0,0 +1,138 @@
+# /app/scheduler.py
+# ============================================================
+# バックグラウンド・ジョブスケジューラ
+# POST は待ち行列に積むだけで即座に返し、固定数のワーカースレッドが順に実行する
+# 待ち行列は優先度付き（priority が小さいほど先。同じ優先度なら投入順）
+# ============================================================
+
+import bisect
+import itertools
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from settings import settings
+from metrics import JOBS, observe
+
+
+class JobScheduler:
+    """待ち行列 + ワーカースレッドプールでジョブを実行するスケジューラ"""
+
+    def __init__(self,
+                 max_workers: int = settings.max_workers,
+                 on_update: Optional[Callable[[Any], None]] = None):
+        """on_update: ジョブの状態が変わるたびに呼ばれる（永続化用）"""
+        self.max_workers = max(1, max_workers)
+        self.on_update = on_update
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._pending: List[Tuple[int, int, str]] = []  # 待機中の (priority, 投入順, ジョブID)。実行順に並ぶ
+        self._running: Dict[str, Any] = {}
+        self._submitted: Dict[str, float] = {}  # 待ち時間の計測用
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    # ============================================================
+    # ▶️ 起動 / 停止
+    # ============================================================
+    def start(self):
+        if self._threads:
+            return
+        for i in range(self.max_workers):
+            t = threading.Thread(target=self._loop, name=f"rife-job-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        print(f"🧵 Job scheduler started with {self.max_workers} worker(s)")
+
+    def stop(self):
+        # 待機中のジョブより先に取り出されるよう最優先で積む（残りは SQLite から再投入される）
+        for _ in self._threads:
+            self._queue.put((float("-inf"), next(self._seq), None, None))
+        for t in self._threads:
+            t.join(timeout=1)
+        self._threads = []
+
+    # ============================================================
+    # 📥 投入
+    # ============================================================
+    def submit(self, job, fn: Callable[[Any], None], priority: int = 0):
+        """
+        job: status / error 属性を持つジョブ情報（JobStatus）
+        fn : ワーカースレッドで実行される処理。job を受け取り結果を書き込む
+        priority: 小さいほど先に実行（プレビューなど待たせたくないジョブは負の値）
+        """
+        job.status = "queued"
+        entry = (priority, next(self._seq), job.id)
+        with self._lock:
+            bisect.insort(self._pending, entry)
+            self._submitted[job.id] = time.monotonic()
+        self._queue.put((*entry[:2], job, fn))
+
+    # ============================================================
+    # 📊 状態
+    # ============================================================
+    @property
+    def queue_depth(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    @property
+    def running(self) -> int:
+        with self._lock:
+            return len(self._running)
+
+    def position(self, job_id: str) -> Optional[int]:
+        """待機中なら自分より前にあるジョブ数、それ以外は None"""
+        with self._lock:
+            for position, entry in enumerate(self._pending):
+                if entry[2] == job_id:
+                    return position
+            return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queue_depth": len(self._pending),
+                "running": len(self._running),
+                "max_workers": self.max_workers,
+            }
+
+    # ============================================================
+    # 🔁 ワーカーループ
+    # ============================================================
+    def _loop(self):
+        while True:
+            priority, seq, job, fn = self._queue.get()
+            if job is None:
+                break
+            kind = getattr(job, "kind", "unknown")
+            started = time.monotonic()
+            with self._lock:
+                self._pending.remove((priority, seq, job.id))
+                self._running[job.id] = job
+                observe("queue_wait", started - self._submitted.pop(job.id, started), kind=kind)
+            job.status = "running"
+            self._notify(job)
+            try:
+                fn(job)
+                job.status = "done"
+            except Exception as e:
+                print(f"❌ Job {job.id} failed: {e}")
+                job.status = "error"
+                job.error = str(e)
+            finally:
+                with self._lock:
+                    self._running.pop(job.id, None)
+                observe("job", time.monotonic() - started, kind=kind, status=job.status)
+                JOBS.inc(kind=kind, status=job.status)
+                self._notify(job)
+                self._queue.task_done()
+
+    def _notify(self, job):
+        if self.on_update is None:
+            return
+        try:
+            self.on_update(job)
+        except Exception as e:
+            print(f"⚠️ Failed to persist job {job.id}: {e}")
@@ -0,0 +1,96 @@
+# /app/scratch.py
+# ============================================================
+# ジョブごとの作業ディレクトリ（中間フレームなど）
+# ジョブ単位で分離して必ず削除し、見積もりサイズが予算内なら RAM ディスク (/dev/shm) に置く
+# ============================================================
+
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+from settings import settings
+
+_PREFIX = "rife-"
+
+# RAM ディスク上で予約中のバイト数（同時実行ジョブで予算を分け合う）
+_reserved = 0
+_lock = threading.Lock()
+
+
+def disk_root() -> Path:
+    return Path(settings.scratch_dir or Path(settings.storage) / "scratch")
+
+
+def _reserve_ram(estimate: Optional[int]) -> Optional[Path]:
+    """予算と空き容量の両方に収まれば RAM ディスクを予約して返す"""
+    global _reserved
+    ram = Path(settings.scratch_ram_dir) if settings.scratch_ram_dir else None
+    budget = settings.scratch_ram_mb * 2 ** 20
+    if estimate is None or ram is None or budget <= 0 or not ram.is_dir():
+        return None
+    with _lock:
+        free = shutil.disk_usage(ram).free
+        if _reserved + estimate > budget or estimate > free * 0.9:
+            return None
+        _reserved += estimate
+    return ram
+
+
+def _release_ram(estimate: int):
+    global _reserved
+    with _lock:
+        _reserved -= estimate
+
+
+@contextmanager
+def scratch_dir(name: str, estimate: Optional[int] = None) -> Iterator[Path]:
+    """
+    ジョブ専用の一時ディレクトリを作り、with を抜けるときに（例外時も）削除する
+    estimate: 見積もりバイト数。None ならディスク、予算内なら RAM ディスクを使う
+    """
+    ram = _reserve_ram(estimate)
+    root = ram or disk_root()
+    root.mkdir(parents=True, exist_ok=True)
+    path = Path(tempfile.mkdtemp(prefix=f"{_PREFIX}{os.getpid()}-{name}-", dir=root))
+    print(f"📂 Scratch: {path} ({'ram' if ram else 'disk'}"
+          + (f", ~{estimate / 2 ** 20:.0f}MB)" if estimate is not None else ")"))
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+        if ram is not None:
+            _release_ram(estimate)
+
+
+def cleanup_orphans() -> int:
+    """
+    終了したプロセスが残した作業ディレクトリを削除（ジョブ開始前の起動時に呼ぶ）
+    再起動で PID が再利用されることがあるので、自分の PID のものも前回の残骸として消す
+    """
+    removed = 0
+    roots = [disk_root()] + ([Path(settings.scratch_ram_dir)] if settings.scratch_ram_dir else [])
+    for root in roots:
+        if not root.is_dir():
+            continue
+        for path in root.glob(f"{_PREFIX}*"):
+            pid = path.name[len(_PREFIX):].split("-", 1)[0]
+            if pid.isdigit() and (int(pid) == os.getpid() or not _alive(int(pid))):
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+    if removed:
+        print(f"🧹 Removed {removed} orphaned scratch dir(s)")
+    return removed
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
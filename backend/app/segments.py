@@ -0,0 +1,81 @@
+# /app/segments.py
+# ============================================================
+# 長尺動画のセグメント並列補間
+# ソースを固定フレーム数で区切り（境界フレームは前後で共有）、
+# 各セグメントを ProcessPoolExecutor の別プロセス（モデル常駐）で補間して concat で連結する
+# ============================================================
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from settings import settings
+from pipeline import merge_pipeline_stats
+
+# 子プロセス内で常駐させるワーカー
+_worker = None
+
+
+def plan_segments(total: int, segment_frames: int) -> List[Tuple[int, Optional[int]]]:
+    """
+    ソースフレーム [0, total) を (start, end) に分割する
+    end は次セグメントの start と同じフレーム（1フレーム重なり）で、最後だけ None（末尾まで）
+    各セグメントは [start, end) 区間の出力を担当するので、境界の重複・欠落は起きない
+    """
+    segment_frames = max(2, segment_frames)
+    starts = list(range(0, max(total - 1, 1), segment_frames))
+    return [(s, starts[k + 1] if k + 1 < len(starts) else None) for k, s in enumerate(starts)]
+
+
+def segment_threads(workers: int) -> int:
+    """1プロセスあたりの torch スレッド数（未指定ならコア数を均等割り）"""
+    if settings.segment_threads > 0:
+        return settings.segment_threads
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+def create_pool(workers: int) -> ProcessPoolExecutor:
+    """モデルを常駐させた子プロセスのプールを作成（torch と fork の相性を避けて spawn）"""
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(segment_threads(workers),),
+    )
+
+
+def _init_worker(threads: int):
+    global _worker
+    import torch
+    torch.set_num_threads(threads)
+
+    from rife_worker import RIFEWorker
+    _worker = RIFEWorker(mode="inprocess")
+    _worker.engine.load()
+    print(f"🧩 Segment worker ready (pid={os.getpid()}, threads={threads})")
+
+
+def render_segment(kwargs: dict) -> dict:
+    """子プロセスで1セグメントをストリーミング補間し、統計を返す"""
+    return _worker._interpolate_video_stream(**kwargs)
+
+
+def merge_stats(parts: List[dict]) -> dict:
+    """セグメントごとの統計を1ジョブ分に集計（境界フレームの二重カウントを除く）"""
+    parts = [s for s in parts if s.get("source_frames")]  # 末尾の空セグメントは除く
+    merged: dict = {}
+    for stats in parts:
+        for key, value in stats.items():
+            if isinstance(value, int) and not isinstance(value, bool):
+                merged[key] = merged.get(key, 0) + value
+    if "source_frames" in merged:
+        merged["source_frames"] -= len(parts) - 1
+
+    interpolated = merged.get("frames_interpolated", 0)
+    if interpolated:
+        weighted = sum((s.get("ms_per_frame") or 0) * s.get("frames_interpolated", 0) for s in parts)
+        merged["ms_per_frame"] = round(weighted / interpolated, 2)
+    merged.update(merge_pipeline_stats([s.get("pipeline") for s in parts]) or {})
+    merged["segments"] = len(parts)
+    return merged
@@ -1,9 +1,75 @@
-from pydantic_settings import BaseSettings
-from typing import List
-
-class Settings(BaseSettings):
-    storage: str = "/data"
-    cors_origins: List[str] = ["http://localhost", "http://127.0.0.1", "http://localhost:5173"]
-    rife_repo: str = "/opt/rife"
-
-settings = Settings()
\ No newline at end of file
+from pydantic_settings import BaseSettings
+from typing import List, Literal
+
+class Settings(BaseSettings):
+    storage: str = "/data"
+    cors_origins: List[str] = ["http://localhost", "http://127.0.0.1", "http://localhost:5173"]
+    rife_repo: str = "/opt/rife"
+    # RIFE モデル（flownet.pkl と RIFE_HDv3.py を含む train_log）
+    rife_model_dir: str = "/opt/rife/models/train_log"
+    # inprocess: モデル常駐 / subprocess: inference_video.py を毎回起動
+    inference_mode: Literal["inprocess", "subprocess"] = "inprocess"
+    # stream: ffmpeg rawvideo パイプで直接補間 / frames: PNG 連番を経由
+    video_pipeline: Literal["stream", "frames"] = "stream"
+    # デコード→推論→エンコード間のキュー長（フレーム数）。満杯なら上流が待つ
+    pipeline_depth: int = 4
+    # Head 特徴量 LRU キャッシュの容量（フレーム数。タイル分割時はタイル数）
+    feature_cache_size: int = 4
+    # 1回の forward にまとめる timestep 数（1 なら逐次推論）
+    timestep_batch: int = 8
+    # 推論1回あたりのメモリ予算（MB）。超える解像度はタイル分割（0 で無効）
+    inference_memory_mb: int = 4096
+    # タイル同士の重なり幅（px）。継ぎ目はこの幅でフェザーブレンド
+    tile_overlap: int = 64
+    # セグメント並列補間（2 以上で有効）。segment_frames を超える動画を分割して並列処理
+    segment_workers: int = 0
+    segment_frames: int = 600
+    # 1プロセスあたりの torch スレッド数（0 = CPU コア数 / segment_workers）
+    segment_threads: int = 0
+    # シーン判定の事前パス（重複・カットのペアは推論せずコピー）
+    scene_detect: bool = True
+    scene_thumb_width: int = 64
+    scene_dup_mad: float = 0.002     # 平均絶対差がこれ以下なら重複
+    scene_cut_mad: float = 0.12      # 平均絶対差がこれ以上かつ
+    scene_cut_ssim: float = 0.4      # SSIM がこれ以下ならカット
+    # /api/preview: 区間の長さ（秒、上限）・縮小後の幅・フロースケール
+    # 本番の前に補間の具合を数秒で確認するため、小さく粗く処理する
+    preview_seconds: float = 3.0
+    preview_max_seconds: float = 10.0
+    preview_width: int = 320
+    preview_scale: float = 0.5
+    # wait=true のプレビューが結果を待つ上限（秒）。過ぎたらジョブ情報を返してポーリングさせる
+    preview_wait_s: float = 30.0
+    # progressive=true のジョブが処理中に書き出す HLS（fMP4）セグメントの長さ（秒）
+    hls_segment_s: float = 2.0
+    # profile=true のジョブ: Python スタックのサンプリング間隔（ms）と torch トレースに残す IFNet forward の回数
+    profile_sample_ms: float = 5.0
+    profile_torch_steps: int = 50
+    # ジョブをまたいだ動的バッチング（frames ジョブ）。1 以下で無効
+    # 複数ジョブの要求をまとめる機能なので、max_workers が 1 のときは使わない
+    batch_max_size: int = 16
+    batch_max_wait_ms: float = 10.0
+    # アップロード上限（MB、nginx の client_max_body_size と揃える）と分割アップロードの推奨チャンク
+    max_upload_mb: int = 200
+    upload_chunk_mb: int = 8
+    # ジョブごとの作業ディレクトリ（空なら <storage>/scratch）
+    # 中間フレームの見積もりが scratch_ram_mb 以内なら scratch_ram_dir（tmpfs）を使う
+    scratch_dir: str = ""
+    scratch_ram_dir: str = "/dev/shm"
+    scratch_ram_mb: int = 2048
+    # /data の掃除: 最終ダウンロードから ttl 時間で削除、ジョブの成果物が quota（MB）を超えたら古い順に削除（0 で無効）
+    storage_ttl_hours: float = 72
+    storage_quota_mb: int = 20480
+    janitor_interval_s: float = 300
+    # 結果キャッシュの容量（MB）。同じ入力・同じパラメータの再投入は推論せずに返す（0 で無効）
+    result_cache_mb: int = 10240
+    # 進捗を SQLite に書き戻す間隔 / SSE で送る間隔（秒）
+    progress_flush_s: float = 1.0
+    progress_interval_s: float = 0.5
+    # 同時に実行するジョブ数（ワーカースレッド数）
+    max_workers: int = 1
+    # 複数の uvicorn ワーカーで SQLite を共有するときの生存期限（秒）
+    # これだけ heartbeat のないプロセスが残した queued / running のジョブを他のワーカーが回収する
+    owner_lease_s: float = 30.0
+
+settings = Settings()
@@ -0,0 +1,232 @@
+# /app/uploads.py
+# ============================================================
+# アップロードの保存（イベントループを止めない・サイズ上限・書き込みながらハッシュ）
+# 大きな動画向けに、途中から再開できる分割アップロードも扱う
+#   POST  /api/uploads        → upload_id を払い出す（全体サイズを申告）
+#   PATCH /api/uploads/{id}   → Upload-Offset の位置から追記（切断されたら GET で offset を確認して再送）
+# ============================================================
+
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional, Tuple
+from uuid import uuid4
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+from settings import settings
+from metrics import UPLOAD_BYTES, observe, span
+
+_CHUNK = 1 << 20
+
+
+class UploadTooLarge(Exception):
+    """サイズ上限（または申告サイズ）を超えた"""
+
+
+class UploadConflict(Exception):
+    """追記位置がサーバ側の受信済みサイズと合わない（offset を返して再送させる）"""
+
+    def __init__(self, offset: int):
+        super().__init__(f"upload offset mismatch (expected {offset})")
+        self.offset = offset
+
+
+def max_upload_bytes() -> int:
+    return settings.max_upload_mb * 2 ** 20
+
+
+async def save_upload(upload: UploadFile, dst: Path, limit: Optional[int] = None) -> str:
+    """
+    multipart で受け取ったファイルをスレッドプールで書き出し、sha256 を返す
+    上限を超えたら書きかけのファイルを消して UploadTooLarge
+    """
+    limit = limit or max_upload_bytes()
+
+    def copy() -> str:
+        h = hashlib.sha256()
+        size = 0
+        with dst.open("wb") as f:
+            while chunk := upload.file.read(_CHUNK):
+                size += len(chunk)
+                if size > limit:
+                    raise UploadTooLarge(f"upload exceeds {limit} bytes")
+                h.update(chunk)
+                f.write(chunk)
+        return h.hexdigest()
+
+    try:
+        with span("upload", kind="multipart"):
+            digest = await run_in_threadpool(copy)
+        UPLOAD_BYTES.inc(dst.stat().st_size, kind="multipart")
+        return digest
+    except BaseException:
+        dst.unlink(missing_ok=True)
+        raise
+
+
+class UploadManager:
+    """
+    分割アップロードの管理
+    uploads/<id>.part に追記し、uploads/<id>.json にサイズ・完了時のハッシュを持つ
+    受信済みサイズは .part のファイルサイズそのもの（再起動しても再開できる）
+    """
+
+    def __init__(self, root: Optional[Path] = None):
+        self.root = Path(root or Path(settings.storage) / "uploads")
+        self.root.mkdir(parents=True, exist_ok=True)
+        # 受信途中のハッシュ状態（offset が一致すれば続きから計算、なければ先頭から再計算）
+        self._hashers: Dict[str, Tuple[int, "hashlib._Hash"]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _meta_path(self, upload_id: str) -> Path:
+        if not upload_id.isalnum():
+            raise KeyError(upload_id)
+        return self.root / f"{upload_id}.json"
+
+    def part_path(self, upload_id: str) -> Path:
+        return self.root / f"{upload_id}.part"
+
+    def _meta(self, upload_id: str) -> dict:
+        path = self._meta_path(upload_id)
+        if not path.exists():
+            raise KeyError(upload_id)
+        return json.loads(path.read_text())
+
+    def _save_meta(self, upload_id: str, meta: dict):
+        tmp = self._meta_path(upload_id).with_suffix(".tmp")
+        tmp.write_text(json.dumps(meta))
+        os.replace(tmp, self._meta_path(upload_id))
+
+    # ============================================================
+    # 🆕 作成 / 状態 / 削除
+    # ============================================================
+    def create(self, size: int, filename: str = "") -> dict:
+        if size <= 0:
+            raise ValueError("size must be positive")
+        if size > max_upload_bytes():
+            raise UploadTooLarge(f"upload exceeds {max_upload_bytes()} bytes")
+        upload_id = uuid4().hex
+        self.part_path(upload_id).touch()
+        self._save_meta(upload_id, {"size": size, "filename": filename, "created_at": time.time()})
+        return self.status(upload_id)
+
+    def status(self, upload_id: str) -> dict:
+        meta = self._meta(upload_id)
+        offset = self.part_path(upload_id).stat().st_size
+        return {
+            "upload_id": upload_id,
+            "size": meta["size"],
+            "offset": offset,
+            "complete": offset == meta["size"],
+            "sha256": meta.get("sha256"),
+            "chunk_size": settings.upload_chunk_mb * 2 ** 20,
+        }
+
+    def delete(self, upload_id: str):
+        self._meta(upload_id)
+        self.part_path(upload_id).unlink(missing_ok=True)
+        self._meta_path(upload_id).unlink(missing_ok=True)
+        self._hashers.pop(upload_id, None)
+        self._locks.pop(upload_id, None)
+
+    # ============================================================
+    # ➕ 追記
+    # ============================================================
+    async def append(self, upload_id: str, offset: int, chunks: AsyncIterator[bytes]) -> dict:
+        """
+        offset から chunks を追記する。1MB ずつまとめてスレッドプールで書き込み・ハッシュ計算
+        途中で切断されても書き込み済みの分は残り、次の PATCH はその位置から再開できる
+        """
+        meta = self._meta(upload_id)
+        lock = self._locks.setdefault(upload_id, asyncio.Lock())
+        if lock.locked():
+            raise UploadConflict(self.part_path(upload_id).stat().st_size)
+        async with lock:
+            part = self.part_path(upload_id)
+            current = part.stat().st_size
+            if offset != current:
+                raise UploadConflict(current)
+            hasher = await run_in_threadpool(self._hasher, upload_id, current)
+
+            started = time.perf_counter()
+            received_from = current
+            f = await run_in_threadpool(part.open, "ab")
+            buf = bytearray()
+
+            def flush(data: bytes):
+                hasher.update(data)
+                f.write(data)
+                f.flush()
+
+            try:
+                async for chunk in chunks:
+                    if current + len(buf) + len(chunk) > meta["size"]:
+                        raise UploadTooLarge("chunk exceeds declared upload size")
+                    buf += chunk
+                    if len(buf) >= _CHUNK:
+                        await run_in_threadpool(flush, bytes(buf))
+                        current += len(buf)
+                        buf.clear()
+                if buf:
+                    await run_in_threadpool(flush, bytes(buf))
+                    current += len(buf)
+            finally:
+                await run_in_threadpool(f.close)
+                self._hashers[upload_id] = (current, hasher)
+                observe("upload", time.perf_counter() - started, kind="chunk")
+                UPLOAD_BYTES.inc(current - received_from, kind="chunk")
+
+            if current == meta["size"]:
+                meta["sha256"] = hasher.hexdigest()
+                self._save_meta(upload_id, meta)
+                self._hashers.pop(upload_id, None)
+        return self.status(upload_id)
+
+    def _hasher(self, upload_id: str, offset: int):
+        state = self._hashers.get(upload_id)
+        if state is not None and state[0] == offset:
+            return state[1]
+        # 別プロセス・再起動後の再開は受信済みの分を読み直してハッシュ状態を作る
+        h = hashlib.sha256()
+        with self.part_path(upload_id).open("rb") as f:
+            remaining = offset
+            while remaining > 0:
+                chunk = f.read(min(_CHUNK, remaining))
+                if not chunk:
+                    break
+                h.update(chunk)
+                remaining -= len(chunk)
+        return h
+
+    # ============================================================
+    # 📦 完了したアップロードをジョブの入力として取り出す
+    # ============================================================
+    def share(self, upload_id: str, dst: Path) -> str:
+        """
+        完了済みアップロードを残したまま dst にハードリンク（できなければコピー）して sha256 を返す
+        プレビューの後に同じ upload_id で本番ジョブを投入できる
+        """
+        status = self.status(upload_id)
+        if not status["complete"]:
+            raise UploadConflict(status["offset"])
+        try:
+            os.link(self.part_path(upload_id), dst)
+        except OSError:
+            shutil.copyfile(self.part_path(upload_id), dst)
+        return status["sha256"]
+
+    def take(self, upload_id: str, dst: Path) -> str:
+        """完了済みアップロードを dst に移動して sha256 を返す"""
+        status = self.status(upload_id)
+        if not status["complete"]:
+            raise UploadConflict(status["offset"])
+        os.replace(self.part_path(upload_id), dst)
+        self._meta_path(upload_id).unlink(missing_ok=True)
+        self._locks.pop(upload_id, None)
+        return status["sha256"]
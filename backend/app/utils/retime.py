@@ -0,0 +1,58 @@
+# /app/utils/retime.py
+# ============================================================
+# 出力タイムスタンプ → (ソースペア, timestep) の対応付け
+# exp (2^exp 倍) も target_fps (24→60 など) も「1ソースフレームあたりの出力枚数 ratio」で表す
+# ============================================================
+
+from fractions import Fraction
+from math import ceil, floor
+from typing import List, Optional, Union
+
+Rate = Union[int, float, str, Fraction]
+
+
+def as_fraction(rate: Rate) -> Fraction:
+    """30 / 29.97 / "30000/1001" などを Fraction に変換"""
+    if isinstance(rate, Fraction):
+        return rate
+    if isinstance(rate, str):
+        return Fraction(rate)
+    return Fraction(rate).limit_denominator(1001000)
+
+
+def retime_ratio(src_fps: Rate, target_fps: Optional[Rate] = None, exp: int = 1) -> Fraction:
+    """1ソースフレーム区間あたりの出力フレーム数（target_fps 未指定なら 2**exp）"""
+    if target_fps is None:
+        return Fraction(2 ** exp)
+    return as_fraction(target_fps) / as_fraction(src_fps)
+
+
+def pair_timesteps(i: int, ratio: Fraction) -> List[Fraction]:
+    """
+    ソースフレーム i と i+1 の区間 [i, i+1) に落ちる出力フレームの timestep 一覧
+    0 はソースフレーム i そのもの（推論不要）
+    """
+    first = ceil(i * ratio)
+    last = ceil((i + 1) * ratio)
+    return [j / ratio - i for j in range(first, last)]
+
+
+def max_pair_timesteps(ratio: Fraction) -> int:
+    """
+    1ペアで推論する timestep 数の最大（ソースフレームに重なる 0 は除く）
+    ペアごとの並びは ratio の分母の周期で繰り返すので、1周期ぶん（長すぎる場合は先頭だけ）を調べる
+    """
+    return max(sum(1 for t in pair_timesteps(i, ratio) if t)
+               for i in range(min(ratio.denominator, 4096)))
+
+
+def lands_on_frame(i: int, ratio: Fraction) -> bool:
+    """ソースフレーム i の時刻にちょうど出力フレームがあるか"""
+    return (i * ratio).denominator == 1
+
+
+def count_output_frames(n_src: int, ratio: Fraction) -> int:
+    """n_src 枚のソースから生成される出力フレーム数"""
+    if n_src <= 0:
+        return 0
+    return floor((n_src - 1) * ratio) + 1
@@ -0,0 +1,93 @@
+# /app/utils/scene.py
+# ============================================================
+# シーンカット・重複フレーム判定（縮小グレースケールでの事前パス）
+# 重複ペアは補間しても同じ画像、カットをまたぐ補間はゴーストになるので推論を省く
+# ============================================================
+
+from typing import Iterable, List
+
+import numpy as np
+
+NORMAL = 0
+DUPLICATE = 1
+CUT = 2
+LABELS = {NORMAL: "normal", DUPLICATE: "duplicate", CUT: "cut"}
+
+_SSIM_BLOCK = 8
+_C1 = (0.01 * 255) ** 2
+_C2 = (0.03 * 255) ** 2
+
+
+def pair_metrics(a: np.ndarray, b: np.ndarray):
+    """
+    a[i] と b[i] (N, h, w) の各ペアについて
+    平均絶対差（0〜1）とブロック単位 SSIM の平均をまとめて計算する
+    """
+    a = a.astype(np.float32)
+    b = b.astype(np.float32)
+    mad = np.abs(a - b).mean(axis=(1, 2)) / 255.
+
+    n, h, w = a.shape
+    bh, bw = h // _SSIM_BLOCK, w // _SSIM_BLOCK
+    if bh == 0 or bw == 0:
+        blocks_a = a.reshape(n, 1, -1)
+        blocks_b = b.reshape(n, 1, -1)
+    else:
+        crop = (slice(None), slice(0, bh * _SSIM_BLOCK), slice(0, bw * _SSIM_BLOCK))
+        shape = (n, bh, _SSIM_BLOCK, bw, _SSIM_BLOCK)
+        blocks_a = a[crop].reshape(shape).transpose(0, 1, 3, 2, 4).reshape(n, bh * bw, -1)
+        blocks_b = b[crop].reshape(shape).transpose(0, 1, 3, 2, 4).reshape(n, bh * bw, -1)
+
+    mu_a = blocks_a.mean(axis=2)
+    mu_b = blocks_b.mean(axis=2)
+    var_a = blocks_a.var(axis=2)
+    var_b = blocks_b.var(axis=2)
+    cov = (blocks_a * blocks_b).mean(axis=2) - mu_a * mu_b
+    ssim = ((2 * mu_a * mu_b + _C1) * (2 * cov + _C2)) / \
+           ((mu_a ** 2 + mu_b ** 2 + _C1) * (var_a + var_b + _C2))
+    return mad, ssim.mean(axis=1)
+
+
+def classify(mad: np.ndarray,
+             ssim: np.ndarray,
+             dup_mad: float,
+             cut_mad: float,
+             cut_ssim: float) -> np.ndarray:
+    """各ペアを NORMAL / DUPLICATE / CUT に分類"""
+    codes = np.full(mad.shape, NORMAL, dtype=np.int8)
+    codes[mad <= dup_mad] = DUPLICATE
+    codes[(mad >= cut_mad) & (ssim <= cut_ssim)] = CUT
+    return codes
+
+
+def classify_thumbnails(thumbs: Iterable[np.ndarray],
+                        dup_mad: float,
+                        cut_mad: float,
+                        cut_ssim: float,
+                        chunk: int = 512) -> np.ndarray:
+    """
+    縮小フレーム列から全ペアの分類を返す（長さ = フレーム数 - 1）
+    chunk 枚ずつ処理するので長い動画でもメモリは一定
+    """
+    results: List[np.ndarray] = []
+    buf: List[np.ndarray] = []
+    for thumb in thumbs:
+        buf.append(thumb)
+        if len(buf) > chunk:
+            stack = np.stack(buf)
+            results.append(classify(*pair_metrics(stack[:-1], stack[1:]), dup_mad, cut_mad, cut_ssim))
+            buf = buf[-1:]
+    if len(buf) > 1:
+        stack = np.stack(buf)
+        results.append(classify(*pair_metrics(stack[:-1], stack[1:]), dup_mad, cut_mad, cut_ssim))
+    if not results:
+        return np.zeros(0, dtype=np.int8)
+    return np.concatenate(results)
+
+
+def summarize(codes: np.ndarray) -> dict:
+    return {
+        "pairs_normal": int((codes == NORMAL).sum()),
+        "pairs_duplicate": int((codes == DUPLICATE).sum()),
+        "pairs_cut": int((codes == CUT).sum()),
+    }
@@ -1,85 +1,482 @@
-# /app/utils/video.py
-# ============================================================
-# ffmpegを用いたフレーム抽出・動画化ユーティリティ
-# Practical-RIFE + FastAPI 環境対応版（glob対応付き）
-# ============================================================
-
-import os
-import subprocess
-from pathlib import Path
-
-
-def ensure_dir(path: Path):
-    """指定ディレクトリが存在しない場合に作成"""
-    os.makedirs(path, exist_ok=True)
-
-
-def extract_frames(video_path: Path, out_dir: Path, fps: int = 30):
-    """動画ファイルから指定FPSでフレームを抽出"""
-    ensure_dir(out_dir)
-    cmd = [
-        "ffmpeg",
-        "-nostdin",
-        "-y",
-        "-i", str(video_path),
-        "-vf", f"fps={fps}",
-        str(out_dir / "%06d.png"),
-    ]
-    print("🎥 Extracting frames:", " ".join(cmd))
-    subprocess.run(cmd, check=True)
-
-
-def encode_video_from_frames(frame_dir: Path, output_path: Path, fps: int = 30):
-    """
-    ffmpegで指定ディレクトリ内の連番画像(%06d.png)を動画化
-    例：000001.png, 000002.png … のように連番で保存されている場合
-    """
-    cmd = [
-        "ffmpeg",
-        "-nostdin",
-        "-y",
-        "-framerate", str(fps),
-        "-i", str(frame_dir / "%06d.png"),
-        "-pix_fmt", "yuv420p",
-        "-crf", "18",
-        str(output_path),
-    ]
-    print("🎬 Encoding (sequential):", " ".join(cmd))
-    subprocess.run(cmd, check=True)
-    print(f"✅ 動画生成完了: {output_path}")
-
-
-def encode_video_from_frames_glob(frame_dir: Path, output_path: Path, fps: int = 30):
-    """
-    ffmpegでワイルドカード(*.png)を使って動画化（glob対応）
-    ファイル名に_が含まれていたり、連番でない場合に有効
-    """
-    ensure_dir(frame_dir)
-    cmd = [
-        "ffmpeg",
-        "-nostdin",
-        "-y",
-        "-framerate", str(fps),
-        "-pattern_type", "glob",
-        "-i", str(frame_dir / "*.png"),
-        "-pix_fmt", "yuv420p",
-        "-crf", "18",
-        str(output_path),
-    ]
-    print("🎬 Encoding (glob):", " ".join(cmd))
-    subprocess.run(cmd, check=True)
-    print(f"✅ 動画生成完了: {output_path}")
-
-
-def auto_encode_video(frame_dir: Path, output_path: Path, fps: int = 30):
-    """
-    自動判定で encode_video_from_frames / glob を選択
-    000001.png が存在すれば連番モード、それ以外はglobモード
-    """
-    sequential_first = frame_dir / "000001.png"
-    if sequential_first.exists():
-        print("🧩 Detected sequential frames → using %06d mode")
-        encode_video_from_frames(frame_dir, output_path, fps)
-    else:
-        print("🧩 Detected irregular frame names → using glob mode")
-        encode_video_from_frames_glob(frame_dir, output_path, fps)
+# /app/utils/video.py
+# ============================================================
+# ffmpegを用いたフレーム抽出・動画化ユーティリティ
+# Practical-RIFE + FastAPI 環境対応版（glob対応付き）
+# ============================================================
+
+import json
+import os
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from fractions import Fraction
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from metrics import observe, span
+
+
+def ensure_dir(path: Path):
+    """指定ディレクトリが存在しない場合に作成"""
+    os.makedirs(path, exist_ok=True)
+
+
+# ============================================================
+# 🔎 ffprobe による入力解析（入力ファイルごとにキャッシュ）
+# ============================================================
+@dataclass(frozen=True)
+class VideoInfo:
+    width: int
+    height: int
+    fps: Fraction                  # 平均フレームレート（VFR の場合はリサンプル先）
+    frame_count: Optional[int]     # 映像パケット数（= ネイティブのフレーム数）
+    duration: Optional[float]
+    vfr: bool                      # r_frame_rate と avg_frame_rate が異なる可変フレームレート
+    codec: str = ""
+    rotation: int = 0              # 表示時の回転（度）。width / height は回転後（ffmpeg が自動回転した後）の値
+
+
+_PROBE_CACHE: "OrderedDict[Tuple[str, int, int], VideoInfo]" = OrderedDict()
+_PROBE_CACHE_SIZE = 128
+_PROBE_LOCK = threading.Lock()
+
+
+def _parse_rate(rate: Optional[str]) -> Optional[Fraction]:
+    if not rate or rate.startswith("0/") or rate.endswith("/0"):
+        return None
+    return Fraction(rate)
+
+
+def _rotation(stream: dict) -> int:
+    """displaymatrix のサイドデータ、なければ古い形式の tags.rotate から回転角（0 / 90 / 180 / 270）を得る"""
+    for side_data in stream.get("side_data_list") or []:
+        if "rotation" in side_data:
+            return round(float(side_data["rotation"])) % 360
+    rotate = (stream.get("tags") or {}).get("rotate")
+    return round(float(rotate)) % 360 if rotate else 0
+
+
+def probe_video(video_path: Path) -> VideoInfo:
+    """
+    ffprobe で解像度・フレームレート・フレーム数・VFR を取得
+    結果は (パス, サイズ, 更新時刻) をキーにキャッシュする
+    """
+    st = os.stat(video_path)
+    key = (str(video_path), st.st_size, st.st_mtime_ns)
+    with _PROBE_LOCK:
+        if key in _PROBE_CACHE:
+            _PROBE_CACHE.move_to_end(key)
+            return _PROBE_CACHE[key]
+
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-select_streams", "v:0",
+        "-count_packets",
+        "-show_entries",
+        "stream=width,height,r_frame_rate,avg_frame_rate,nb_read_packets,duration,codec_name"
+        ":stream_tags=rotate:stream_side_data=rotation:format=duration",
+        "-of", "json",
+        str(video_path),
+    ]
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+    data = json.loads(out)
+    if not data.get("streams"):
+        raise RuntimeError(f"no video stream in {video_path}")
+    stream = data["streams"][0]
+
+    r_rate = _parse_rate(stream.get("r_frame_rate"))
+    avg_rate = _parse_rate(stream.get("avg_frame_rate"))
+    duration = stream.get("duration") or data.get("format", {}).get("duration")
+    packets = stream.get("nb_read_packets")
+    rotation = _rotation(stream)
+    # デコード時に ffmpeg が自動回転するので、縦横 90° 回転ならパイプに出てくるのは W と H が入れ替わった画像
+    width, height = int(stream["width"]), int(stream["height"])
+    if rotation % 180:
+        width, height = height, width
+
+    info = VideoInfo(
+        width=width,
+        height=height,
+        fps=avg_rate or r_rate or Fraction(30),
+        frame_count=int(packets) if packets else None,
+        duration=float(duration) if duration else None,
+        vfr=bool(r_rate and avg_rate and r_rate != avg_rate),
+        codec=stream.get("codec_name", ""),
+        rotation=rotation,
+    )
+    print(f"🔎 Probed {video_path}: {info}")
+
+    with _PROBE_LOCK:
+        _PROBE_CACHE[key] = info
+        while len(_PROBE_CACHE) > _PROBE_CACHE_SIZE:
+            _PROBE_CACHE.popitem(last=False)
+    return info
+
+
+def _rate_args(fps: Optional[Union[int, float, Fraction]], filters: Tuple[str, ...] = (),
+               pre: Tuple[str, ...] = ()) -> list:
+    """
+    fps 指定ありならそのレートにリサンプル、なしならネイティブフレームをそのまま出す
+    filters は fps の後ろに続けるフィルタ（縮小など）、pre は fps の前に置くフィルタ
+    """
+    chain = list(pre) + ([f"fps={fps}"] if fps else []) + list(filters)
+    args = [] if fps else ["-vsync", "passthrough"]
+    if chain:
+        args += ["-vf", ",".join(chain)]
+    return args
+
+
+def extract_frames(video_path: Path, out_dir: Path, fps: Optional[int] = None):
+    """動画ファイルからフレームを抽出（fps 未指定ならネイティブフレームを保持）"""
+    ensure_dir(out_dir)
+    cmd = [
+        "ffmpeg",
+        "-nostdin",
+        "-y",
+        "-i", str(video_path),
+        *_rate_args(fps),
+        str(out_dir / "%06d.png"),
+    ]
+    print("🎥 Extracting frames:", " ".join(cmd))
+    with span("ffmpeg", op="extract"):
+        subprocess.run(cmd, check=True)
+
+
+def _output_rate(out_fps: Optional[float]) -> list:
+    """入力と異なる出力フレームレートが指定された場合、ffmpeg 側で間引き/複製する"""
+    return ["-r", str(out_fps)] if out_fps else []
+
+
+# moov を先頭に置き、ダウンロード完了前でもブラウザが再生を始められるようにする
+_FASTSTART = ["-movflags", "+faststart"]
+
+
+def encode_video_from_frames(frame_dir: Path, output_path: Path, fps: int = 30,
+                             out_fps: Optional[float] = None):
+    """
+    ffmpegで指定ディレクトリ内の連番画像(%06d.png)を動画化
+    例：000001.png, 000002.png … のように連番で保存されている場合
+    """
+    cmd = [
+        "ffmpeg",
+        "-nostdin",
+        "-y",
+        "-framerate", str(fps),
+        "-i", str(frame_dir / "%06d.png"),
+        "-pix_fmt", "yuv420p",
+        "-crf", "18",
+        *_output_rate(out_fps),
+        *_FASTSTART,
+        str(output_path),
+    ]
+    print("🎬 Encoding (sequential):", " ".join(cmd))
+    with span("ffmpeg", op="encode"):
+        subprocess.run(cmd, check=True)
+    print(f"✅ 動画生成完了: {output_path}")
+
+
+def encode_video_from_frames_glob(frame_dir: Path, output_path: Path, fps: int = 30,
+                                  out_fps: Optional[float] = None):
+    """
+    ffmpegでワイルドカード(*.png)を使って動画化（glob対応）
+    ファイル名に_が含まれていたり、連番でない場合に有効
+    """
+    ensure_dir(frame_dir)
+    cmd = [
+        "ffmpeg",
+        "-nostdin",
+        "-y",
+        "-framerate", str(fps),
+        "-pattern_type", "glob",
+        "-i", str(frame_dir / "*.png"),
+        "-pix_fmt", "yuv420p",
+        "-crf", "18",
+        *_output_rate(out_fps),
+        *_FASTSTART,
+        str(output_path),
+    ]
+    print("🎬 Encoding (glob):", " ".join(cmd))
+    with span("ffmpeg", op="encode"):
+        subprocess.run(cmd, check=True)
+    print(f"✅ 動画生成完了: {output_path}")
+
+
+def auto_encode_video(frame_dir: Path, output_path: Path, fps: int = 30,
+                      out_fps: Optional[float] = None):
+    """
+    自動判定で encode_video_from_frames / glob を選択
+    000001.png が存在すれば連番モード、それ以外はglobモード
+    """
+    sequential_first = frame_dir / "000001.png"
+    if sequential_first.exists():
+        print("🧩 Detected sequential frames → using %06d mode")
+        encode_video_from_frames(frame_dir, output_path, fps, out_fps)
+    else:
+        print("🧩 Detected irregular frame names → using glob mode")
+        encode_video_from_frames_glob(frame_dir, output_path, fps, out_fps)
+
+
+# ============================================================
+# 🌊 ストリーミング（ディスクを使わない rawvideo パイプ）
+# ============================================================
+def _read_exact(pipe, buf: bytearray) -> bool:
+    """パイプから buf を埋めるまで読む。EOF なら False"""
+    view = memoryview(buf)
+    got = 0
+    while got < len(buf):
+        n = pipe.readinto(view[got:])
+        if not n:
+            if got:
+                raise RuntimeError("truncated rawvideo frame from ffmpeg")
+            return False
+        got += n
+    return True
+
+
+def read_frames(video_path: Path,
+                width: int,
+                height: int,
+                fps: Optional[Union[float, Fraction]] = None,
+                start: int = 0,
+                end: Optional[int] = None,
+                source_fps: Optional[Union[float, Fraction]] = None) -> Iterator[np.ndarray]:
+    """
+    ffmpeg で rawvideo(bgr24) にデコードし、1フレームずつ HxWx3 uint8 配列として返す
+    配列はフレームごとに確保した bytearray のビューなので torch.from_numpy でそのまま使える
+    start / end（両端含む）を指定するとフレーム番号で区間を切り出す（セグメント用）
+    start は入力側の -ss で直前のキーフレームから読み始め、end は -frames:v で止めるので、
+    区間の外はデコードしない（ネイティブフレームのときは source_fps から時刻を求める）
+    """
+    seek: List[str] = []
+    pre: Tuple[str, ...] = ()
+    filters: Tuple[str, ...] = ()
+    rate = fps or source_fps
+    if start and fps:
+        # リサンプル時は全体をデコードしたときと同じ格子（n / fps）に乗せる:
+        # 整数秒だけ手前にシークし、setpts でシーク分の時刻を戻してから fps に通し、start より前を捨てる
+        lead = max(0, int(start / float(fps)) - 1)
+        if lead:
+            seek = ["-ss", str(lead)]
+            pre = (f"setpts=PTS+{lead}/TB",)
+        filters = (f"select=gte(t\\,{(start - 0.5) / float(fps):.6f})",)
+    elif start and rate:
+        # 半フレーム手前にシークすると、正確シークで start より前のフレームだけが捨てられる
+        seek = ["-ss", f"{(start - 0.5) / float(rate):.6f}"]
+    elif start:
+        filters = (f"select=gte(n\\,{start})",)
+    limit = ["-frames:v", str(end - start + 1)] if end is not None else []
+    cmd = [
+        "ffmpeg",
+        "-nostdin",
+        "-v", "error",
+        *seek,
+        "-i", str(video_path),
+        *_rate_args(fps, filters, pre),
+        *limit,
+        "-f", "rawvideo",
+        "-pix_fmt", "bgr24",
+        "-",
+    ]
+    print("🎥 Decoding (stream):", " ".join(cmd))
+    yield from _pipe_frames(cmd, (height, width, 3), "decode")
+
+
+def read_clip(video_path: Path,
+              width: int,
+              height: int,
+              start: float = 0.0,
+              duration: Optional[float] = None,
+              fps: Optional[Union[float, Fraction]] = None) -> Iterator[np.ndarray]:
+    """
+    プレビュー用: start 秒から duration 秒ぶんだけを width x height に縮小して bgr24 で返す
+    -ss / -t を入力側に置くので、先頭からデコードせずに区間の直前のキーフレームから読み始める
+    """
+    window = ["-ss", f"{start:.3f}"] + (["-t", f"{duration:.3f}"] if duration else [])
+    cmd = [
+        "ffmpeg",
+        "-nostdin",
+        "-v", "error",
+        *window,
+        "-i", str(video_path),
+        *_rate_args(fps, (f"scale={width}:{height}:flags=area",)),
+        "-f", "rawvideo",
+        "-pix_fmt", "bgr24",
+        "-",
+    ]
+    print("🎥 Decoding (clip):", " ".join(cmd))
+    yield from _pipe_frames(cmd, (height, width, 3), "decode")
+
+
+def read_thumbnails(video_path: Path,
+                    width: int,
+                    height: int,
+                    fps: Optional[Union[float, Fraction]] = None) -> Iterator[np.ndarray]:
+    """シーン判定用に縮小したグレースケールフレーム (height, width) を順に返す"""
+    cmd = [
+        "ffmpeg",
+        "-nostdin",
+        "-v", "error",
+        "-i", str(video_path),
+        *_rate_args(fps, (f"scale={width}:{height}:flags=area", "format=gray")),
+        "-f", "rawvideo",
+        "-pix_fmt", "gray",
+        "-",
+    ]
+    print("🎥 Decoding (thumbnails):", " ".join(cmd))
+    yield from _pipe_frames(cmd, (height, width), "thumbnails")
+
+
+def _pipe_frames(cmd: list, shape: Tuple[int, ...], op: str) -> Iterator[np.ndarray]:
+    """
+    ffmpeg の rawvideo 出力を shape ごとに区切って返す
+    計測はプロセスの起動から終了まで（下流の推論待ちも含む、ストリーミング経路の実時間）
+    """
+    frame_size = int(np.prod(shape))
+    started = time.perf_counter()
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+    try:
+        while True:
+            buf = bytearray(frame_size)
+            if not _read_exact(proc.stdout, buf):
+                break
+            yield np.frombuffer(buf, dtype=np.uint8).reshape(shape)
+    finally:
+        proc.stdout.close()
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+        observe("ffmpeg", time.perf_counter() - started, op=op)
+    if proc.returncode not in (0, -9):
+        raise subprocess.CalledProcessError(proc.returncode, cmd)
+
+
+def concat_videos(parts: List[Path], output_path: Path):
+    """同じエンコード設定の動画を concat demuxer で再エンコードせずに連結"""
+    list_file = Path(output_path).with_suffix(".concat.txt")
+    list_file.write_text("".join(f"file '{Path(p).resolve()}'\n" for p in parts))
+    cmd = [
+        "ffmpeg",
+        "-nostdin",
+        "-y",
+        "-v", "error",
+        "-f", "concat",
+        "-safe", "0",
+        "-i", str(list_file),
+        "-c", "copy",
+        *_FASTSTART,
+        str(output_path),
+    ]
+    print("🔗 Concatenating segments:", " ".join(cmd))
+    try:
+        with span("ffmpeg", op="concat"):
+            subprocess.run(cmd, check=True)
+    finally:
+        list_file.unlink(missing_ok=True)
+
+
+# ============================================================
+# 📡 プログレッシブ出力（HLS / fragmented MP4）
+# ============================================================
+HLS_PLAYLIST = "index.m3u8"
+
+
+def _hls_args(hls_dir: Path, segment_s: float) -> list:
+    """
+    segment_s 秒ごとにキーフレームを打ち、fMP4 セグメントと EVENT 型プレイリストを逐次書き出す
+    temp_file: 書き込み中のセグメント・プレイリストは .tmp に書いてから rename（途中のものを配信しない）
+    """
+    return [
+        "-force_key_frames", f"expr:gte(t,n_forced*{segment_s})",
+        "-f", "hls",
+        "-hls_time", str(segment_s),
+        "-hls_playlist_type", "event",
+        "-hls_segment_type", "fmp4",
+        "-hls_fmp4_init_filename", "init.mp4",
+        "-hls_segment_filename", str(hls_dir / "%05d.m4s"),
+        "-hls_flags", "temp_file+independent_segments",
+        str(hls_dir / HLS_PLAYLIST),
+    ]
+
+
+def remux_hls(hls_dir: Path, output_path: Path):
+    """完成した HLS を再エンコードせずに1本の MP4（faststart）にまとめる"""
+    cmd = [
+        "ffmpeg",
+        "-nostdin",
+        "-y",
+        "-v", "error",
+        "-i", str(hls_dir / HLS_PLAYLIST),
+        "-c", "copy",
+        *_FASTSTART,
+        str(output_path),
+    ]
+    print("📦 Remuxing HLS:", " ".join(cmd))
+    with span("ffmpeg", op="remux"):
+        subprocess.run(cmd, check=True)
+
+
+class FrameWriter:
+    """
+    rawvideo(bgr24) を ffmpeg の stdin に流し込んで動画化するエンコーダ
+    hls_dir を指定すると HLS セグメントとして書き出し（処理中から再生できる）、
+    close() で同じエンコード結果を output_path の MP4 にまとめる（エンコードは1回だけ）
+    """
+
+    def __init__(self, output_path: Path, width: int, height: int,
+                 fps: Union[float, Fraction] = 30,
+                 hls_dir: Optional[Path] = None,
+                 segment_s: float = 2.0):
+        self.output_path = Path(output_path)
+        self.hls_dir = Path(hls_dir) if hls_dir is not None else None
+        if self.hls_dir is not None:
+            ensure_dir(self.hls_dir)
+            output = _hls_args(self.hls_dir, segment_s)
+        else:
+            output = [*_FASTSTART, str(self.output_path)]
+        self.cmd = [
+            "ffmpeg",
+            "-nostdin",
+            "-y",
+            "-v", "error",
+            "-f", "rawvideo",
+            "-pix_fmt", "bgr24",
+            "-s", f"{width}x{height}",
+            "-framerate", str(fps),
+            "-i", "-",
+            "-pix_fmt", "yuv420p",
+            "-crf", "18",
+            *output,
+        ]
+        print("🎬 Encoding (stream):", " ".join(self.cmd))
+        self.started = time.perf_counter()
+        self.proc = subprocess.Popen(self.cmd, stdin=subprocess.PIPE)
+        self.frames = 0
+
+    def write(self, frame: np.ndarray):
+        self.proc.stdin.write(memoryview(np.ascontiguousarray(frame)))
+        self.frames += 1
+
+    def close(self):
+        if self.proc.stdin and not self.proc.stdin.closed:
+            self.proc.stdin.close()
+        if self.proc.wait() != 0:
+            raise subprocess.CalledProcessError(self.proc.returncode, self.cmd)
+        observe("ffmpeg", time.perf_counter() - self.started, op="encode_stream")
+        if self.hls_dir is not None:
+            remux_hls(self.hls_dir, self.output_path)
+        print(f"✅ 動画生成完了: {self.output_path} ({self.frames} frames)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.proc.kill()
+            self.proc.wait()
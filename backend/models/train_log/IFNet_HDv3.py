@@ -116,7 +116,7 @@ class IFNet(nn.Module):
         )
         '''
 
-    def forward(self, x, timestep=0.5, scale_list=[8, 4, 2, 1], training=False, fastmode=True, ensemble=False):
+    def forward(self, x, timestep=0.5, scale_list=[8, 4, 2, 1], training=False, fastmode=True, ensemble=False, f0=None, f1=None):
         if training == False:
             channel = x.shape[1] // 2
             img0 = x[:, :channel]
@@ -125,8 +125,11 @@ class IFNet(nn.Module):
             timestep = (x[:, :1].clone() * 0 + 1) * timestep
         else:
             timestep = timestep.repeat(1, 1, img0.shape[2], img0.shape[3])
-        f0 = self.encode(img0[:, :3])
-        f1 = self.encode(img1[:, :3])
+        # precomputed Head features (see FeatureCache) skip the encoder pass
+        if f0 is None:
+            f0 = self.encode(img0[:, :3])
+        if f1 is None:
+            f1 = self.encode(img1[:, :3])
         flow_list = []
         merged = []
         mask_list = []
@@ -1,56 +1,132 @@
-import React from 'react'
-import axios from 'axios'
-
-export default function JobStatus({ job: initial }) {
-  const [job, setJob] = React.useState(initial)
-
-  React.useEffect(() => {
-    if (!job?.id) return
-    if (job.status === 'done' || job.status === 'error') return
-
-    const t = setInterval(async () => {
-      try {
-        const { data } = await axios.get(`/api/jobs/${job.id}`)
-        setJob(data)
-      } catch (err) {
-        console.error("JobStatus polling error:", err)
-      }
-    }, 1000)
-
-    return () => clearInterval(t)
-  }, [job?.id, job?.status])
-
-  return (
-    <div style={{
-      marginTop: 16,
-      padding: 12,
-      border: '1px dashed #ccc',
-      borderRadius: 8,
-      background: job.status === 'error' ? '#ffeeee' : '#fafafa'
-    }}>
-      <div><b>Job:</b> {job.id}</div>
-      <div><b>Status:</b> {job.status}</div>
-
-      {job.error && (
-        <div style={{ color: 'crimson', marginTop: 8 }}>
-          {job.error}
-        </div>
-      )}
-
-      {job.status === 'done' && (
-        <div style={{ marginTop: 10 }}>
-          {job.output_url && (
-            <p>
-              🎬 <a href={job.output_url} download>Download video (MP4)</a>
-            </p>
-          )}
-          {/* もし中間フレームZIPがあるなら */}
-          <p>
-            🖼️ <a href={`/api/download_frames/${job.id}`} download>Download frames (ZIP)</a>
-          </p>
-        </div>
-      )}
-    </div>
-  )
-}
-
+import React from 'react'
+import axios from 'axios'
+
+// fMP4 の HLS をそのまま <video> で再生できるのは Safari だけ（Chrome / Firefox は外部プレイヤーで開く）
+const nativeHls = typeof document !== 'undefined' &&
+  document.createElement('video').canPlayType('application/vnd.apple.mpegurl') !== ''
+
+export default function JobStatus({ job: initial }) {
+  const [job, setJob] = React.useState(initial)
+
+  React.useEffect(() => {
+    if (!job?.id) return
+    if (job.status === 'done' || job.status === 'error') return
+
+    // 🆕 SSE で進捗を受け取り、使えない環境では従来の1秒ポーリングに戻す
+    let timer = null
+    const poll = () => {
+      timer = setInterval(async () => {
+        try {
+          const { data } = await axios.get(`/api/jobs/${job.id}`)
+          setJob(data)
+          // 完了したらポーリングを止める（effect は job.id にしか依存しないので自分で止める）
+          if (data.status === 'done' || data.status === 'error') clearInterval(timer)
+        } catch (err) {
+          console.error("JobStatus polling error:", err)
+        }
+      }, 1000)
+    }
+
+    if (!window.EventSource) {
+      poll()
+      return () => clearInterval(timer)
+    }
+
+    const es = new EventSource(`/api/jobs/${job.id}/events`)
+    es.addEventListener('progress', (e) => {
+      const data = JSON.parse(e.data)
+      setJob(data)
+      if (data.status === 'done' || data.status === 'error') es.close()
+    })
+    es.onerror = () => {
+      es.close()
+      if (!timer) poll()
+    }
+
+    return () => {
+      es.close()
+      if (timer) clearInterval(timer)
+    }
+  }, [job?.id])
+
+  const p = job.progress
+
+  return (
+    <div style={{
+      marginTop: 16,
+      padding: 12,
+      border: '1px dashed #ccc',
+      borderRadius: 8,
+      background: job.status === 'error' ? '#ffeeee' : '#fafafa'
+    }}>
+      <div><b>Job:</b> {job.id}</div>
+      <div><b>Status:</b> {job.status}</div>
+
+      {job.status === 'queued' && job.queue_position != null && (
+        <div style={{ color: '#666' }}>
+          ⏳ {job.queue_position} job(s) ahead · {job.running_jobs}/{job.max_workers} running
+        </div>
+      )}
+
+      {job.status === 'running' && p && (
+        <div style={{ marginTop: 8 }}>
+          <div><b>Stage:</b> {p.stage}</div>
+          {p.frames_total ? (
+            <progress value={p.frames_done} max={p.frames_total} style={{ width: '100%' }} />
+          ) : null}
+          <div style={{ color: '#666' }}>
+            {p.frames_done}{p.frames_total ? ` / ${p.frames_total}` : ''} frames
+            {p.fps > 0 && ` · ${p.fps} fps`}
+            {p.eta_s != null && ` · ETA ${Math.ceil(p.eta_s)}s`}
+          </div>
+          {/* progressive ジョブは処理中から HLS で再生できる */}
+          {job.stream_url && nativeHls && (
+            <video src={job.stream_url} controls autoPlay muted style={{ maxWidth: '100%', marginTop: 8 }} />
+          )}
+          {job.stream_url && (
+            <div>
+              📡 <a href={job.stream_url} target="_blank" rel="noreferrer">HLS playlist (.m3u8)</a>
+              {!nativeHls && (
+                <span style={{ color: '#666' }}> · open in VLC / ffplay / Safari to watch while processing</span>
+              )}
+            </div>
+          )}
+        </div>
+      )}
+
+      {job.error && (
+        <div style={{ color: 'crimson', marginTop: 8 }}>
+          {job.error}
+        </div>
+      )}
+
+      {/* profile=true のジョブは失敗してもプロファイルが残る */}
+      {job.profile_url && (
+        <div style={{ marginTop: 8 }}>
+          🔬 <a href={job.profile_url} download>Download profile (ZIP)</a>
+        </div>
+      )}
+
+      {job.status === 'done' && job.kind === 'preview' && job.output_url && (
+        <div style={{ marginTop: 10 }}>
+          <video src={job.output_url} controls autoPlay loop muted style={{ maxWidth: '100%' }} />
+        </div>
+      )}
+
+      {job.status === 'done' && job.kind !== 'preview' && (
+        <div style={{ marginTop: 10 }}>
+          {job.output_url && (
+            <p>
+              🎬 <a href={job.output_url} download>Download video (MP4)</a>
+            </p>
+          )}
+          {/* もし中間フレームZIPがあるなら */}
+          <p>
+            🖼️ <a href={`/api/download_frames/${job.id}`} download>Download frames (ZIP)</a>
+          </p>
+        </div>
+      )}
+    </div>
+  )
+}
+
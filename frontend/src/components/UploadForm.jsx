@@ -1,74 +1,150 @@
-import React from 'react'
-import axios from 'axios'
-
-export default function UploadForm({mode, onSubmitted}){
-  const [loading, setLoading] = React.useState(false)
-  const [exp, setExp] = React.useState(2)
-  const [fps, setFps] = React.useState('')
-  const [scale, setScale] = React.useState(1)
-  const [numMid, setNumMid] = React.useState(6)
-
-  const onSubmit = async (e) => {
-    e.preventDefault()
-    setLoading(true)
-    try{
-      const fd = new FormData()
-      let url = ''
-      if(mode==='video'){
-        const file = e.target.file.files[0]
-        fd.append('file', file)
-        fd.append('exp', exp)
-        if(fps) fd.append('fps', fps)
-        fd.append('scale', scale)
-        url = '/api/interpolate/video'
-      }else{
-        const a = e.target.frame_a.files[0]
-        const b = e.target.frame_b.files[0]
-        fd.append('frame_a', a)
-        fd.append('frame_b', b)
-        fd.append('num_mid', numMid)
-        fd.append('fps', 30)
-        url = '/api/interpolate/frames'
-      }
-      const {data} = await axios.post(url, fd)
-      onSubmitted(data)
-    }catch(err){
-      alert(err?.response?.data?.detail||err.message)
-    }finally{
-      setLoading(false)
-    }
-  }
-
-  return (
-    <form onSubmit={onSubmit} style={{border:'1px solid #ddd', padding:'1rem', borderRadius:8}}>
-      {mode==='video' ? (
-        <>
-          <div>
-            <label>Video file: <input name="file" type="file" accept="video/*" required/></label>
-          </div>
-          <div style={{display:'flex', gap:12, marginTop:8}}>
-            <label>exp (2^exp): <input type="number" value={exp} onChange={e=>setExp(+e.target.value)} min={1} max={6}/></label>
-            <label>target fps: <input type="number" value={fps} onChange={e=>setFps(e.target.value)} placeholder="inherit"/></label>
-            <label>scale: <select value={scale} onChange={e=>setScale(+e.target.value)}>
-              <option value={1}>1</option>
-              <option value={2}>2</option>
-            </select></label>
-          </div>
-        </>
-      ) : (
-        <>
-          <div>
-            <label>Frame A: <input name="frame_a" type="file" accept="image/*" required/></label>
-          </div>
-          <div>
-            <label>Frame B: <input name="frame_b" type="file" accept="image/*" required/></label>
-          </div>
-          <div style={{display:'flex', gap:12, marginTop:8}}>
-            <label># of middle frames: <input type="number" value={numMid} onChange={e=>setNumMid(+e.target.value)} min={1} max={127}/></label>
-          </div>
-        </>
-      )}
-      <button disabled={loading} style={{marginTop:12}}>{loading? 'Processing...' : 'Run RIFE'}</button>
-    </form>
-  )
+import React from 'react'
+import axios from 'axios'
+
+// 🆕 分割アップロード（切断されたらサーバの offset から再開）
+async function uploadResumable(file, onProgress){
+  const fd = new FormData()
+  fd.append('size', file.size)
+  fd.append('filename', file.name)
+  let {data: status} = await axios.post('/api/uploads', fd)
+  let retries = 0
+  while(!status.complete){
+    const chunk = file.slice(status.offset, status.offset + status.chunk_size)
+    try{
+      const res = await axios.patch(`/api/uploads/${status.upload_id}`, chunk, {
+        headers: {'Content-Type': 'application/octet-stream', 'Upload-Offset': status.offset},
+      })
+      status = res.data
+      retries = 0
+    }catch(err){
+      if(++retries > 5) throw err
+      await new Promise(r => setTimeout(r, 1000 * retries))
+      status = (await axios.get(`/api/uploads/${status.upload_id}`)).data
+    }
+    onProgress(status.offset / status.size)
+  }
+  return status.upload_id
+}
+
+export default function UploadForm({mode, onSubmitted}){
+  const [loading, setLoading] = React.useState(false)
+  const [uploaded, setUploaded] = React.useState(null)
+  const [exp, setExp] = React.useState(2)
+  const [targetFps, setTargetFps] = React.useState('')
+  const [scale, setScale] = React.useState('')
+  const [numMid, setNumMid] = React.useState(6)
+  const [progressive, setProgressive] = React.useState(false)
+  const [profile, setProfile] = React.useState(false)
+  // 🆕 プレビューと本番で同じアップロードを使い回す（ファイルを選び直したら破棄）
+  const upload = React.useRef(null)
+
+  const uploadOnce = async (file) => {
+    if(upload.current?.file !== file){
+      upload.current = {file, id: await uploadResumable(file, setUploaded)}
+      setUploaded(null)
+    }
+    return upload.current.id
+  }
+
+  // 🆕 先頭3秒を低解像度で補間して確認（本番ジョブより先に処理される）
+  const onPreview = async (e) => {
+    const form = e.target.form
+    const file = form.file.files[0]
+    if(!file) return form.reportValidity()
+    setLoading(true)
+    try{
+      const fd = new FormData()
+      fd.append('upload_id', await uploadOnce(file))
+      if(targetFps) fd.append('target_fps', targetFps)
+      else fd.append('exp', exp)
+      const {data} = await axios.post('/api/preview', fd)
+      onSubmitted(data)
+    }catch(err){
+      alert(err?.response?.data?.detail||err.message)
+    }finally{
+      setLoading(false)
+      setUploaded(null)
+    }
+  }
+
+  const onSubmit = async (e) => {
+    e.preventDefault()
+    setLoading(true)
+    try{
+      const fd = new FormData()
+      let url = ''
+      if(mode==='video'){
+        const file = e.target.file.files[0]
+        fd.append('upload_id', await uploadOnce(file))
+        upload.current = null  // 本番ジョブはアップロードを消費する
+        fd.append('exp', exp)
+        if(targetFps) fd.append('target_fps', targetFps)
+        if(scale) fd.append('scale', scale)
+        if(progressive) fd.append('progressive', 'true')
+        url = '/api/interpolate/video'
+      }else{
+        const a = e.target.frame_a.files[0]
+        const b = e.target.frame_b.files[0]
+        fd.append('frame_a', a)
+        fd.append('frame_b', b)
+        fd.append('num_mid', numMid)
+        fd.append('fps', 30)
+        url = '/api/interpolate/frames'
+      }
+      if(profile) fd.append('profile', 'true')
+      const {data} = await axios.post(url, fd)
+      onSubmitted(data)
+    }catch(err){
+      alert(err?.response?.data?.detail||err.message)
+    }finally{
+      setLoading(false)
+      setUploaded(null)
+    }
+  }
+
+  return (
+    <form onSubmit={onSubmit} style={{border:'1px solid #ddd', padding:'1rem', borderRadius:8}}>
+      {mode==='video' ? (
+        <>
+          <div>
+            <label>Video file: <input name="file" type="file" accept="video/*" required/></label>
+          </div>
+          <div style={{display:'flex', gap:12, marginTop:8}}>
+            <label>exp (2^exp): <input type="number" value={exp} onChange={e=>setExp(+e.target.value)} min={1} max={6}/></label>
+            <label>target fps: <input type="number" value={targetFps} onChange={e=>setTargetFps(e.target.value)} placeholder="2^exp" step="any"/></label>
+            <label>flow scale: <select value={scale} onChange={e=>setScale(e.target.value)}>
+              <option value="">auto</option>
+              <option value="0.25">0.25</option>
+              <option value="0.5">0.5</option>
+              <option value="1">1</option>
+              <option value="2">2</option>
+            </select></label>
+            <label><input type="checkbox" checked={progressive} onChange={e=>setProgressive(e.target.checked)}/> progressive (HLS)</label>
+            <label><input type="checkbox" checked={profile} onChange={e=>setProfile(e.target.checked)}/> profile</label>
+          </div>
+        </>
+      ) : (
+        <>
+          <div>
+            <label>Frame A: <input name="frame_a" type="file" accept="image/*" required/></label>
+          </div>
+          <div>
+            <label>Frame B: <input name="frame_b" type="file" accept="image/*" required/></label>
+          </div>
+          <div style={{display:'flex', gap:12, marginTop:8}}>
+            <label># of middle frames: <input type="number" value={numMid} onChange={e=>setNumMid(+e.target.value)} min={1} max={127}/></label>
+            <label><input type="checkbox" checked={profile} onChange={e=>setProfile(e.target.checked)}/> profile</label>
+          </div>
+        </>
+      )}
+      <button disabled={loading} style={{marginTop:12}}>
+        {uploaded != null ? `Uploading... ${Math.floor(uploaded * 100)}%` : loading ? 'Processing...' : 'Run RIFE'}
+      </button>
+      {mode==='video' && (
+        <button type="button" disabled={loading} onClick={onPreview} style={{marginTop:12, marginLeft:8}}>
+          Preview (3s, low-res)
+        </button>
+      )}
+    </form>
+  )
 }
\ No newline at end of file
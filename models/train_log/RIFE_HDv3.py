@@ -4,6 +4,7 @@ import numpy as np
 from torch.optim import AdamW
 import torch.optim as optim
 import itertools
+from collections import OrderedDict
 from model.warplayer import warp
 from torch.nn.parallel import DistributedDataParallel as DDP
 from train_log.IFNet_HDv3 import *
@@ -11,7 +12,39 @@ import torch.nn.functional as F
 from model.loss import *
 
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    
+
+
+class FeatureCache:
+    """Small LRU cache of Head (encoder) features keyed by frame index.
+
+    Adjacent pairs share a frame and multi-timestep interpolation reuses the
+    same endpoints, so each frame only needs to be encoded once per job.
+    """
+    def __init__(self, capacity=4):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.encoded = 0
+        self.saved = 0
+
+    def get(self, key, img, encode):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.saved += 1
+            return self.entries[key]
+        feat = encode(img)
+        self.encoded += 1
+        self.entries[key] = feat
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+        return feat
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        return {'encoder_passes': self.encoded, 'encoder_passes_saved': self.saved}
+
+
 class Model:
     def __init__(self, local_rank=-1):
         self.flownet = IFNet()
@@ -53,11 +86,30 @@ class Model:
         if rank == 0:
             torch.save(self.flownet.state_dict(),'{}/flownet.pkl'.format(path))
 
-    def inference(self, img0, img1, timestep=0.5, scale=1.0):
+    def encode(self, img):
+        return self.flownet.encode(img[:, :3])
+
+    def inference(self, img0, img1, timestep=0.5, scale=1.0, f0=None, f1=None):
         imgs = torch.cat((img0, img1), 1)
         scale_list = [16/scale, 8/scale, 4/scale, 2/scale, 1/scale]
-        flow, mask, merged = self.flownet(imgs, timestep, scale_list)
+        flow, mask, merged = self.flownet(imgs, timestep, scale_list, f0=f0, f1=f1)
         return merged[-1]
+
+    def inference_cached(self, img0, img1, key0, key1, cache, timestep=0.5, scale=1.0):
+        f0 = cache.get(key0, img0, self.encode)
+        f1 = cache.get(key1, img1, self.encode)
+        return self.inference(img0, img1, timestep, scale, f0=f0, f1=f1)
+
+    def inference_batch(self, img0, img1, timesteps, scale=1.0, f0=None, f1=None):
+        # all timesteps share img0/img1 and their Head features in one forward pass
+        n = len(timesteps)
+        if f0 is None:
+            f0 = self.encode(img0)
+        if f1 is None:
+            f1 = self.encode(img1)
+        expand = lambda x: x.expand(n, -1, -1, -1)
+        t = torch.tensor(timesteps, dtype=img0.dtype, device=img0.device).view(n, 1, 1, 1)
+        return self.inference(expand(img0), expand(img1), t, scale, f0=expand(f0), f1=expand(f1))
     
     def update(self, imgs, gt, learning_rate=0, mul=1, training=True, flow_gt=None):
         for param_group in self.optimG.param_groups: